@@ -0,0 +1,164 @@
+import logging
+import os
+
+from flask import Flask
+from jinja2 import FileSystemBytecodeCache
+
+logger = logging.getLogger(__name__)
+
+
+def create_app(config_object=None):
+    """
+    Фабрика приложения: конфигурация, сервисы, маршруты.
+
+    Всё тяжёлое и неизменяемое (конфиг, индекс аэропортов, скомпилированные шаблоны)
+    загружается здесь — при gunicorn --preload один раз в мастере, и воркеры делят
+    эти страницы памяти copy-on-write. Потоки, пулы соединений и прочее состояние
+    процесса сервисы создают лениво и сбрасывают после fork (см. services/fork_safety.py).
+    """
+    logging.basicConfig(level=logging.INFO)
+
+    if config_object is None:
+        from config import Config
+        config_object = Config
+    config_object.validate()
+
+    app = Flask(__name__, template_folder='templates', static_folder='static')
+    app.config.from_object(config_object)
+
+    # === Логирование через очередь (запись — в фоновом потоке) ===
+    from app.logging_setup import init_logging
+    init_logging(app)
+
+    # === Подключение кэширования ===
+    try:
+        from app.services.cache_service import init_cache
+        init_cache(app)
+        logger.info("✓ Cache initialized successfully")
+    except ImportError as e:
+        logger.error(f"Error initializing cache: {e}")
+        # Приложение продолжит работу без кэша
+
+    # === Общий rate limiter для запросов к Amadeus ===
+    from app.services.rate_limiter import init_rate_limiter
+    init_rate_limiter(app)
+
+    # === Общее хранилище OAuth-токенов Amadeus ===
+    from app.services.token_store import init_token_store
+    init_token_store(app)
+
+    # === Пул ключей Amadeus (у каждого свой токен и бюджет запросов) ===
+    from app.services.credential_pool import init_credential_pool
+    init_credential_pool(app)
+
+    # === Размыкатель цепи для запросов к Amadeus ===
+    from app.services.circuit_breaker import init_circuit_breaker
+    init_circuit_breaker(app)
+
+    # === Склейка одинаковых одновременных поисков (single-flight) ===
+    from app.services.single_flight import init_single_flight
+    init_single_flight(app)
+
+    # === Снимки результатов поиска для постраничной выдачи ===
+    from app.services.snapshot_store import init_snapshot_store
+    init_snapshot_store(app)
+
+    # === Учёт популярных поисков (для фонового прогрева кэша) ===
+    from app.services.popular_searches import init_popular_searches
+    init_popular_searches(app)
+
+    # === История цен (SQLite, запись в фоне) ===
+    from app.services.price_history import init_price_history
+    init_price_history(app)
+
+    # === Метрики (/metrics) и заголовок Server-Timing ===
+    from app.services.metrics import init_metrics, metrics_response
+    init_metrics(app)
+
+    # === ETag/304 и gzip/brotli для JSON-ответов API ===
+    from app.http_cache import init_http_cache
+    init_http_cache(app)
+
+    # === Собранная статика (хэш в имени, gzip/brotli) и кэш байткода шаблонов ===
+    from app.assets import init_assets
+    init_assets(app)
+
+    # Скомпилированные шаблоны переживают перезапуск процесса — первый рендер без компиляции
+    bytecode_dir = app.config.get('JINJA_BYTECODE_CACHE_DIR') or os.path.join(app.instance_path, 'jinja_cache')
+    try:
+        os.makedirs(bytecode_dir, exist_ok=True)
+        app.jinja_env.bytecode_cache = FileSystemBytecodeCache(bytecode_dir)
+    except OSError as e:
+        logger.warning(f"Jinja bytecode cache disabled: {e}")
+
+    # === Регистрация кастомных фильтров шаблонов ===
+    try:
+        from app.template_filters import format_datetime, format_duration, format_price, truncate_text
+
+        app.jinja_env.filters['format_datetime'] = format_datetime
+        app.jinja_env.filters['format_duration'] = format_duration
+        app.jinja_env.filters['format_price'] = format_price
+        app.jinja_env.filters['truncate'] = truncate_text
+
+        logger.info("✓ Template filters registered successfully")
+    except ImportError as e:
+        logger.error(f"Error importing template filters: {e}")
+        # Приложение может работать и без фильтров (шаблоны будут использовать сырые значения)
+
+    # === Регистрация blueprint'ов (при импорте строится индекс аэропортов) ===
+    try:
+        from app.routes import bp
+        app.register_blueprint(bp)
+        logger.info("✓ Routes loaded successfully")
+    except ImportError as e:
+        logger.error(f"Error importing routes: {e}", exc_info=True)
+        error = str(e)
+
+        # Fallback: создаём минимальные роуты, чтобы приложение не падало
+        @app.route('/')
+        def index():
+            return f"""
+            <h1>🚧 ZaTravel — Routes Not Loaded</h1>
+            <p><strong>Ошибка:</strong> {error}</p>
+            <p>Проверьте логи и структуру проекта.</p>
+            <pre>{error}</pre>
+            """, 500
+
+    # === Celery: фоновый прогрев кэша по расписанию (celery -A celery_worker.celery worker --beat) ===
+    try:
+        from app.tasks import init_celery
+        app.extensions['celery'] = init_celery(app)
+        logger.info("✓ Celery configured")
+    except ImportError as e:
+        logger.warning(f"Celery not available, cache prewarming disabled: {e}")
+
+    # === Служебные роуты ===
+    @app.route('/health')
+    def health_check():
+        """Эндпоинт для health-check (например, для Docker или мониторинга)"""
+        return {'status': 'ok', 'message': 'ZaTravel is running'}
+
+    @app.route('/metrics')
+    def metrics():
+        """Метрики процесса в формате Prometheus (задержки по этапам, ответы Amadeus, кэш)"""
+        return metrics_response()
+
+    @app.route('/debug')
+    def debug_info():
+        """Страница отладки — проверка конфигурации"""
+        return {
+            'amadeus_key_exists': bool(app.config.get('AMADEUS_API_KEY')),
+            'amadeus_secret_exists': bool(app.config.get('AMADEUS_API_SECRET')),
+            'amadeus_credentials': len(app.config.get('AMADEUS_CREDENTIALS', [])),
+            'template_folder': app.template_folder,
+            'static_folder': app.static_folder,
+            'debug_mode': app.debug,
+            'cache_configured': hasattr(app, 'extensions') and 'cache' in app.extensions,
+            'filters_registered': len(app.jinja_env.filters) > 0
+        }
+
+    # === Шаблоны компилируем сразу, а не на первом запросе каждого воркера ===
+    for name in app.jinja_env.list_templates():
+        app.jinja_env.get_template(name)
+
+    return app
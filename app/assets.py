@@ -0,0 +1,127 @@
+"""
+Сборка статики: минификация CSS, хэш содержимого в имени файла, предсжатие gzip/brotli.
+
+    python -m app.assets          # перед деплоем; результат — app/static/dist/ и manifest.json
+
+Шаблоны ссылаются на файлы через asset_url('js/script.js'): после сборки это
+/static/dist/js/script.<хэш>.js с Cache-Control: immutable, без сборки — исходный файл.
+"""
+import gzip
+import hashlib
+import json
+import logging
+import mimetypes
+import os
+import re
+
+from flask import Blueprint, current_app, request, send_from_directory, url_for
+
+try:
+    import brotli
+except ImportError:  # без brotli отдаём только gzip
+    brotli = None
+
+logger = logging.getLogger(__name__)
+
+ASSETS = ['css/style.css', 'js/script.js']
+DIST_DIR = 'dist'
+MANIFEST = 'manifest.json'
+IMMUTABLE = 'public, max-age=31536000, immutable'
+
+bp = Blueprint('assets', __name__, url_prefix='/static/dist')
+
+
+# === Минификация ===
+
+def minify_css(source):
+    """Убирает комментарии и лишние пробелы; пробелы перед ':' не трогаем — это селекторы"""
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,>])\s*', r'\1', source)
+    source = re.sub(r':\s+', ':', source)
+    return source.replace(';}', '}').strip()
+
+
+# JS не минифицируем: без полноценного разбора (регулярные выражения, ASI) это рискованно,
+# а после gzip/brotli выигрыш невелик — он уходит в dist как есть, только с хэшем
+MINIFIERS = {'.css': minify_css}
+
+
+# === Сборка ===
+
+def build(static_folder):
+    """Собирает ASSETS в static/dist: файл с хэшем, .gz и .br рядом; возвращает манифест"""
+    dist = os.path.join(static_folder, DIST_DIR)
+    manifest = {}
+    for name in ASSETS:
+        with open(os.path.join(static_folder, name), encoding='utf-8') as f:
+            source = f.read()
+        stem, ext = os.path.splitext(name)
+        data = MINIFIERS.get(ext, lambda text: text)(source).encode('utf-8')
+        hashed = f"{stem}.{hashlib.sha256(data).hexdigest()[:12]}{ext}"
+
+        path = os.path.join(dist, hashed)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, 'wb') as f:
+            f.write(data)
+        with open(path + '.gz', 'wb') as f:
+            f.write(gzip.compress(data, compresslevel=9, mtime=0))
+        if brotli is not None:
+            with open(path + '.br', 'wb') as f:
+                f.write(brotli.compress(data, quality=11))
+
+        manifest[name] = f"{DIST_DIR}/{hashed}"
+        logger.info(f"{name}: {len(source.encode('utf-8'))} → {len(data)} bytes → {manifest[name]}")
+
+    with open(os.path.join(dist, MANIFEST), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
+
+
+# === Выдача ===
+
+def load_manifest(static_folder):
+    try:
+        with open(os.path.join(static_folder, DIST_DIR, MANIFEST)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def asset_url(filename):
+    """URL статики для шаблонов: собранная версия с хэшем, если она есть"""
+    manifest = current_app.extensions.get('assets', {})
+    return url_for('static', filename=manifest.get(filename, filename))
+
+
+@bp.route('/<path:filename>')
+def dist_file(filename):
+    """Собранная статика: предсжатая версия по Accept-Encoding, кэш на год (имя меняется с содержимым)"""
+    directory = os.path.join(current_app.static_folder, DIST_DIR)
+    mimetype = mimetypes.guess_type(filename)[0]
+    for encoding, suffix in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings.quality(encoding) > 0 and os.path.isfile(os.path.join(directory, filename + suffix)):
+            response = send_from_directory(directory, filename + suffix, mimetype=mimetype)
+            response.headers['Content-Encoding'] = encoding
+            break
+    else:
+        response = send_from_directory(directory, filename, mimetype=mimetype)
+    response.headers['Cache-Control'] = IMMUTABLE
+    response.vary.add('Accept-Encoding')
+    return response
+
+
+def init_assets(app):
+    manifest = load_manifest(app.static_folder)
+    if manifest:
+        logger.info(f"✓ Built assets: {len(manifest)} files")
+    else:
+        logger.info("Assets are not built (python -m app.assets), serving sources")
+    app.extensions['assets'] = manifest
+    app.add_template_global(asset_url)
+    app.register_blueprint(bp)
+
+
+if __name__ == '__main__':
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+    build(os.path.join(os.path.dirname(os.path.abspath(__file__)), 'static'))
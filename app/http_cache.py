@@ -0,0 +1,69 @@
+"""
+ETag и сжатие JSON-ответов API.
+
+Каждый JSON-ответ 200 получает ETag по хэшу тела; GET с совпавшим If-None-Match
+получает 304 без тела. Тело больше JSON_COMPRESS_MIN_SIZE сжимается brotli или gzip —
+что клиент указал в Accept-Encoding. Потоковые ответы (NDJSON, SSE) не трогаем.
+"""
+import gzip
+import hashlib
+
+from flask import request
+
+from app.services.metrics import span
+
+try:
+    import brotli
+except ImportError:  # без brotli сжимаем только gzip
+    brotli = None
+
+GZIP_LEVEL = 5       # выше — почти без выигрыша в размере, но заметно дольше на больших ответах
+BROTLI_QUALITY = 5
+
+
+def content_etag(body):
+    return hashlib.blake2b(body, digest_size=16).hexdigest()
+
+
+def negotiate_encoding():
+    """Лучшее поддерживаемое кодирование из Accept-Encoding или None"""
+    accept = request.accept_encodings
+    if brotli is not None and accept.quality('br') > 0:
+        return 'br'
+    if accept.quality('gzip') > 0:
+        return 'gzip'
+    return None
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=BROTLI_QUALITY)
+    return gzip.compress(body, compresslevel=GZIP_LEVEL)
+
+
+def init_http_cache(app):
+    # Регистрировать после init_metrics: after_request выполняются в обратном порядке,
+    # и сжатие должно попасть в замер запроса и Server-Timing
+    min_size = app.config.get('JSON_COMPRESS_MIN_SIZE', 1024)
+
+    @app.after_request
+    def conditional_json(response):
+        if (response.mimetype != 'application/json' or response.is_streamed
+                or response.direct_passthrough or 'Content-Encoding' in response.headers):
+            return response
+
+        if response.status_code == 200:
+            # Слабый ETag: одно содержимое — один тег, в каком бы сжатии его ни отдали
+            response.set_etag(content_etag(response.get_data()), weak=True)
+            response.make_conditional(request)  # GET/HEAD с совпавшим If-None-Match → 304
+            if response.status_code == 304:
+                return response
+
+        response.vary.add('Accept-Encoding')
+        body = response.get_data()
+        encoding = negotiate_encoding() if len(body) >= min_size else None
+        if encoding is not None:
+            with span('compress'):
+                response.set_data(compress(body, encoding))
+            response.headers['Content-Encoding'] = encoding
+        return response
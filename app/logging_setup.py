@@ -0,0 +1,116 @@
+"""
+Логирование вне пути запроса: очередь, фоновая запись и выборка частых INFO-строк.
+
+Записи кладутся в очередь (QueueHandler), форматирует и пишет их отдельный поток
+(QueueListener) — запрос не ждёт ни форматирования, ни вывода. Для шумных эндпоинтов
+(подсказки аэропортов на каждое нажатие клавиши) INFO и ниже пишутся только для доли
+запросов из LOG_SAMPLE_RATES; WARNING и выше — всегда.
+"""
+import atexit
+import logging
+import logging.handlers
+import queue
+import random
+
+from flask import g, has_request_context, request
+
+from app.services.fork_safety import after_fork
+
+
+class RequestSampler(logging.Filter):
+    """Пропускает INFO-записи эндпоинта с вероятностью его rate; решение одно на весь запрос"""
+
+    def __init__(self, rates):
+        super().__init__()
+        self.rates = rates  # endpoint → доля запросов, строки которых пишем
+
+    def filter(self, record):
+        if record.levelno > logging.INFO or not has_request_context():
+            return True
+        rate = self.rates.get(request.endpoint)
+        if rate is None:
+            return True
+        keep = g.get('log_sampled')
+        if keep is None:
+            keep = g.log_sampled = random.random() < rate
+        return keep
+
+
+class DeferredQueueHandler(logging.handlers.QueueHandler):
+    """
+    QueueHandler без форматирования в потоке запроса.
+
+    Стандартный prepare() форматирует сообщение до постановки в очередь — то есть
+    на пути запроса. Здесь очередь внутри процесса, поэтому запись уходит как есть,
+    а форматирует её поток записи. Аргументы-словари и списки копируются: запрос
+    может изменить их позже, а в лог должно попасть состояние на момент вызова.
+    """
+
+    def prepare(self, record):
+        args = record.args
+        if isinstance(args, dict):
+            record.args = dict(args)
+        elif args:
+            record.args = tuple(
+                dict(arg) if isinstance(arg, dict) else list(arg) if isinstance(arg, list) else arg
+                for arg in args
+            )
+        if record.exc_info and not record.exc_text:
+            # Трейсбек держит кадры стека запроса — рендерим сразу и отпускаем их
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class QueueLogging:
+    """Переключает корневой логгер на очередь; поток записи свой в каждом процессе"""
+
+    def __init__(self):
+        self.handlers = []
+        self.handler = None
+        self.listener = None
+
+    def init_app(self, app):
+        root = logging.getLogger()
+        root.setLevel(app.config.get('LOG_LEVEL', 'INFO'))
+        sampler = RequestSampler(app.config.get('LOG_SAMPLE_RATES', {}))
+
+        if not app.config.get('LOG_QUEUE', True):
+            for handler in root.handlers:
+                handler.addFilter(sampler)
+            return
+        if self.handler is not None:
+            # Повторный create_app() в том же процессе: очередь уже настроена
+            self.handler.filters = [sampler]
+            return
+
+        self.handlers = list(root.handlers)
+        self.handler = DeferredQueueHandler(queue.SimpleQueue())
+        self.handler.addFilter(sampler)
+        for handler in self.handlers:
+            root.removeHandler(handler)
+        root.addHandler(self.handler)
+        self._start()
+        atexit.register(self.stop)
+        after_fork(self._start)
+
+    def _start(self):
+        # После fork поток записи родителя не существует, а в очереди могут быть его записи
+        self.handler.queue = queue.SimpleQueue()
+        self.listener = logging.handlers.QueueListener(
+            self.handler.queue, *self.handlers, respect_handler_level=True
+        )
+        self.listener.start()
+
+    def stop(self):
+        """Дописывает всё из очереди (при завершении процесса)"""
+        if self.listener is not None:
+            self.listener.stop()
+            self.listener = None
+
+
+queue_logging = QueueLogging()
+
+
+def init_logging(app):
+    queue_logging.init_app(app)
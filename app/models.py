@@ -1,10 +1,37 @@
 import logging
+import sys
+from json.encoder import encode_basestring as _json_str
+from operator import attrgetter, itemgetter
 logger = logging.getLogger(__name__)
-from dataclasses import dataclass, asdict
-from typing import List, Optional
-from datetime import datetime
+from dataclasses import dataclass
+from typing import List
 
-@dataclass
+# Коды аэропортов, перевозчиков и валют повторяются тысячи раз — храним по одному экземпляру строки
+_intern = sys.intern
+
+SEGMENT_FIELDS = ('departure_airport', 'arrival_airport', 'departure_time', 'arrival_time',
+                  'airline', 'flight_number', 'duration')
+# Готовые префиксы '{"departure_airport":', ',"arrival_airport":', ... — JSON склеивается без json.dumps
+_SEGMENT_PREFIXES = tuple(('{' if i == 0 else ',') + f'"{name}":' for i, name in enumerate(SEGMENT_FIELDS))
+_segment_values = attrgetter(*SEGMENT_FIELDS)
+_segment_items = itemgetter(*SEGMENT_FIELDS)
+
+
+def segment_json(values):
+    """JSON сегмента из значений полей в порядке SEGMENT_FIELDS — общий для объектов и словарей"""
+    return ''.join([prefix + _json_str(value) for prefix, value in zip(_SEGMENT_PREFIXES, values)]) + '}'
+
+
+def offer_json(price, currency, segments):
+    """JSON предложения из цены, валюты и уже сериализованных сегментов — формат json.dumps(to_dict())"""
+    return (
+        '{"price":' + float.__repr__(price)
+        + ',"currency":' + _json_str(currency)
+        + ',"segments":[' + ','.join(segments) + ']}'
+    )
+
+
+@dataclass(slots=True)
 class FlightSegment:
     departure_airport: str
     arrival_airport: str
@@ -17,26 +44,36 @@ class FlightSegment:
     @classmethod
     def from_amadeus_segment(cls, segment_data):
         try:
-            dep_time = segment_data['departure']['at']
-            arr_time = segment_data['arrival']['at']
+            departure = segment_data['departure']
+            arrival = segment_data['arrival']
+            dep_time = departure['at']
+            arr_time = arrival['at']
 
             # Преобразуем время в ISO строку — безопасно для JSON
             dep_iso = dep_time.replace('Z', '+00:00') if 'Z' in dep_time else dep_time
             arr_iso = arr_time.replace('Z', '+00:00') if 'Z' in arr_time else arr_time
 
             return cls(
-                departure_airport=segment_data['departure']['iataCode'],
-                arrival_airport=segment_data['arrival']['iataCode'],
+                departure_airport=_intern(departure['iataCode']),
+                arrival_airport=_intern(arrival['iataCode']),
                 departure_time=dep_iso,
                 arrival_time=arr_iso,
-                airline=segment_data['carrierCode'],
+                airline=_intern(segment_data['carrierCode']),
                 flight_number=segment_data['number'],
                 duration=segment_data.get('duration', '')
             )
         except Exception as e:
             raise ValueError(f"Failed to parse segment: {e}")
 
-@dataclass
+    def to_dict(self):
+        return dict(zip(SEGMENT_FIELDS, _segment_values(self)))
+
+    def to_json(self):
+        """JSON сегмента напрямую из полей, без промежуточного словаря"""
+        return segment_json(_segment_values(self))
+
+
+@dataclass(slots=True)
 class FlightOffer:
     price: float
     currency: str
@@ -57,7 +94,7 @@ class FlightOffer:
 
         return cls(
             price=float(data['price']['total']),
-            currency=data['price']['currency'],
+            currency=_intern(data['price']['currency']),
             segments=segments
         )
 
@@ -66,5 +103,15 @@ class FlightOffer:
         return {
             'price': self.price,
             'currency': self.currency,
-            'segments': [asdict(segment) for segment in self.segments]
-        }
\ No newline at end of file
+            'segments': [segment.to_dict() for segment in self.segments]
+        }
+
+    def to_json(self):
+        """JSON предложения напрямую из полей — тот же формат, что json.dumps(to_dict())"""
+        return offer_json(self.price, self.currency, [segment.to_json() for segment in self.segments])
+
+
+def offer_dict_to_json(offer):
+    """JSON словаря FlightOffer.to_dict (в таком виде предложения хранит кэш) — формат FlightOffer.to_json"""
+    return offer_json(float(offer['price']), offer['currency'],
+                      [segment_json(_segment_items(segment)) for segment in offer['segments']])
@@ -1,4 +1,7 @@
-from flask import Blueprint, render_template, request, jsonify
+from flask import Blueprint, Response, current_app, render_template, request, jsonify, stream_with_context, url_for
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+import json
 import logging
 
 logger = logging.getLogger(__name__)
@@ -6,10 +9,50 @@ logger = logging.getLogger(__name__)
 bp = Blueprint('app', __name__)
 
 # Импортируем после создания bp, чтобы избежать циклических импортов
+from app.models import offer_dict_to_json
 from app.services.amadeus_client import AmadeusClient
-from app.models import FlightOffer
+from app.services.async_amadeus_client import AsyncAmadeusClient
+from app.services.airport_index import AirportIndex
+from app.services.cache_service import search_cache
+from app.services.circuit_breaker import CircuitOpenError, DeadlineExceeded
+from app.services.credential_pool import credential_pool
+from app.services.metrics import span
+from app.services.offer_ranking import parse_ranking, rank_offers
+from app.services.popular_searches import popular_searches
+from app.services.prefetch import SearchPrefetcher
+from app.services.price_history import price_history
+from app.services.rate_limiter import RateLimitExceeded, rate_limiter
+from app.services.search_service import SearchService, cheapest_offer
+from app.services.single_flight import single_flight
+from app.services.snapshot_store import snapshot_store, encode_cursor, decode_cursor
 
 amadeus_client = AmadeusClient()
+# Асинхронный клиент с пулом соединений — для async-представлений
+async_amadeus_client = AsyncAmadeusClient()
+search_service = SearchService(amadeus_client, search_cache, async_amadeus_client, single_flight,
+                               popular=popular_searches, history=price_history)
+# Спекулятивные поиски из формы — в кэш результатов, в пределах своей доли бюджета
+search_prefetcher = SearchPrefetcher(search_service, search_cache, rate_limiter, credential_pool)
+# Индекс аэропортов строится один раз при старте из встроенного справочника
+airport_index = AirportIndex.from_csv()
+
+AIRPORT_SUGGESTIONS_LIMIT = 5
+AMADEUS_MAX_RESULTS = 250  # больше предложений за один поиск Amadeus не отдаёт
+
+
+@bp.record_once
+def configure_clients(state):
+    """Адрес Amadeus и срок запроса берём из конфигурации приложения при регистрации blueprint"""
+    base_url = state.app.config.get('AMADEUS_BASE_URL')
+    deadline = state.app.config.get('AMADEUS_REQUEST_DEADLINE')
+    if base_url:
+        amadeus_client.configure(base_url, deadline)
+        async_amadeus_client.configure(base_url, deadline)
+
+
+@bp.record_once
+def configure_prefetch(state):
+    search_prefetcher.init_app(state.app)
 
 
 def extract_iata_code(input_str):
@@ -39,6 +82,171 @@ def index():
     return render_template('index.html')
 
 
+def build_search_params(search_data):
+    """
+    Валидирует данные формы поиска и формирует параметры для Amadeus API.
+    При некорректных данных бросает ValueError с текстом для ответа 400.
+    """
+    # Валидация обязательных полей
+    origin_input = search_data.get('origin')
+    destination_input = search_data.get('destination')
+    departure_date = search_data.get('departureDate')
+
+    if not all([origin_input, destination_input, departure_date]):
+        logger.warning("Missing required fields in search request")
+        raise ValueError('Missing required fields: origin, destination, departureDate')
+
+    # Извлекаем IATA-коды
+    origin = extract_iata_code(origin_input)
+    destination = extract_iata_code(destination_input)
+
+    if not origin or not destination:
+        raise ValueError('Invalid airport codes')
+
+    # Формируем параметры для Amadeus API
+    search_params = {
+        'originLocationCode': origin,
+        'destinationLocationCode': destination,
+        'departureDate': departure_date,
+        'adults': int(search_data.get('adults', 1)),
+        # Размер страницы: отрицательный или нулевой дал бы срез не той длины
+        'max': min(max(int(search_data.get('maxResults', 5)), 1), AMADEUS_MAX_RESULTS)
+    }
+
+    # Добавляем returnDate только если он не пустой и не состоит из пробелов
+    return_date = search_data.get('returnDate')
+    if return_date and str(return_date).strip():
+        search_params['returnDate'] = str(return_date).strip()
+
+    return search_params
+
+
+def search_error_message(e):
+    """Текст ошибки поиска — с деталями от Amadeus, если это HTTP ошибка"""
+    error_msg = str(e)
+    if hasattr(e, 'response') and e.response is not None:
+        try:
+            error_detail = e.response.json()
+            logger.error(f"Amadeus API error details: {error_detail}")
+            if isinstance(error_detail, dict) and 'errors' in error_detail and len(error_detail['errors']) > 0:
+                first_error = error_detail['errors'][0]
+                title = first_error.get('title', 'Error')
+                detail = first_error.get('detail', 'Unknown error')
+                error_msg = f"{title}: {detail}"
+        except Exception as parse_error:
+            logger.error(f"Failed to parse error response: {parse_error}")
+    return error_msg
+
+
+def airports_from_amadeus(results):
+    """Преобразует ответ Amadeus /reference-data/locations в формат автодополнения"""
+    airports = []
+    for item in results.get('data', []):
+        airports.append({
+            'code': item.get('iataCode', ''),
+            'name': item.get('name', ''),
+            'city': item.get('address', {}).get('cityName', ''),
+            'country': item.get('address', {}).get('countryName', '')
+        })
+    return airports
+
+
+def rate_limited_response(e):
+    """429 с Retry-After — бюджет запросов к Amadeus исчерпан"""
+    logger.warning(f"Search rejected: {e}")
+    response = jsonify({'error': 'Too many requests to flight provider, retry later'})
+    response.headers['Retry-After'] = str(max(1, int(e.retry_after + 0.999)))
+    return response, 429
+
+
+def unavailable_response(e):
+    """503 с Retry-After — Amadeus недоступен (цепь разомкнута), запрос не отправлялся"""
+    logger.warning(f"Search failed fast: {e}")
+    response = jsonify({'error': 'Flight provider is temporarily unavailable, retry later'})
+    response.headers['Retry-After'] = str(max(1, int(e.retry_after + 0.999)))
+    return response, 503
+
+
+def timeout_response(e):
+    """504 — Amadeus не ответил за общий срок запроса (с повторами)"""
+    logger.warning(f"Search timed out: {e}")
+    return jsonify({'error': 'Flight provider did not respond in time, retry later'}), 504
+
+
+def json_response(payload, status=200):
+    """
+    Компактный JSON-ответ одним проходом json.dumps — без сортировки ключей
+    и отступов, которые добавляет jsonify
+    """
+    body = json.dumps(payload, ensure_ascii=False, separators=(',', ':'))
+    return Response(body, status=status, mimetype='application/json')
+
+
+def widen_for_snapshot(search_params):
+    """
+    Запрашиваем у Amadeus сразу SNAPSHOT_FETCH_MAX предложений, а клиенту отдаём
+    первую страницу размера maxResults. Возвращает размер страницы.
+    """
+    page_size = search_params['max']
+    search_params['max'] = min(AMADEUS_MAX_RESULTS, max(page_size, current_app.config.get('SNAPSHOT_FETCH_MAX', 50)))
+    return page_size
+
+
+def page_links(snapshot_id, offset, total):
+    """Поля пагинации ответа: id снимка и курсор следующей страницы (None — страниц больше нет)"""
+    return {
+        'snapshotId': snapshot_id,
+        'nextCursor': encode_cursor(snapshot_id, offset) if offset < total else None,
+        'totalResults': total
+    }
+
+
+def offers_page_response(snapshot_id, offers, offset, total):
+    """Страница из уже сериализованных предложений — склейкой строк, без повторного json.dumps"""
+    links = json.dumps(page_links(snapshot_id, offset + len(offers), total), separators=(',', ':'))
+    body = '{"success":true,"flights":[' + ','.join(offers) + f'],"total":{len(offers)},' + links[1:]
+    return Response(body, mimetype='application/json')
+
+
+def flights_response(search_params, flights, cache_status, page_size, ranking=None):
+    """
+    Первая страница результатов; полный набор сохраняется в снимок для /search/page.
+    С ranking снимок — отфильтрованные и упорядоченные предложения, и страницы идут в этом порядке.
+    """
+    if ranking is not None:
+        with span('rank'):
+            flights = rank_offers(flights, ranking, legs=2 if 'returnDate' in search_params else 1)
+    with span('serialize'):
+        # Каждое предложение сериализуется один раз: эти же строки идут и в снимок, и в страницу
+        offers = [offer_dict_to_json(flight) for flight in flights]
+        snapshot_id = snapshot_store.create(search_cache.make_key(search_params), offers)
+        response = offers_page_response(snapshot_id, offers[:page_size], 0, len(offers))
+    response.headers['X-Cache'] = cache_status.upper()
+    return response
+
+
+def wants_job():
+    """Клиент просит job mode: заголовок Prefer: respond-async или ?mode=job"""
+    return request.args.get('mode') == 'job' or 'respond-async' in request.headers.get('Prefer', '')
+
+
+def submit_job_response(search_params, page_size, ranking=None):
+    """202 с id задания поиска; None — очередь недоступна и искать придётся прямо в запросе"""
+    try:
+        from app.tasks import submit_search_job
+        job_id = submit_search_job(search_params, page_size, ranking)
+    except Exception as e:
+        logger.warning(f"Search queue unavailable, searching inline: {e}")
+        return None
+
+    status_url = url_for('app.search_job_status', job_id=job_id)
+    response = jsonify({'success': True, 'jobId': job_id, 'status': 'pending', 'statusUrl': status_url})
+    response.status_code = 202
+    response.headers['Location'] = status_url
+    response.headers['Retry-After'] = '1'
+    return response
+
+
 @bp.route('/search', methods=['POST'])
 def search_flights():
     try:
@@ -46,107 +254,541 @@ def search_flights():
         if not search_data:
             return jsonify({'error': 'No JSON data provided'}), 400
 
-        logger.info(f"Received search request: {search_data}")
-
-        # Валидация обязательных полей
-        origin_input = search_data.get('origin')
-        destination_input = search_data.get('destination')
-        departure_date = search_data.get('departureDate')
+        # %-формат: тяжёлые payload форматируются, только если запись дошла до вывода (см. logging_setup)
+        logger.info("Received search request: %s", search_data)
 
-        if not all([origin_input, destination_input, departure_date]):
-            logger.warning("Missing required fields in search request")
-            return jsonify({'error': 'Missing required fields: origin, destination, departureDate'}), 400
-
-        # Извлекаем IATA-коды
-        origin = extract_iata_code(origin_input)
-        destination = extract_iata_code(destination_input)
-
-        if not origin or not destination:
-            return jsonify({'error': 'Invalid airport codes'}), 400
+        try:
+            search_params = build_search_params(search_data)
+            ranking = parse_ranking(search_data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        page_size = widen_for_snapshot(search_params)
+        logger.info("Processed search params: %s", search_params)
+
+        if wants_job():
+            # Из кэша отвечаем сразу; промах уходит в очередь, поток не ждёт Amadeus
+            flights, cache_status = search_service.peek(search_params)
+            if cache_status == 'miss':
+                job_response = submit_job_response(search_params, page_size, ranking)
+                if job_response is not None:
+                    return job_response
+                flights, cache_status = search_service.search(search_params)
+        else:
+            # Выполняем поиск (через кэш; в Amadeus идём только при промахе)
+            flights, cache_status = search_service.search(search_params)
+
+        logger.info("Found %d flights (cache: %s)", len(flights), cache_status)
+
+        return flights_response(search_params, flights, cache_status, page_size, ranking)
+
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except CircuitOpenError as e:
+        return unavailable_response(e)
+    except DeadlineExceeded as e:
+        return timeout_response(e)
+    except Exception as e:
+        error_msg = search_error_message(e)
+        logger.error(f"Search error: {error_msg}", exc_info=True)
+        return jsonify({'error': error_msg}), 500
 
-        # Формируем параметры для Amadeus API
-        search_params = {
-            'originLocationCode': origin,
-            'destinationLocationCode': destination,
-            'departureDate': departure_date,
-            'adults': int(search_data.get('adults', 1)),
-            'max': int(search_data.get('maxResults', 5))
-        }
 
-        # Добавляем returnDate только если он не пустой и не состоит из пробелов
-        return_date = search_data.get('returnDate')
-        if return_date and str(return_date).strip():
-            search_params['returnDate'] = str(return_date).strip()
+@bp.route('/search/prefetch', methods=['POST'])
+def prefetch_search():
+    """
+    Спекулятивный поиск: форма вызывает его, как только маршрут и дата заполнены.
+    Ответ не ждёт Amadeus — результат попадёт в кэш, и поиск по кнопке получит его оттуда.
+    Если бюджет запросов на исходе, сервер отказывает (429): настоящие поиски важнее.
+    """
+    search_data = request.get_json()
+    if not search_data:
+        return jsonify({'error': 'No JSON data provided'}), 400
+    try:
+        search_params = build_search_params(search_data)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    # Те же параметры, что у поиска по кнопке, — значит, и тот же ключ кэша
+    widen_for_snapshot(search_params)
+
+    status, reason = search_prefetcher.submit(search_params)
+    if status == 'refused':
+        response = jsonify({'prefetch': status, 'reason': reason})
+        response.headers['Retry-After'] = '1'
+        return response, 429
+    return jsonify({'prefetch': status}), 200 if status == 'cached' else 202
+
+
+@bp.route('/search/async', methods=['POST'])
+async def search_flights_async():
+    """Асинхронный вариант /search: поток воркера не занят, пока ждём Amadeus"""
+    try:
+        search_data = request.get_json()
+        if not search_data:
+            return jsonify({'error': 'No JSON data provided'}), 400
 
-        logger.info(f"Processed search params: {search_params}")
+        try:
+            search_params = build_search_params(search_data)
+            ranking = parse_ranking(search_data)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
 
-        # Выполняем поиск
-        results = amadeus_client.search_flights(search_params)
+        page_size = widen_for_snapshot(search_params)
+        flights, cache_status = await search_service.search_async(search_params)
 
-        # Преобразуем в объекты FlightOffer
-        flights = []
-        for offer in results.get('data', []):
-            try:
-                flight = FlightOffer.from_amadeus_data(offer)
-                flights.append(flight.to_dict())
-            except Exception as e:
-                logger.warning(f"Failed to parse flight offer: {e}")
-                continue
+        logger.info("Found %d flights (cache: %s, async)", len(flights), cache_status)
 
-        logger.info(f"Found {len(flights)} flights")
-
-        return jsonify({
-            'success': True,
-            'flights': flights,
-            'total': len(flights)
-        })
+        return flights_response(search_params, flights, cache_status, page_size, ranking)
 
+    except RateLimitExceeded as e:
+        return rate_limited_response(e)
+    except CircuitOpenError as e:
+        return unavailable_response(e)
+    except DeadlineExceeded as e:
+        return timeout_response(e)
     except Exception as e:
-        error_msg = str(e)
-        # Пытаемся получить детали ошибки от Amadeus (если это HTTP ошибка)
-        if hasattr(e, 'response') and e.response is not None:
-            try:
-                error_detail = e.response.json()
-                logger.error(f"Amadeus API error details: {error_detail}")
-                if isinstance(error_detail, dict) and 'errors' in error_detail and len(error_detail['errors']) > 0:
-                    first_error = error_detail['errors'][0]
-                    title = first_error.get('title', 'Error')
-                    detail = first_error.get('detail', 'Unknown error')
-                    error_msg = f"{title}: {detail}"
-            except Exception as parse_error:
-                logger.error(f"Failed to parse error response: {parse_error}")
-        logger.error(f"Search error: {error_msg}", exc_info=True)
+        error_msg = search_error_message(e)
+        logger.error(f"Async search error: {error_msg}", exc_info=True)
         return jsonify({'error': error_msg}), 500
 
 
+def airports_response(airports):
+    """Подсказки аэропортов меняются редко — браузер может держать их у себя, потом сверить ETag"""
+    response = jsonify(airports)
+    response.cache_control.public = True
+    response.cache_control.max_age = current_app.config.get('AIRPORTS_MAX_AGE', 3600)
+    return response
+
+
 @bp.route('/api/airports')
 def get_airports():
     try:
         keyword = request.args.get('q', '').strip()
-        logger.info(f"Airport search for: {keyword}")
+        logger.info("Airport search for: %s", keyword)
 
         if len(keyword) < 2:
             return jsonify([])
 
-        results = amadeus_client.get_airport_suggestions(keyword)
-        airports = []
+        # Сначала локальный индекс — без сети и rate limit
+        airports = airport_index.search(keyword, limit=AIRPORT_SUGGESTIONS_LIMIT)
 
-        for item in results.get('data', []):
-            airports.append({
-                'code': item.get('iataCode', ''),
-                'name': item.get('name', ''),
-                'city': item.get('address', {}).get('cityName', ''),
-                'country': item.get('address', {}).get('countryName', '')
-            })
+        if not airports:
+            # Промах индекса: спрашиваем Amadeus (ответ запоминается) и дописываем найденное в индекс
+            airports = airport_index.remote_suggestions(keyword, AIRPORT_SUGGESTIONS_LIMIT)
+            if airports is None:
+                results = amadeus_client.get_airport_suggestions(keyword)
+                airports = airports_from_amadeus(results)
+                if 'error' not in results:
+                    airport_index.remember_remote(keyword, airports)
+                added = airport_index.add(airports)
+                logger.info("Airport index miss for '%s': %d airports added from Amadeus", keyword, added)
+            airports = airports[:AIRPORT_SUGGESTIONS_LIMIT]
 
-        logger.info(f"Found {len(airports)} airports")
-        return jsonify(airports)
+        logger.info("Found %d airports", len(airports))
+        return airports_response(airports)
 
     except Exception as e:
         logger.error(f"Airport search error: {e}", exc_info=True)
         return jsonify([])
 
 
+@bp.route('/api/airports/async')
+async def get_airports_async():
+    """Асинхронный вариант /api/airports: промахи индекса уходят в Amadeus без блокировки потока"""
+    try:
+        keyword = request.args.get('q', '').strip()
+
+        if len(keyword) < 2:
+            return jsonify([])
+
+        airports = airport_index.search(keyword, limit=AIRPORT_SUGGESTIONS_LIMIT)
+
+        if not airports:
+            airports = airport_index.remote_suggestions(keyword, AIRPORT_SUGGESTIONS_LIMIT)
+            if airports is None:
+                results = await async_amadeus_client.get_airport_suggestions(keyword)
+                airports = airports_from_amadeus(results)
+                if 'error' not in results:
+                    airport_index.remember_remote(keyword, airports)
+                airport_index.add(airports)
+            airports = airports[:AIRPORT_SUGGESTIONS_LIMIT]
+
+        return airports_response(airports)
+
+    except Exception as e:
+        logger.error(f"Async airport search error: {e}", exc_info=True)
+        return jsonify([])
+
+
+def stream_event(event, fmt, offer_json=None):
+    """
+    Одна строка потока: NDJSON или событие Server-Sent Events.
+    offer_json — уже сериализованное предложение, вставляется без повторного кодирования.
+    """
+    data = json.dumps(event, ensure_ascii=False, separators=(',', ':'))
+    if offer_json is not None:
+        data = data[:-1] + ',"offer":' + offer_json + '}'
+    if fmt == 'sse':
+        return f"event: {event['type']}\ndata: {data}\n\n"
+    return data + '\n'
+
+
+@bp.route('/search/stream', methods=['POST'])
+def search_flights_stream():
+    """
+    Потоковый поиск: рейсы уходят клиенту по одному, как только разобраны.
+    Формат — NDJSON, или SSE при Accept: text/event-stream. Для нескольких запросов
+    ({"queries": [...]}) результаты каждого отправляются по мере его завершения.
+    """
+    search_data = request.get_json()
+    if not search_data:
+        return jsonify({'error': 'No JSON data provided'}), 400
+
+    specs = search_data.get('queries') or [search_data]
+    if not isinstance(specs, list):
+        return jsonify({'error': 'queries must be a list'}), 400
+
+    params_list, invalid = [], {}
+    for i, spec in enumerate(specs):
+        try:
+            params_list.append((i, build_search_params(spec if isinstance(spec, dict) else {})))
+        except ValueError as e:
+            invalid[i] = str(e)
+
+    if len(specs) == 1 and invalid:
+        return jsonify({'error': invalid[0]}), 400
+
+    if len(params_list) == 1:
+        page_size = widen_for_snapshot(params_list[0][1])
+
+    fmt = 'sse' if 'text/event-stream' in request.headers.get('Accept', '') else 'ndjson'
+    app = current_app._get_current_object()
+    concurrency = current_app.config.get('SEARCH_FANOUT_CONCURRENCY', 8)
+
+    def search_in_thread(search_params):
+        with app.app_context():
+            return search_service.search(search_params)
+
+    def generate():
+        yield stream_event({'type': 'meta', 'queries': len(specs)}, fmt)
+        total = 0
+
+        for i, error in invalid.items():
+            yield stream_event({'type': 'error', 'query': i, 'error': error}, fmt)
+
+        if len(params_list) == 1:
+            # Один запрос — отдаём первую страницу рейсов сразу по мере разбора ответа Amadeus,
+            # а весь набор сохраняем в снимок для /search/page
+            i, search_params = params_list[0]
+            offers = []
+            try:
+                for offer_json in search_service.iter_search(search_params):
+                    offers.append(offer_json)
+                    if len(offers) <= page_size:
+                        yield stream_event({'type': 'offer', 'query': i}, fmt, offer_json)
+                total = min(len(offers), page_size)
+                snapshot_id = snapshot_store.create(search_cache.make_key(search_params), offers)
+                yield stream_event(dict({'type': 'query_done', 'query': i, 'total': total},
+                                        **page_links(snapshot_id, total, len(offers))), fmt)
+            except (RateLimitExceeded, CircuitOpenError) as e:
+                yield stream_event({'type': 'error', 'query': i, 'error': str(e),
+                                    'retryAfter': round(e.retry_after, 1)}, fmt)
+            except Exception as e:
+                logger.error(f"Stream search error: {e}", exc_info=True)
+                yield stream_event({'type': 'error', 'query': i, 'error': search_error_message(e)}, fmt)
+
+        elif params_list:
+            # Несколько запросов — параллельно, каждый отправляем, как только он готов
+            executor = ThreadPoolExecutor(max_workers=min(len(params_list), concurrency))
+            try:
+                futures = {executor.submit(search_in_thread, p): i for i, p in params_list}
+                for future in as_completed(futures):
+                    i = futures[future]
+                    try:
+                        flights, cache_status = future.result()
+                    except Exception as e:
+                        yield stream_event({'type': 'error', 'query': i, 'error': search_error_message(e)}, fmt)
+                        continue
+                    for flight in flights:
+                        yield stream_event({'type': 'offer', 'query': i, 'offer': flight}, fmt)
+                    total += len(flights)
+                    yield stream_event({'type': 'query_done', 'query': i, 'total': len(flights),
+                                        'cache': cache_status}, fmt)
+            finally:
+                # Клиент мог отключиться — не ждём оставшиеся поиски
+                executor.shutdown(wait=False, cancel_futures=True)
+
+        yield stream_event({'type': 'done', 'total': total}, fmt)
+
+    mimetype = 'text/event-stream' if fmt == 'sse' else 'application/x-ndjson'
+    return Response(
+        stream_with_context(generate()),
+        mimetype=mimetype,
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+
+@bp.route('/search/page')
+def search_page():
+    """Следующая страница результатов из снимка — без повторного запроса к Amadeus"""
+    try:
+        snapshot_id, offset = decode_cursor(request.args.get('cursor', ''))
+        limit = min(max(int(request.args.get('limit', 10)), 1), 100)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+
+    page = snapshot_store.page(snapshot_id, offset, limit)
+    if page is None:
+        return jsonify({'error': 'Search results expired, please search again'}), 410
+
+    offers, total = page
+    # Предложения в снимке уже сериализованы — страницу собираем склейкой строк
+    return offers_page_response(snapshot_id, offers, offset, total)
+
+
+@bp.route('/search/jobs/<job_id>')
+def search_job_status(job_id):
+    """
+    Состояние задания поиска. Пока оно в работе — 202 со статусом;
+    готовое — тот же ответ, что и у /search. ?wait=N — long-poll до N секунд.
+    """
+    try:
+        wait = min(max(float(request.args.get('wait', 0)), 0), current_app.config.get('SEARCH_JOB_MAX_WAIT', 25))
+    except ValueError:
+        return jsonify({'error': 'Invalid wait'}), 400
+
+    try:
+        from app.tasks import search_job_result
+        status, result = search_job_result(job_id, wait)
+    except Exception as e:
+        logger.error(f"Search job lookup error: {e}", exc_info=True)
+        return jsonify({'error': 'Search queue unavailable'}), 503
+
+    if status in ('pending', 'running'):
+        response = jsonify({'success': True, 'jobId': job_id, 'status': status})
+        response.status_code = 202
+        response.headers['Retry-After'] = '1'
+        return response
+    if status == 'failed':
+        return jsonify({'error': 'Search job failed', 'jobId': job_id, 'status': status}), 500
+
+    if 'error' in result:
+        response = jsonify({'error': result['error'], 'jobId': job_id, 'status': 'failed'})
+        if 'retry_after' in result:
+            response.headers['Retry-After'] = str(max(1, int(result['retry_after'] + 0.999)))
+        return response, result['status']
+
+    return flights_response(result['params'], result['flights'], result['cache_status'], result['page_size'],
+                            result.get('ranking'))
+
+
+@bp.route('/search/batch', methods=['POST'])
+async def search_batch():
+    """
+    Пакетный поиск: список спецификаций в формате /search.
+    Одинаковые поиски выполняются один раз, остальные — параллельно;
+    у каждого элемента свой результат или своя ошибка (медленный или упавший не тормозит остальные).
+    """
+    try:
+        payload = request.get_json()
+        specs = payload.get('searches') if isinstance(payload, dict) else payload
+        if not isinstance(specs, list) or not specs:
+            return jsonify({'error': 'Expected a non-empty list of searches'}), 400
+
+        max_searches = current_app.config.get('BATCH_MAX_SEARCHES', 50)
+        if len(specs) > max_searches:
+            return jsonify({'error': f'Too many searches in batch ({len(specs)} > {max_searches})'}), 400
+
+        results = [None] * len(specs)
+        unique = {}  # ключ кэша → (параметры, индексы элементов с этим поиском)
+
+        for i, spec in enumerate(specs):
+            try:
+                if not isinstance(spec, dict):
+                    raise ValueError('Search spec must be an object')
+                search_params = build_search_params(spec)
+            except ValueError as e:
+                results[i] = {'error': str(e)}
+                continue
+            key = search_cache.make_key(search_params)
+            unique.setdefault(key, (search_params, []))[1].append(i)
+
+        logger.info(f"Batch search: {len(specs)} items, {len(unique)} unique searches")
+
+        outcomes = await search_service.search_many_async(
+            [params for params, _ in unique.values()],
+            timeout=current_app.config.get('SEARCH_FANOUT_TIMEOUT', 20),
+            concurrency=current_app.config.get('SEARCH_FANOUT_CONCURRENCY', 8)
+        )
+
+        for (_, indexes), outcome in zip(unique.values(), outcomes):
+            if isinstance(outcome, (RateLimitExceeded, CircuitOpenError)):
+                item = {'error': str(outcome), 'retryAfter': round(outcome.retry_after, 1)}
+            elif isinstance(outcome, Exception):
+                item = {'error': search_error_message(outcome)}
+            else:
+                flights, cache_status = outcome
+                item = {'success': True, 'flights': flights, 'total': len(flights), 'cache': cache_status}
+            for i in indexes:
+                results[i] = item
+
+        for i, spec in enumerate(specs):
+            results[i] = dict(results[i], index=i)
+            if isinstance(spec, dict) and 'id' in spec:
+                results[i]['id'] = spec['id']
+
+        return json_response({
+            'success': True,
+            'results': results,
+            'total': len(results),
+            'failed': sum(1 for item in results if 'error' in item)
+        })
+
+    except Exception as e:
+        logger.error(f"Batch search error: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+def date_window(center, days):
+    """Даты center±days в ISO-формате, без прошедших"""
+    today = date.today()
+    dates = (center + timedelta(days=offset) for offset in range(-days, days + 1))
+    return [d.isoformat() for d in dates if d >= today]
+
+
+@bp.route('/api/calendar', methods=['POST'])
+async def price_calendar():
+    """
+    Календарь цен: самый дешёвый рейс на каждую дату в окне ±N дней
+    (и на каждую дату возврата, если указан returnDate). Поиски по датам идут параллельно.
+    """
+    try:
+        search_data = request.get_json()
+        if not search_data:
+            return jsonify({'error': 'No JSON data provided'}), 400
+
+        try:
+            base_params = build_search_params(search_data)
+            max_window = current_app.config.get('CALENDAR_MAX_WINDOW', 7)
+            window = int(search_data.get('window', 3))
+            return_window = int(search_data.get('returnWindow', window))
+            if not (0 <= window <= max_window and 0 <= return_window <= max_window):
+                raise ValueError(f'window must be between 0 and {max_window}')
+
+            departure_dates = date_window(date.fromisoformat(base_params['departureDate']), window)
+            if 'returnDate' in base_params:
+                return_dates = date_window(date.fromisoformat(base_params['returnDate']), return_window)
+            else:
+                return_dates = [None]
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        # Сетка (дата вылета, дата возврата) — возврат не раньше вылета
+        cells = [(dep, ret) for dep in departure_dates for ret in return_dates if ret is None or ret >= dep]
+        max_cells = current_app.config.get('CALENDAR_MAX_CELLS', 60)
+        if not cells:
+            return jsonify({'error': 'No future dates in the requested window'}), 400
+        if len(cells) > max_cells:
+            return jsonify({'error': f'Too many date combinations ({len(cells)} > {max_cells})'}), 400
+
+        params_list = []
+        for dep, ret in cells:
+            params = dict(base_params, departureDate=dep)
+            params.pop('returnDate', None)
+            if ret is not None:
+                params['returnDate'] = ret
+            params_list.append(params)
+
+        logger.info(f"Price calendar {base_params['originLocationCode']}-{base_params['destinationLocationCode']}: "
+                    f"{len(params_list)} searches")
+
+        results = await search_service.search_many_async(
+            params_list,
+            timeout=current_app.config.get('SEARCH_FANOUT_TIMEOUT', 20),
+            concurrency=current_app.config.get('SEARCH_FANOUT_CONCURRENCY', 8)
+        )
+
+        # Компактная матрица: строки — даты вылета, столбцы — даты возврата
+        column = {ret: i for i, ret in enumerate(return_dates)}
+        row = {dep: i for i, dep in enumerate(departure_dates)}
+        prices = [[None] * len(return_dates) for _ in departure_dates]
+        errors = {}
+        cheapest = None
+        currency = None
+
+        for (dep, ret), result in zip(cells, results):
+            if isinstance(result, Exception):
+                errors[dep if ret is None else f"{dep}/{ret}"] = str(result)
+                continue
+            offer = cheapest_offer(result[0])
+            if offer is None:
+                continue
+            prices[row[dep]][column[ret]] = offer['price']
+            currency = currency or offer['currency']
+            if cheapest is None or offer['price'] < cheapest['offer']['price']:
+                cheapest = {'departureDate': dep, 'returnDate': ret, 'offer': offer}
+
+        return json_response({
+            'success': True,
+            'origin': base_params['originLocationCode'],
+            'destination': base_params['destinationLocationCode'],
+            'currency': currency,
+            'departureDates': departure_dates,
+            'returnDates': return_dates,
+            'prices': prices,
+            'cheapest': cheapest,
+            'errors': errors
+        })
+
+    except Exception as e:
+        logger.error(f"Price calendar error: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
+@bp.route('/api/prices/trends')
+def price_trends():
+    """
+    Тренды цен по маршруту из локальной истории — без запросов к Amadeus.
+    ?origin=MOW&destination=LED&from=2025-07-01&to=2025-07-31&days=30&roundTrip=0
+    """
+    try:
+        origin = extract_iata_code(request.args.get('origin'))
+        destination = extract_iata_code(request.args.get('destination'))
+        if not origin or not destination:
+            return jsonify({'error': 'Invalid origin or destination'}), 400
+        try:
+            date_from = date.fromisoformat(request.args.get('from', ''))
+            date_to = date.fromisoformat(request.args.get('to') or date_from.isoformat())
+            days = int(request.args.get('days', 30))
+            limit = int(request.args.get('limit', 5))
+        except ValueError:
+            return jsonify({'error': 'from/to must be YYYY-MM-DD, days and limit must be integers'}), 400
+
+        max_range = current_app.config.get('PRICE_TRENDS_MAX_RANGE', 366)
+        if date_to < date_from or (date_to - date_from).days > max_range:
+            return jsonify({'error': f'Date range must be 0..{max_range} days'}), 400
+        if not (1 <= days <= 365 and 1 <= limit <= 50):
+            return jsonify({'error': 'days must be 1..365, limit 1..50'}), 400
+
+        query = (origin, destination, date_from.isoformat(), date_to.isoformat(),
+                 request.args.get('roundTrip', '0').lower() in ['true', '1', 'yes'], days)
+        with span('history'):
+            dates = price_history.trends(*query)
+            cheapest = price_history.cheapest(*query, limit=limit)
+
+        return json_response({
+            'success': True,
+            'origin': origin,
+            'destination': destination,
+            'dates': dates,
+            'cheapest': cheapest
+        })
+
+    except Exception as e:
+        logger.error(f"Price trends error: {e}", exc_info=True)
+        return jsonify({'error': str(e)}), 500
+
+
 @bp.route('/test-search')
 def test_search():
     """Тестовый маршрут для проверки поиска"""
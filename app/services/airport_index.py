@@ -0,0 +1,205 @@
+import bisect
+import csv
+import logging
+import os
+import threading
+import time
+import unicodedata
+from collections import OrderedDict
+
+logger = logging.getLogger(__name__)
+
+# Справочник аэропортов, поставляемый вместе с приложением
+DEFAULT_DATASET = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'data', 'airports.csv')
+
+# Транслитерация кириллицы → латиница (чтобы "moskva" находило Москву)
+_TRANSLIT = {
+    'а': 'a', 'б': 'b', 'в': 'v', 'г': 'g', 'д': 'd', 'е': 'e', 'ж': 'zh', 'з': 'z',
+    'и': 'i', 'й': 'y', 'к': 'k', 'л': 'l', 'м': 'm', 'н': 'n', 'о': 'o', 'п': 'p',
+    'р': 'r', 'с': 's', 'т': 't', 'у': 'u', 'ф': 'f', 'х': 'kh', 'ц': 'ts', 'ч': 'ch',
+    'ш': 'sh', 'щ': 'shch', 'ъ': '', 'ы': 'y', 'ь': '', 'э': 'e', 'ю': 'yu', 'я': 'ya',
+}
+
+# Виды ключей — чем меньше число, тем выше позиция в выдаче
+KIND_CODE = 0
+KIND_CITY = 1
+KIND_NAME = 2
+KIND_WORD = 3
+
+
+def normalize(text):
+    """Приводит строку к виду для поиска: нижний регистр, без диакритики и пунктуации"""
+    if not text:
+        return ''
+    text = str(text).lower().replace('ё', 'е')
+    # Убираем диакритику у латиницы (Zürich → zurich); «й» при разложении потерял бы бреве
+    text = ''.join(
+        ch if ch == 'й' else ''.join(c for c in unicodedata.normalize('NFKD', ch) if not unicodedata.combining(c))
+        for ch in text
+    )
+    return ' '.join(''.join(ch if ch.isalnum() else ' ' for ch in text).split())
+
+
+def transliterate(text):
+    """Транслитерирует нормализованную кириллическую строку в латиницу"""
+    return ''.join(_TRANSLIT.get(ch, ch) for ch in text)
+
+
+class AirportIndex:
+    """
+    Встроенный индекс аэропортов для автодополнения без обращения к сети.
+
+    Ключи (IATA-код, город, название аэропорта, отдельные слова и транслитерация)
+    хранятся в отсортированном массиве — поиск по префиксу делается через bisect.
+    Запись идёт по принципу copy-on-write, поэтому чтение не требует блокировок.
+
+    Справочник неполный, поэтому запросы, по которым локально не нашлось ничего,
+    уходят в Amadeus; ответы Amadeus индекс помнит (remote_suggestions),
+    чтобы не ходить в сеть на каждое нажатие клавиши.
+    """
+
+    REMOTE_MEMO_SIZE = 4096
+    REMOTE_MEMO_TTL = 3600  # сек — потом спросим снова (ответ мог быть пустым из-за ошибки)
+
+    def __init__(self):
+        # (отсортированные ключи, (вид ключа, позиция) для каждого ключа, описания аэропортов)
+        self._state = ([], [], [])
+        self._codes = {}     # IATA-код → позиция
+        self._lock = threading.Lock()
+        self._remote = OrderedDict()  # нормализованный запрос → (когда спрашивали, ответ Amadeus)
+        self._remote_lock = threading.Lock()
+
+    @classmethod
+    def from_csv(cls, path=DEFAULT_DATASET):
+        """Строит индекс из CSV-справочника"""
+        index = cls()
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+        count = index.add(rows)
+        logger.info(f"Airport index built: {count} airports from {os.path.basename(path)}")
+        return index
+
+    def __len__(self):
+        return len(self._state[2])
+
+    def __contains__(self, code):
+        return str(code).upper() in self._codes
+
+    def add(self, airports):
+        """
+        Добавляет аэропорты в индекс (например, найденные через Amadeus).
+        Уже известные коды пропускаются. Возвращает число добавленных записей.
+        """
+        with self._lock:
+            keys, refs, current = self._state
+            entries = list(current)
+            codes = dict(self._codes)
+            pairs = []
+
+            for airport in airports:
+                code = str(airport.get('code') or airport.get('iata') or '').strip().upper()
+                if len(code) != 3 or not code.isalpha() or code in codes:
+                    continue
+                try:
+                    weight = float(airport.get('weight') or 0)
+                except (TypeError, ValueError):
+                    weight = 0.0
+
+                position = len(entries)
+                entries.append({
+                    'code': code,
+                    'name': airport.get('name', ''),
+                    'city': airport.get('city', ''),
+                    'country': airport.get('country', ''),
+                    'weight': weight,
+                })
+                codes[code] = position
+                pairs.extend((key, (kind, position)) for key, kind in self._keys_for(code, airport))
+
+            if not pairs:
+                return 0
+
+            merged = sorted(list(zip(keys, refs)) + pairs)
+            self._state = ([key for key, _ in merged], [ref for _, ref in merged], entries)
+            self._codes = codes
+            return len(entries) - len(current)
+
+    @staticmethod
+    def _keys_for(code, airport):
+        """Генерирует ключи поиска для одного аэропорта"""
+        keys = {code.lower(): KIND_CODE}
+
+        def put(key, kind):
+            if key and kind < keys.get(key, KIND_WORD + 1):
+                keys[key] = kind
+
+        for field, kind in (('city', KIND_CITY), ('city_ru', KIND_CITY), ('name', KIND_NAME)):
+            value = normalize(airport.get(field, ''))
+            if not value:
+                continue
+            variants = {value, transliterate(value)}
+            for variant in variants:
+                put(variant, kind)
+                for word in variant.split()[1:]:
+                    put(word, KIND_WORD)
+
+        return keys.items()
+
+    def search(self, query, limit=5):
+        """Возвращает до limit аэропортов, ключи которых начинаются с query"""
+        q = normalize(query)
+        if not q:
+            return []
+
+        # Снимок состояния — параллельный add() подменяет его целиком
+        keys, refs, entries = self._state
+        best = {}
+        i = bisect.bisect_left(keys, q)
+        while i < len(keys) and keys[i].startswith(q):
+            kind, position = refs[i]
+            # Точное совпадение IATA-кода всегда первое
+            rank = -1 if kind == KIND_CODE and keys[i] == q else kind
+            if rank < best.get(position, KIND_WORD + 1):
+                best[position] = rank
+            i += 1
+
+        ranked = sorted(best, key=lambda p: (best[p], -entries[p]['weight'], entries[p]['code']))
+        return [
+            {
+                'code': entries[p]['code'],
+                'name': entries[p]['name'],
+                'city': entries[p]['city'],
+                'country': entries[p]['country'],
+            }
+            for p in ranked[:limit]
+        ]
+
+    def remote_suggestions(self, query, limit):
+        """
+        Что Amadeus уже ответил на этот запрос, или None — его надо спросить.
+        Если более короткий префикс вернул меньше limit, по длинному Amadeus не найдёт ничего
+        нового (найденное по префиксу уже в индексе) — спрашивать не нужно, ответ [].
+        """
+        q = normalize(query)
+        if not q:
+            return []
+        now = time.time()
+        with self._remote_lock:
+            for n in range(len(q), 1, -1):
+                memo = self._remote.get(q[:n])
+                if memo is None or memo[0] <= now - self.REMOTE_MEMO_TTL:
+                    continue
+                if n == len(q):
+                    return memo[1]
+                if len(memo[1]) < limit:
+                    return []
+        return None
+
+    def remember_remote(self, query, airports):
+        """Запоминает ответ Amadeus на запрос (в том числе пустой)"""
+        q = normalize(query)
+        with self._remote_lock:
+            self._remote.pop(q, None)
+            self._remote[q] = (time.time(), airports)
+            while len(self._remote) > self.REMOTE_MEMO_SIZE:
+                self._remote.popitem(last=False)
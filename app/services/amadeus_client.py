@@ -1,146 +1,208 @@
 import requests
-from flask import current_app
 import time
 import logging
 
-logger = logging.getLogger(__name__)
-
-
-class AmadeusClient:
-    def __init__(self):
-        # ❗ ВАЖНО: УБРАЛ ЛИШНИЙ ПРОБЕЛ В КОНЦЕ URL
-        self.base_url = "https://test.api.amadeus.com"
-        self.token_url = f"{self.base_url}/v1/security/oauth2/token"
-        self._token_cache = None
-        self._token_expiry = 0
-        self.last_request_time = 0
-        self.request_delay = 1.0  # начальная задержка
-        self.max_delay = 5.0      # максимальная задержка
+from app.services.circuit_breaker import (circuit_breaker, CircuitOpenError, Deadline, DeadlineExceeded, backoff_delay,
+                                          is_transient)
+from app.services.credential_pool import credential_pool
+from app.services.fork_safety import after_fork
+from app.services.metrics import span, UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+from app.services.rate_limiter import rate_limiter, RateLimitExceeded
+from app.services.token_store import token_store
 
-    def _get_access_token(self):
-        """Получение access token с кэшированием"""
-        if self._token_cache and time.time() < self._token_expiry:
-            return self._token_cache
+logger = logging.getLogger(__name__)
 
-        try:
-            logger.info("Requesting new access token from Amadeus...")
-            response = requests.post(
-                self.token_url,
-                data={
-                    'grant_type': 'client_credentials',
-                    'client_id': current_app.config['AMADEUS_API_KEY'],
-                    'client_secret': current_app.config['AMADEUS_API_SECRET']
-                },
-                headers={'Content-Type': 'application/x-www-form-urlencoded'},
-                timeout=10
-            )
+DEFAULT_BASE_URL = "https://test.api.amadeus.com"
 
-            logger.info(f"Token response status: {response.status_code}")
 
-            if response.status_code != 200:
-                error_detail = response.json() if response.content else response.text
-                logger.error(f"Token request failed: {error_detail}")
-                raise Exception(f"Token request failed: {response.status_code}")
+def request_access_token(token_url, api_key, api_secret):
+    """Запрашивает у Amadeus новый access token. Возвращает (token, expires_in)"""
+    try:
+        logger.info("Requesting new access token from Amadeus...")
+        response = requests.post(
+            token_url,
+            data={
+                'grant_type': 'client_credentials',
+                'client_id': api_key,
+                'client_secret': api_secret
+            },
+            headers={'Content-Type': 'application/x-www-form-urlencoded'},
+            timeout=10
+        )
 
-            token_data = response.json()
-            self._token_cache = token_data['access_token']
-            # Обновляем за 60 секунд до истечения
-            self._token_expiry = time.time() + token_data.get('expires_in', 1800) - 60
+        logger.info(f"Token response status: {response.status_code}")
 
-            logger.info("Successfully obtained access token")
-            return self._token_cache
+        if response.status_code != 200:
+            error_detail = response.json() if response.content else response.text
+            logger.error(f"Token request failed: {error_detail}")
+            raise Exception(f"Token request failed: {response.status_code}")
 
-        except requests.exceptions.RequestException as e:
-            logger.error(f"Amadeus token error: {e}")
-            raise Exception("Failed to get access token")
+        token_data = response.json()
+        logger.info("Successfully obtained access token")
+        return token_data['access_token'], token_data.get('expires_in', 1800)
 
-    def _rate_limit(self):
-        """Задержка между запросами чтобы избежать 429 ошибок"""
-        current_time = time.time()
-        time_since_last_request = current_time - self.last_request_time
+    except requests.exceptions.RequestException as e:
+        logger.error(f"Amadeus token error: {e}")
+        raise Exception("Failed to get access token")
 
-        if time_since_last_request < self.request_delay:
-            sleep_time = self.request_delay - time_since_last_request
-            logger.info(f"Rate limiting: sleeping for {sleep_time:.2f}s")
-            time.sleep(sleep_time)
 
-        self.last_request_time = time.time()
+class AmadeusClient:
+    def __init__(self, base_url=DEFAULT_BASE_URL):
+        # ❗ ВАЖНО: УБРАЛ ЛИШНИЙ ПРОБЕЛ В КОНЦЕ URL
+        self.configure(base_url)
+        self.penalty_429 = 1.0    # на сколько секунд притормозить всех после 429
+        self.max_penalty = 5.0    # максимальный штраф
+        self.deadline = 10.0      # сек на запрос вместе с повторами и паузами
+        self._session = None
+        after_fork(self._reset_session)
+
+    def configure(self, base_url, deadline=None):
+        """Задаёт адрес API (например, локальной заглушки для бенчмарков) и общий срок запроса"""
+        self.base_url = base_url.rstrip('/')
+        self.token_url = f"{self.base_url}/v1/security/oauth2/token"
+        if deadline is not None:
+            self.deadline = deadline
+
+    def _http(self):
+        """Пул keep-alive соединений процесса: TLS-рукопожатие с Amadeus не на каждый запрос"""
+        if self._session is None:
+            session = requests.Session()
+            session.mount('https://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+            session.mount('http://', requests.adapters.HTTPAdapter(pool_maxsize=20))
+            self._session = session
+        return self._session
+
+    def _reset_session(self):
+        # Сокеты родителя после fork общие с ним — дочерний процесс открывает свои
+        self._session = None
+
+    def _get_access_token(self, credential):
+        """
+        Access token ключа из общего для всех воркеров хранилища.
+        Обновляется заранее в фоне, так что сетевой запрос здесь — только при холодном старте.
+        """
+        token_url = self.token_url
+        with span('token'):
+            return token_store.get_token(
+                credential.id,
+                lambda: request_access_token(token_url, credential.api_key, credential.api_secret)
+            )
 
-    def _make_request_with_retry(self, method, url, headers=None, params=None, data=None, max_retries=3):
-        """Выполняет HTTP-запрос с повторными попытками при 429/400 ошибках"""
+    def _rate_limit(self, bucket, deadline):
+        """
+        Резервирует токен в общем для всех воркеров бюджете.
+        Короткую очередь выдерживаем — не дольше RATE_LIMIT_MAX_WAIT и оставшегося срока запроса;
+        очередь длиннее — сразу RateLimitExceeded (клиент получит 429 с Retry-After).
+        """
+        with span('rate_limit'):
+            wait = rate_limiter.acquire(bucket, max_wait=deadline.wait_budget(rate_limiter.max_wait))
+            if wait > 0:
+                logger.info("Rate limiting (%s): reserved slot in %.2fs", bucket, wait)
+                time.sleep(wait)
+
+    def _make_request_with_retry(self, method, url, headers=None, params=None, data=None, max_retries=3,
+                                 bucket='search'):
+        """
+        Выполняет HTTP-запрос с повторами только временных сбоев (429, 5xx, сеть)
+        в пределах общего срока self.deadline. Ошибки запроса (4xx) не повторяются.
+        Пока цепь bucket разомкнута — сразу CircuitOpenError, без обращения к Amadeus.
+        Каждая попытка идёт с ключом пула, у которого больше всего свободного бюджета,
+        так что повтор после 429 уходит уже с другим ключом.
+        """
+        deadline = Deadline(self.deadline)
         for attempt in range(max_retries + 1):
+            circuit_breaker.before_request(bucket)
+            credential = credential_pool.choose(bucket)
+            budget = credential_pool.budget(bucket, credential)
+            token = self._get_access_token(credential)
             try:
-                self._rate_limit()
-                response = requests.request(
-                    method=method,
-                    url=url,
-                    headers=headers,
-                    params=params,
-                    data=data,
-                    timeout=15
-                )
-
-                if response.status_code == 429:
-                    # Увеличиваем задержку, но не больше max_delay
-                    self.request_delay = min(self.request_delay * 1.5, self.max_delay)
-                    logger.warning(f"Rate limit 429 on attempt {attempt + 1}. New delay: {self.request_delay:.2f}s")
-
-                    if attempt < max_retries:
-                        time.sleep(self.request_delay)
-                        continue
-                    else:
-                        raise Exception("Rate limit exceeded after retries")
-
-                elif response.status_code == 400:
-                    # Пробуем повторить 400 ошибку — иногда это временные сбои
-                    logger.warning(f"Bad Request 400 on attempt {attempt + 1}: {response.text[:200]}")
-                    if attempt < max_retries:
-                        time.sleep(2)  # ждём 2 секунды
-                        continue
-
-                # Для любых других ошибок — пробуем повторить только если 5xx
-                if 500 <= response.status_code < 600 and attempt < max_retries:
-                    logger.warning(f"Server error {response.status_code} on attempt {attempt + 1}")
-                    time.sleep(3)
-                    continue
-
-                response.raise_for_status()
-                return response
-
-            except requests.exceptions.RequestException as e:
+                self._rate_limit(budget, deadline)
+                with span('upstream'):
+                    response = self._http().request(
+                        method=method,
+                        url=url,
+                        headers=dict(headers or {}, Authorization=f'Bearer {token}'),
+                        params=params,
+                        data=data,
+                        timeout=deadline.timeout(15)
+                    )
+            except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as e:
+                UPSTREAM_RESPONSES.inc(endpoint=bucket, status='error')
+                circuit_breaker.record_failure(bucket)
+                delay = backoff_delay(attempt)
                 if attempt == max_retries:
                     raise
-                logger.warning(f"Request failed (attempt {attempt + 1}): {e}. Retrying...")
-                time.sleep(2 ** attempt)  # экспоненциальная задержка
+                if not deadline.allows(delay):
+                    # На повтор срока не осталось — это истёкший срок запроса, а не ошибка Amadeus
+                    raise DeadlineExceeded("Amadeus request deadline exceeded") from e
+                logger.warning(f"Request failed (attempt {attempt + 1}): {e}. Retrying in {delay:.2f}s...")
+                UPSTREAM_RETRIES.inc(endpoint=bucket, reason='network')
+                with span('backoff'):
+                    time.sleep(delay)
+                continue
+            UPSTREAM_RESPONSES.inc(endpoint=bucket, status=response.status_code)
+
+            if response.status_code == 429:
+                # Штрафуем бюджет ключа — следующая резервация (и у других воркеров) подождёт
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    penalty = min(float(retry_after), self.max_penalty)
+                else:
+                    penalty = min(self.penalty_429 * (1.5 ** attempt), self.max_penalty)
+                rate_limiter.penalize(budget, penalty)
+                switched = credential_pool.eject(credential, penalty)
+                logger.warning(f"Rate limit 429 on attempt {attempt + 1}. Budget '{budget}' penalized by {penalty:.2f}s")
+
+                # С другим ключом повторяем сразу, с тем же — только если успеем переждать штраф
+                if attempt < max_retries and (switched or deadline.allows(penalty)):
+                    UPSTREAM_RETRIES.inc(endpoint=bucket, reason='429')
+                    continue
+                raise RateLimitExceeded(bucket, penalty)
+            credential_pool.record_success(credential)
+
+            if is_transient(response.status_code):
+                circuit_breaker.record_failure(bucket)
+                delay = backoff_delay(attempt)
+                if attempt < max_retries and deadline.allows(delay):
+                    logger.warning(f"Server error {response.status_code} on attempt {attempt + 1}, retrying in {delay:.2f}s")
+                    UPSTREAM_RETRIES.inc(endpoint=bucket, reason='5xx')
+                    with span('backoff'):
+                        time.sleep(delay)
+                    continue
+            else:
+                # Amadeus ответил — он жив, даже если запрос ошибочный (4xx повторять бесполезно)
+                circuit_breaker.record_success(bucket)
+                if response.status_code >= 400:
+                    logger.warning(f"Client error {response.status_code}, not retrying: {response.text[:200]}")
+
+            response.raise_for_status()
+            return response
 
         raise Exception("Max retries exceeded")
 
     def search_flights(self, search_params):
         """Поиск авиабилетов с retry-логикой"""
-        token = self._get_access_token()
-
         # Очищаем параметры — убираем None и пустые строки
         clean_params = {k: v for k, v in search_params.items() if v not in (None, '', 'null')}
 
         try:
-            logger.info(f"Searching flights with params: {clean_params}")
+            logger.info("Searching flights with params: %s", clean_params)
 
             response = self._make_request_with_retry(
                 method='GET',
                 url=f"{self.base_url}/v2/shopping/flight-offers",
-                headers={
-                    'Authorization': f'Bearer {token}',
-                    'Content-Type': 'application/json'
-                },
+                headers={'Content-Type': 'application/json'},
                 params=clean_params
             )
 
             data = response.json()
             count = data.get('meta', {}).get('count', len(data.get('data', [])))
-            logger.info(f"Found {count} flights")
+            logger.info("Found %s flights", count)
 
             return data
 
+        except (RateLimitExceeded, CircuitOpenError, DeadlineExceeded):
+            raise
         except Exception as e:
             logger.error(f"Amadeus search error: {e}")
             # Пытаемся извлечь детали ошибки
@@ -158,23 +220,22 @@ class AmadeusClient:
         if not keyword or len(keyword.strip()) < 2:
             return {'data': []}
 
-        token = self._get_access_token()
-
         try:
             response = self._make_request_with_retry(
                 method='GET',
                 url=f"{self.base_url}/v1/reference-data/locations",
-                headers={'Authorization': f'Bearer {token}'},
                 params={
                     'subType': 'AIRPORT',
                     'keyword': keyword.strip(),
                     'page[limit]': 5
                 },
-                max_retries=1  # не критично, можно не повторять много раз
+                max_retries=1,  # не критично, можно не повторять много раз
+                bucket='reference'
             )
 
             return response.json()
 
         except Exception as e:
             logger.warning(f"Airport suggestions error (non-critical): {e}")
-            return {'data': []}  # всегда возвращаем что-то
\ No newline at end of file
+            # всегда возвращаем что-то; 'error' — чтобы пустой ответ из-за сбоя не запомнили
+            return {'data': [], 'error': str(e)}
\ No newline at end of file
@@ -0,0 +1,278 @@
+import asyncio
+import logging
+import threading
+
+import httpx
+
+from app.services.amadeus_client import DEFAULT_BASE_URL, request_access_token
+from app.services.circuit_breaker import (circuit_breaker, CircuitOpenError, Deadline, DeadlineExceeded, backoff_delay,
+                                          is_transient)
+from app.services.credential_pool import credential_pool
+from app.services.fork_safety import after_fork
+from app.services.metrics import bind_timings, current_timings, span, UPSTREAM_RESPONSES, UPSTREAM_RETRIES
+from app.services.rate_limiter import rate_limiter, RateLimitExceeded
+from app.services.token_store import token_store
+
+logger = logging.getLogger(__name__)
+
+
+class AsyncAmadeusClient:
+    """
+    Асинхронный клиент Amadeus с пулом keep-alive соединений.
+
+    Flask запускает каждое async-представление в своём event loop, а пул httpx
+    привязан к одному loop. Поэтому клиент держит собственный loop в фоновом потоке:
+    публичные корутины пересылают работу туда, и соединения переиспользуются
+    между запросами, а один воркер может держать много запросов к Amadeus одновременно.
+    """
+
+    def __init__(self, base_url=DEFAULT_BASE_URL, max_connections=20, max_keepalive_connections=10):
+        self.configure(base_url)
+        self.limits = httpx.Limits(
+            max_connections=max_connections,
+            max_keepalive_connections=max_keepalive_connections,
+            keepalive_expiry=30
+        )
+        self.penalty_429 = 1.0    # на сколько секунд притормозить всех после 429
+        self.max_penalty = 5.0    # максимальный штраф
+        self.deadline = 10.0      # сек на запрос вместе с повторами и паузами
+
+        self._reset_loop()
+        after_fork(self._reset_loop)
+
+    def _reset_loop(self):
+        # Поток с loop после fork в дочернем процессе не существует — он запустится заново
+        self._loop = None
+        self._http = None
+        self._token_lock = None
+        self._start_lock = threading.Lock()
+
+    def configure(self, base_url, deadline=None):
+        """Задаёт адрес API (например, локальной заглушки для бенчмарков) и общий срок запроса"""
+        self.base_url = base_url.rstrip('/')
+        self.token_url = f"{self.base_url}/v1/security/oauth2/token"
+        if deadline is not None:
+            self.deadline = deadline
+
+    # === Фоновый event loop ===
+
+    def _ensure_loop(self):
+        if self._loop is not None:
+            return
+        with self._start_lock:
+            if self._loop is not None:
+                return
+            loop = asyncio.new_event_loop()
+            ready = threading.Event()
+
+            def run():
+                asyncio.set_event_loop(loop)
+                self._http = httpx.AsyncClient(limits=self.limits, timeout=15)
+                self._token_lock = asyncio.Lock()
+                ready.set()
+                loop.run_forever()
+
+            threading.Thread(target=run, name='amadeus-async-loop', daemon=True).start()
+            ready.wait()
+            self._loop = loop
+            logger.info("Async Amadeus client loop started")
+
+    async def _call(self, coro):
+        """Выполняет корутину в loop клиента и дожидается её из текущего loop"""
+        self._ensure_loop()
+        try:
+            if asyncio.get_running_loop() is self._loop:
+                return await coro
+        except RuntimeError:
+            pass
+        future = asyncio.run_coroutine_threadsafe(self._with_timings(coro, current_timings()), self._loop)
+        return await asyncio.wrap_future(future)
+
+    @staticmethod
+    async def _with_timings(coro, timings):
+        # Этапы, замеренные в loop клиента, попадают в Server-Timing исходного запроса
+        bind_timings(timings)
+        return await coro
+
+    def close(self):
+        """Закрывает пул соединений и останавливает фоновый loop"""
+        if self._loop is None:
+            return
+        asyncio.run_coroutine_threadsafe(self._http.aclose(), self._loop).result(timeout=5)
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._loop = None
+
+    # === Внутренние корутины (выполняются в loop клиента) ===
+
+    @staticmethod
+    async def _offload(fn, *args):
+        """
+        Вызов общего хранилища (rate limiter, пул ключей, токены) в пуле потоков:
+        с file/redis backend это flock или сетевой запрос, и на loop клиента
+        он задержал бы все остальные запросы воркера
+        """
+        return await asyncio.get_running_loop().run_in_executor(None, fn, *args)
+
+    def _stored_token(self, credential):
+        # Фоновое обновление токена запускается однажды на процесс; сам токен — из хранилища
+        token_url = self.token_url
+        token_store.ensure_refresher(
+            credential.id, lambda: request_access_token(token_url, credential.api_key, credential.api_secret)
+        )
+        return token_store.peek(credential.id)
+
+    async def _get_access_token(self, credential):
+        """
+        Access token ключа из общего хранилища (его обновляет фоновый поток).
+        Сами запрашиваем токен только при холодном старте — и только один на все воркеры.
+        """
+        token = await self._offload(self._stored_token, credential)
+        if token is not None:
+            return token
+
+        with span('token'):
+            return await self._fetch_access_token(credential)
+
+    async def _fetch_access_token(self, credential):
+        """
+        Холодный старт: токен через token_store под межпроцессной блокировкой —
+        один запрос на все воркеры. Хранилище блокирующее, поэтому ждём его в пуле потоков,
+        а asyncio.Lock не даёт занять под это несколько потоков одного процесса.
+        """
+        async with self._token_lock:
+            token = await self._offload(token_store.peek, credential.id)
+            if token is not None:
+                return token
+
+            token_url = self.token_url
+            return await self._offload(
+                token_store.get_token,
+                credential.id,
+                lambda: request_access_token(token_url, credential.api_key, credential.api_secret)
+            )
+
+    async def _rate_limit(self, bucket, deadline):
+        """Резервирует токен в общем бюджете и ждёт свою очередь без блокировки потока"""
+        with span('rate_limit'):
+            wait = await self._offload(rate_limiter.acquire, bucket, 1, deadline.wait_budget(rate_limiter.max_wait))
+            if wait > 0:
+                await asyncio.sleep(wait)
+
+    async def _make_request_with_retry(self, method, url, headers=None, params=None, max_retries=3,
+                                       bucket='search'):
+        """Асинхронный аналог AmadeusClient._make_request_with_retry"""
+        deadline = Deadline(self.deadline)
+        for attempt in range(max_retries + 1):
+            circuit_breaker.before_request(bucket)
+            credential = await self._offload(credential_pool.choose, bucket)
+            budget = credential_pool.budget(bucket, credential)
+            token = await self._get_access_token(credential)
+            try:
+                await self._rate_limit(budget, deadline)
+                with span('upstream'):
+                    response = await self._http.request(
+                        method, url, headers=dict(headers or {}, Authorization=f'Bearer {token}'),
+                        params=params, timeout=deadline.timeout(15)
+                    )
+            except httpx.TransportError as e:
+                UPSTREAM_RESPONSES.inc(endpoint=bucket, status='error')
+                circuit_breaker.record_failure(bucket)
+                delay = backoff_delay(attempt)
+                if attempt == max_retries:
+                    raise
+                if not deadline.allows(delay):
+                    # На повтор срока не осталось — это истёкший срок запроса, а не ошибка Amadeus
+                    raise DeadlineExceeded("Amadeus request deadline exceeded") from e
+                logger.warning(f"Request failed (attempt {attempt + 1}): {e}. Retrying in {delay:.2f}s...")
+                UPSTREAM_RETRIES.inc(endpoint=bucket, reason='network')
+                with span('backoff'):
+                    await asyncio.sleep(delay)
+                continue
+            UPSTREAM_RESPONSES.inc(endpoint=bucket, status=response.status_code)
+
+            if response.status_code == 429:
+                retry_after = response.headers.get('Retry-After', '')
+                if retry_after.isdigit():
+                    penalty = min(float(retry_after), self.max_penalty)
+                else:
+                    penalty = min(self.penalty_429 * (1.5 ** attempt), self.max_penalty)
+                await self._offload(rate_limiter.penalize, budget, penalty)
+                switched = credential_pool.eject(credential, penalty)
+                logger.warning(f"Rate limit 429 on attempt {attempt + 1}. Budget '{budget}' penalized by {penalty:.2f}s")
+                if attempt < max_retries and (switched or deadline.allows(penalty)):
+                    UPSTREAM_RETRIES.inc(endpoint=bucket, reason='429')
+                    continue
+                raise RateLimitExceeded(bucket, penalty)
+            credential_pool.record_success(credential)
+
+            if is_transient(response.status_code):
+                circuit_breaker.record_failure(bucket)
+                delay = backoff_delay(attempt)
+                if attempt < max_retries and deadline.allows(delay):
+                    logger.warning(f"Server error {response.status_code} on attempt {attempt + 1}, retrying in {delay:.2f}s")
+                    UPSTREAM_RETRIES.inc(endpoint=bucket, reason='5xx')
+                    with span('backoff'):
+                        await asyncio.sleep(delay)
+                    continue
+            else:
+                circuit_breaker.record_success(bucket)
+                if response.status_code >= 400:
+                    logger.warning(f"Client error {response.status_code}, not retrying: {response.text[:200]}")
+
+            response.raise_for_status()
+            return response
+
+        raise Exception("Max retries exceeded")
+
+    async def _search_flights(self, search_params):
+        clean_params = {k: v for k, v in search_params.items() if v not in (None, '', 'null')}
+
+        try:
+            response = await self._make_request_with_retry(
+                'GET',
+                f"{self.base_url}/v2/shopping/flight-offers",
+                params=clean_params
+            )
+            return response.json()
+        except (RateLimitExceeded, CircuitOpenError, DeadlineExceeded):
+            raise
+        except httpx.HTTPStatusError as e:
+            try:
+                error_detail = e.response.json()
+            except ValueError:
+                error_detail = e.response.text[:200]
+            logger.error(f"Amadeus error details: {error_detail}")
+            raise Exception(f"Amadeus API error: {error_detail}")
+        except Exception as e:
+            logger.error(f"Amadeus search error: {e}")
+            raise Exception("Flight search failed")
+
+    async def _get_airport_suggestions(self, keyword):
+        try:
+            response = await self._make_request_with_retry(
+                'GET',
+                f"{self.base_url}/v1/reference-data/locations",
+                params={
+                    'subType': 'AIRPORT',
+                    'keyword': keyword.strip(),
+                    'page[limit]': 5
+                },
+                max_retries=1,
+                bucket='reference'
+            )
+            return response.json()
+        except Exception as e:
+            logger.warning(f"Airport suggestions error (non-critical): {e}")
+            return {'data': [], 'error': str(e)}
+
+    # === Публичный API ===
+
+    async def search_flights(self, search_params):
+        """Поиск авиабилетов (awaitable)"""
+        return await self._call(self._search_flights(search_params))
+
+    async def get_airport_suggestions(self, keyword):
+        """Автодополнение для аэропортов (awaitable)"""
+        if not keyword or len(keyword.strip()) < 2:
+            return {'data': []}
+        return await self._call(self._get_airport_suggestions(keyword))
@@ -1,6 +1,233 @@
+import hashlib
+import json
+import logging
+import threading
+import time
+from collections import OrderedDict
+
 from flask_caching import Cache
 
+try:
+    import redis
+except ImportError:  # Redis-уровень необязателен — без него работает только LRU
+    redis = None
+
+logger = logging.getLogger(__name__)
+
 cache = Cache()
 
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш в памяти процесса с ограничением по числу записей"""
+
+    def __init__(self, maxsize=512):
+        self.maxsize = maxsize
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                self._data.move_to_end(key)
+            return entry
+
+    def set(self, key, entry):
+        with self._lock:
+            self._data[key] = entry
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def __len__(self):
+        return len(self._data)
+
+
+class SearchCache:
+    """
+    Двухуровневый кэш результатов поиска: LRU в процессе + общий Redis.
+
+    Запись живёт ttl секунд «свежей», затем ещё stale_ttl секунд «устаревшей».
+    Устаревшая запись отдаётся сразу, а обновление запускается в фоне —
+    не более одного на ключ (в процессе — через множество, между процессами — через lock в Redis).
+    """
+
+    REDIS_RETRY_AFTER = 30  # секунд без Redis после ошибки соединения
+
+    def __init__(self):
+        self.lru = LRUCache()
+        self.default_ttl = 300
+        self.stale_ttl = 600
+        self.route_ttls = {}
+        self.prefix = 'zatravel:search:'
+        self._app = None
+        self._redis = None
+        self._redis_down_until = 0
+        self._refreshing = set()
+        self._refresh_lock = threading.Lock()
+
+    def init_app(self, app):
+        self._app = app
+        self.lru = LRUCache(app.config.get('SEARCH_CACHE_SIZE', 512))
+        self.default_ttl = app.config.get('SEARCH_CACHE_TTL', 300)
+        self.stale_ttl = app.config.get('SEARCH_CACHE_STALE_TTL', 600)
+        self.route_ttls = app.config.get('SEARCH_CACHE_ROUTE_TTLS', {})
+
+        if app.config.get('SEARCH_CACHE_REDIS') and redis is not None:
+            self._redis = redis.Redis.from_url(
+                app.config['REDIS_URL'],
+                socket_connect_timeout=0.2,
+                socket_timeout=0.5
+            )
+            logger.info("Search cache: LRU + Redis tiers enabled")
+        else:
+            logger.info("Search cache: LRU tier only")
+
+    # === Ключи и TTL ===
+
+    @staticmethod
+    def normalize(search_params):
+        """Канонические параметры поиска: регистр кодов и пустые значения не важны"""
+        return {
+            k: (v.strip().upper() if isinstance(v, str) else v)
+            for k, v in search_params.items()
+            if v not in (None, '', 'null')
+        }
+
+    @classmethod
+    def make_key(cls, search_params):
+        """Нормализованный ключ: порядок полей, регистр кодов и пустые значения не важны"""
+        raw = json.dumps(cls.normalize(search_params), sort_keys=True, separators=(',', ':'))
+        return hashlib.sha1(raw.encode('utf-8')).hexdigest()
+
+    def ttl_for(self, search_params):
+        """TTL по маршруту ("SVO-LED"), иначе TTL по умолчанию"""
+        route = f"{search_params.get('originLocationCode', '')}-{search_params.get('destinationLocationCode', '')}"
+        return self.route_ttls.get(route.upper(), self.default_ttl)
+
+    # === Уровни хранения ===
+
+    def _redis_client(self):
+        if self._redis is None or time.time() < self._redis_down_until:
+            return None
+        return self._redis
+
+    def _redis_failed(self, e):
+        logger.warning(f"Search cache Redis tier unavailable: {e}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_AFTER
+
+    def get_entry(self, key):
+        """Возвращает запись {'value', 'fresh_until', 'stale_until'} или None"""
+        entry = self.lru.get(key)
+        if entry is not None and entry['stale_until'] > time.time():
+            return entry
+
+        client = self._redis_client()
+        if client is not None:
+            try:
+                raw = client.get(self.prefix + key)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+                raw = None
+            if raw:
+                entry = json.loads(raw)
+                self.lru.set(key, entry)
+                return entry
+
+        return None
+
+    def set(self, key, value, ttl=None):
+        ttl = self.default_ttl if ttl is None else ttl
+        now = time.time()
+        entry = {'value': value, 'fresh_until': now + ttl, 'stale_until': now + ttl + self.stale_ttl}
+        self.lru.set(key, entry)
+
+        client = self._redis_client()
+        if client is not None:
+            try:
+                client.set(self.prefix + key, json.dumps(entry), ex=int(ttl + self.stale_ttl))
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+    # === Stale-while-revalidate ===
+
+    def peek(self, search_params, fetch):
+        """
+        Возвращает (значение, статус) без похода в сеть: 'hit', 'stale' или (None, 'miss').
+        Для устаревшей записи запускает фоновое обновление через fetch.
+        """
+        key = self.make_key(search_params)
+        entry = self.get_entry(key)
+
+        if entry is None:
+            return None, 'miss'
+        if entry['fresh_until'] > time.time():
+            return entry['value'], 'hit'
+        self._schedule_refresh(key, self.ttl_for(search_params), fetch)
+        return entry['value'], 'stale'
+
+    def last_known(self, search_params):
+        """
+        Последний известный результат из памяти процесса, даже просроченный, или None.
+        Для случаев, когда Amadeus недоступен и старый ответ лучше ошибки.
+        """
+        entry = self.lru.get(self.make_key(search_params))
+        return entry['value'] if entry is not None else None
+
+    def store(self, search_params, value):
+        """Сохраняет результат с TTL маршрута"""
+        self.set(self.make_key(search_params), value, self.ttl_for(search_params))
+
+    def _schedule_refresh(self, key, ttl, fetch):
+        with self._refresh_lock:
+            if key in self._refreshing:
+                return
+            self._refreshing.add(key)
+
+        client = self._redis_client()
+        if client is not None:
+            try:
+                # Другой процесс уже обновляет этот ключ
+                if not client.set(f"{self.prefix}refresh:{key}", 1, nx=True, ex=60):
+                    self._refresh_done(key)
+                    return
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+        threading.Thread(target=self._refresh, args=(key, ttl, fetch), daemon=True).start()
+
+    def _refresh(self, key, ttl, fetch):
+        try:
+            with self._app.app_context():
+                self.set(key, fetch(), ttl)
+            logger.info(f"Search cache refreshed in background: {key}")
+        except Exception as e:
+            logger.warning(f"Background refresh failed for {key}: {e}")
+        finally:
+            self._refresh_done(key)
+            client = self._redis_client()
+            if client is not None:
+                try:
+                    client.delete(f"{self.prefix}refresh:{key}")
+                except redis.RedisError as e:
+                    self._redis_failed(e)
+
+    def _refresh_done(self, key):
+        with self._refresh_lock:
+            self._refreshing.discard(key)
+
+
+search_cache = SearchCache()
+
+
 def init_cache(app):
-    cache.init_app(app)
\ No newline at end of file
+    cache.init_app(app)
+    search_cache.init_app(app)
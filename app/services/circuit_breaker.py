@@ -0,0 +1,142 @@
+import logging
+import random
+import threading
+import time
+
+from app.services.metrics import CIRCUIT_REJECTIONS, CIRCUIT_TRANSITIONS
+
+logger = logging.getLogger(__name__)
+
+CLOSED = 'closed'
+OPEN = 'open'
+HALF_OPEN = 'half_open'
+
+
+class CircuitOpenError(Exception):
+    """Amadeus недоступен (цепь разомкнута) — запрос не отправлялся"""
+
+    def __init__(self, endpoint, retry_after):
+        super().__init__(f"Flight provider unavailable ({endpoint}), retry after {retry_after:.1f}s")
+        self.endpoint = endpoint
+        self.retry_after = retry_after
+
+
+class DeadlineExceeded(Exception):
+    """Общий срок запроса к Amadeus (с повторами и ожиданиями) истёк"""
+
+
+class Deadline:
+    """Общий срок на запрос вместе со всеми повторами и паузами между ними"""
+
+    def __init__(self, seconds):
+        self.expires_at = time.monotonic() + seconds
+
+    def remaining(self):
+        return max(0.0, self.expires_at - time.monotonic())
+
+    def allows(self, delay, min_attempt=1.0):
+        """Хватит ли времени подождать delay секунд и ещё раз сходить в Amadeus"""
+        return self.remaining() >= delay + min_attempt
+
+    def wait_budget(self, limit, min_attempt=1.0):
+        """Сколько можно подождать (не больше limit), чтобы ещё успеть сходить в Amadeus"""
+        return max(0.0, min(limit, self.remaining() - min_attempt))
+
+    def timeout(self, limit):
+        """Таймаут очередной попытки: не больше limit и не дольше оставшегося срока"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded("Amadeus request deadline exceeded")
+        return min(limit, remaining)
+
+
+def backoff_delay(attempt, base=0.5, cap=4.0):
+    """Экспоненциальная пауза перед повтором с полным джиттером — повторы воркеров не синхронны"""
+    return random.uniform(0, min(cap, base * (2 ** attempt)))
+
+
+def is_transient(status_code):
+    """Имеет ли смысл повторять ответ: 5xx — да; 4xx (кроме 429, он отдельно) — ошибка запроса"""
+    return status_code >= 500
+
+
+class CircuitBreaker:
+    """
+    Размыкатель цепи для каждого эндпоинта Amadeus ('search', 'reference').
+
+    После failure_threshold подряд идущих сбоев (5xx, таймауты, ошибки сети)
+    цепь размыкается: запросы сразу получают CircuitOpenError, не тратя ни бюджет,
+    ни время пользователя. Через reset_timeout секунд пропускается одна пробная
+    попытка (half-open): успех замыкает цепь, сбой — снова размыкает.
+    Состояние — в памяти процесса: каждый воркер сам замечает недоступность Amadeus.
+    """
+
+    def __init__(self):
+        self.failure_threshold = 5
+        self.reset_timeout = 30
+        self.probe_timeout = 15   # сек — пробный запрос, не вернувшийся за это время, считаем потерянным
+        self._circuits = {}       # endpoint → {'state', 'failures', 'opened_at', 'probe_started'}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.failure_threshold = app.config.get('CIRCUIT_FAILURE_THRESHOLD', 5)
+        self.reset_timeout = app.config.get('CIRCUIT_RESET_TIMEOUT', 30)
+
+    def _circuit(self, endpoint):
+        circuit = self._circuits.get(endpoint)
+        if circuit is None:
+            circuit = self._circuits[endpoint] = {'state': CLOSED, 'failures': 0, 'opened_at': 0, 'probe_started': 0}
+        return circuit
+
+    def _transition(self, endpoint, circuit, state):
+        if circuit['state'] != state:
+            logger.warning(f"Circuit '{endpoint}': {circuit['state']} → {state}")
+            CIRCUIT_TRANSITIONS.inc(endpoint=endpoint, state=state)
+            circuit['state'] = state
+
+    def state(self, endpoint):
+        with self._lock:
+            return self._circuit(endpoint)['state']
+
+    def before_request(self, endpoint):
+        """Пропускает запрос или сразу бросает CircuitOpenError"""
+        now = time.monotonic()
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            if circuit['state'] == CLOSED:
+                return
+            if circuit['state'] == OPEN:
+                retry_after = circuit['opened_at'] + self.reset_timeout - now
+                if retry_after <= 0:
+                    self._transition(endpoint, circuit, HALF_OPEN)
+                    circuit['probe_started'] = now
+                    return
+            else:
+                # half-open: пока идёт пробный запрос, остальные не ждут
+                if now - circuit['probe_started'] > self.probe_timeout:
+                    circuit['probe_started'] = now
+                    return
+                retry_after = 1.0
+        CIRCUIT_REJECTIONS.inc(endpoint=endpoint)
+        raise CircuitOpenError(endpoint, retry_after)
+
+    def record_success(self, endpoint):
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            circuit['failures'] = 0
+            self._transition(endpoint, circuit, CLOSED)
+
+    def record_failure(self, endpoint):
+        with self._lock:
+            circuit = self._circuit(endpoint)
+            circuit['failures'] += 1
+            if circuit['state'] == HALF_OPEN or circuit['failures'] >= self.failure_threshold:
+                circuit['opened_at'] = time.monotonic()
+                self._transition(endpoint, circuit, OPEN)
+
+
+circuit_breaker = CircuitBreaker()
+
+
+def init_circuit_breaker(app):
+    circuit_breaker.init_app(app)
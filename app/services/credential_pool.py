@@ -0,0 +1,101 @@
+import logging
+import threading
+import time
+from collections import namedtuple
+
+from app.services.metrics import CREDENTIAL_EJECTIONS
+from app.services.rate_limiter import rate_limiter, RateLimitExceeded
+from app.services.token_store import credential_id
+
+logger = logging.getLogger(__name__)
+
+# id — короткий хэш ключа: имя токена в token_store и суффикс бюджета в rate limiter
+Credential = namedtuple('Credential', ['id', 'api_key', 'api_secret'])
+
+
+class CredentialPool:
+    """
+    Пул ключей Amadeus: у каждого свой токен и свой бюджет запросов ('search:<id>', 'reference:<id>').
+
+    Запрос уходит с ключом, у которого в общем rate limiter осталось больше всего токенов,
+    поэтому пропускная способность растёт с числом ключей. Ключ, получивший 429,
+    отстраняется на время (с удвоением при повторных 429), пока в пуле есть другие;
+    последний ключ не отстраняется — его притормаживает штраф бюджета.
+    """
+
+    def __init__(self):
+        self.credentials = []
+        self.eject_seconds = 10
+        self.eject_max = 120
+        self._ejected = {}   # id → (до какого момента отстранён, сколько 429 подряд)
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.credentials = [
+            Credential(credential_id(api_key), api_key, api_secret)
+            for api_key, api_secret in app.config.get('AMADEUS_CREDENTIALS', [])
+        ]
+        self.eject_seconds = app.config.get('CREDENTIAL_EJECT_SECONDS', 10)
+        self.eject_max = app.config.get('CREDENTIAL_EJECT_MAX', 120)
+        self._ejected = {}
+        logger.info(f"Amadeus credential pool: {len(self.credentials)} key(s)")
+
+    def __len__(self):
+        return len(self.credentials)
+
+    @staticmethod
+    def budget(bucket, credential):
+        """Имя бюджета ключа в rate limiter"""
+        return f"{bucket}:{credential.id}"
+
+    def _active(self, now):
+        return [c for c in self.credentials if self._ejected.get(c.id, (0, 0))[0] <= now]
+
+    def choose(self, bucket):
+        """Ключ с наибольшим остатком бюджета; если отстранены все — RateLimitExceeded"""
+        now = time.monotonic()
+        with self._lock:
+            active = self._active(now)
+            if not active:
+                retry_after = min(until for until, _ in self._ejected.values()) - now
+                raise RateLimitExceeded(bucket, max(0.0, retry_after))
+        if len(active) == 1:
+            return active[0]
+        return max(active, key=lambda c: rate_limiter.available(self.budget(bucket, c)))
+
+    def available(self, bucket):
+        """Суммарный остаток бюджета bucket по ключам в строю"""
+        with self._lock:
+            active = self._active(time.monotonic())
+        return sum(rate_limiter.available(self.budget(bucket, c)) for c in active)
+
+    def eject(self, credential, seconds):
+        """
+        После 429 отстраняет ключ не меньше чем на seconds. Возвращает True, если ключ
+        отстранён и следующую попытку можно сразу отправить с другим.
+        """
+        now = time.monotonic()
+        with self._lock:
+            if not any(c.id != credential.id for c in self._active(now)):
+                return False
+            _, strikes = self._ejected.get(credential.id, (0, 0))
+            duration = max(seconds, min(self.eject_max, self.eject_seconds * (2 ** strikes)))
+            self._ejected[credential.id] = (now + duration, strikes + 1)
+        logger.warning(f"Amadeus key {credential.id} ejected for {duration:.0f}s after 429")
+        CREDENTIAL_EJECTIONS.inc(credential=credential.id)
+        return True
+
+    def record_success(self, credential):
+        """Ответ без 429 после конца отстранения — счётчик повторных 429 ключа обнуляется"""
+        if credential.id in self._ejected:
+            with self._lock:
+                until, _ = self._ejected.get(credential.id, (0, 0))
+                if until <= time.monotonic():
+                    self._ejected.pop(credential.id, None)
+
+
+credential_pool = CredentialPool()
+
+
+def init_credential_pool(app):
+    credential_pool.init_app(app)
@@ -0,0 +1,12 @@
+import os
+
+
+def after_fork(callback):
+    """
+    Вызывает callback в дочернем процессе сразу после fork (воркеры gunicorn --preload, Celery prefork).
+
+    Потоки, event loop и пулы соединений родителя в дочернем процессе мертвы, а блокировки
+    могли скопироваться захваченными — сервисы сбрасывают их здесь, а не на первом запросе.
+    """
+    if hasattr(os, 'register_at_fork'):  # на Windows fork нет
+        os.register_at_fork(after_in_child=callback)
@@ -0,0 +1,233 @@
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from flask import Response, g, request
+
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _format_labels(names, values, extra=''):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+class Counter:
+    """Монотонный счётчик с метками (формат Prometheus)"""
+
+    kind = 'counter'
+
+    def __init__(self, name, documentation, labelnames=()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount=1, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self):
+        with self._lock:
+            values = sorted(self._values.items())
+        for key, value in values:
+            yield f"{self.name}{_format_labels(self.labelnames, key)} {value}"
+
+
+class Histogram:
+    """Гистограмма длительностей с фиксированными границами корзин (секунды)"""
+
+    kind = 'histogram'
+
+    def __init__(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._values = {}  # метки → [счётчики по корзинам..., сумма, количество]
+        self._lock = threading.Lock()
+
+    def observe(self, value, **labels):
+        key = tuple(str(labels.get(name, '')) for name in self.labelnames)
+        with self._lock:
+            state = self._values.get(key)
+            if state is None:
+                state = self._values[key] = [0] * len(self.buckets) + [0.0, 0]
+            for i, bound in enumerate(self.buckets):
+                if value <= bound:
+                    state[i] += 1
+            state[-2] += value
+            state[-1] += 1
+
+    def samples(self):
+        with self._lock:
+            values = sorted((key, list(state)) for key, state in self._values.items())
+        for key, state in values:
+            for bound, count in zip(self.buckets, state):
+                labels = _format_labels(self.labelnames, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {count}"
+            labels = _format_labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {state[-1]}"
+            labels = _format_labels(self.labelnames, key)
+            yield f"{self.name}_sum{labels} {state[-2]!r}"
+            yield f"{self.name}_count{labels} {state[-1]}"
+
+
+class MetricsRegistry:
+    """
+    Метрики процесса в текстовом формате Prometheus.
+
+    Значения живут в памяти воркера: при нескольких воркерах Prometheus
+    собирает каждый отдельно (метка instance), суммирование — в запросах PromQL.
+    """
+
+    def __init__(self):
+        self._metrics = []
+
+    def counter(self, name, documentation, labelnames=()):
+        metric = Counter(name, documentation, labelnames)
+        self._metrics.append(metric)
+        return metric
+
+    def histogram(self, name, documentation, labelnames=(), buckets=DEFAULT_BUCKETS):
+        metric = Histogram(name, documentation, labelnames, buckets)
+        self._metrics.append(metric)
+        return metric
+
+    def render(self):
+        lines = []
+        for metric in self._metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+registry = MetricsRegistry()
+
+HTTP_REQUEST_SECONDS = registry.histogram(
+    'zatravel_http_request_seconds', 'Time to produce a response (until headers for streams)',
+    ['endpoint', 'method', 'status']
+)
+STAGE_SECONDS = registry.histogram(
+    'zatravel_stage_seconds', 'Time spent per search stage: token, rate_limit, upstream, backoff, parse, ...',
+    ['stage']
+)
+UPSTREAM_RESPONSES = registry.counter(
+    'zatravel_upstream_responses_total', 'Amadeus responses by budget and HTTP status', ['endpoint', 'status']
+)
+UPSTREAM_RETRIES = registry.counter(
+    'zatravel_upstream_retries_total', 'Amadeus request retries by reason', ['endpoint', 'reason']
+)
+RATE_LIMIT_WAIT_SECONDS = registry.histogram(
+    'zatravel_rate_limit_wait_seconds', 'Wait for a slot in the shared Amadeus budget', ['bucket']
+)
+RATE_LIMIT_REJECTIONS = registry.counter(
+    'zatravel_rate_limit_rejections_total', 'Requests rejected because the budget queue was too long', ['bucket']
+)
+CIRCUIT_TRANSITIONS = registry.counter(
+    'zatravel_circuit_transitions_total', 'Circuit breaker state changes per Amadeus endpoint', ['endpoint', 'state']
+)
+CIRCUIT_REJECTIONS = registry.counter(
+    'zatravel_circuit_rejections_total', 'Requests failed fast because the circuit was open', ['endpoint']
+)
+SEARCH_CACHE_RESULTS = registry.counter(
+    'zatravel_search_cache_total', 'Search cache outcomes: hit, stale, miss, coalesced', ['status']
+)
+PREFETCH_RESULTS = registry.counter(
+    'zatravel_prefetch_total', 'Speculative searches from the form: cached, pending, started or refusal reason',
+    ['result']
+)
+CREDENTIAL_EJECTIONS = registry.counter(
+    'zatravel_credential_ejections_total', 'Amadeus keys temporarily taken out of the pool after 429', ['credential']
+)
+PRICE_HISTORY_ROWS = registry.counter(
+    'zatravel_price_history_rows_total', 'Price observations written to or dropped from the history store', ['result']
+)
+
+
+# === Разбивка времени текущего запроса (для Server-Timing) ===
+
+class RequestTimings:
+    """Суммарное время по этапам одного запроса; этапы могут идти из нескольких потоков"""
+
+    def __init__(self):
+        self.stages = {}
+        self._lock = threading.Lock()
+
+    def add(self, stage, seconds):
+        with self._lock:
+            self.stages[stage] = self.stages.get(stage, 0.0) + seconds
+
+    def header(self, total=None):
+        with self._lock:
+            items = list(self.stages.items())
+        if total is not None:
+            items.append(('total', total))
+        return ', '.join(f"{stage};dur={seconds * 1000:.1f}" for stage, seconds in items)
+
+
+_current_timings = ContextVar('zatravel_request_timings', default=None)
+
+
+def current_timings():
+    return _current_timings.get()
+
+
+def bind_timings(timings):
+    """Привязывает разбивку запроса к текущему контексту (потоку или asyncio-задаче)"""
+    _current_timings.set(timings)
+
+
+def record(stage, seconds):
+    """Учитывает длительность этапа в гистограмме и в Server-Timing текущего запроса"""
+    STAGE_SECONDS.observe(seconds, stage=stage)
+    timings = _current_timings.get()
+    if timings is not None:
+        timings.add(stage, seconds)
+
+
+@contextmanager
+def span(stage):
+    """Замеряет блок кода как этап stage"""
+    start = time.perf_counter()
+    try:
+        yield
+    finally:
+        record(stage, time.perf_counter() - start)
+
+
+def metrics_response():
+    return Response(registry.render(), mimetype='text/plain; version=0.0.4; charset=utf-8')
+
+
+def init_metrics(app):
+    """Замер каждого запроса и заголовок Server-Timing с разбивкой по этапам"""
+
+    @app.before_request
+    def start_request_timing():
+        g.request_started = time.perf_counter()
+        bind_timings(RequestTimings())
+
+    @app.after_request
+    def finish_request_timing(response):
+        started = g.pop('request_started', None)
+        timings = current_timings()
+        if started is None or timings is None:
+            return response
+        total = time.perf_counter() - started
+        HTTP_REQUEST_SECONDS.observe(
+            total, endpoint=request.endpoint or 'unknown', method=request.method, status=response.status_code
+        )
+        response.headers['Server-Timing'] = timings.header(total)
+        bind_timings(None)
+        return response
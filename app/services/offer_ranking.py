@@ -0,0 +1,261 @@
+"""
+Серверное ранжирование предложений: фильтры, сортировка и «лучшее соотношение» за один проход.
+
+Предложения (словари FlightOffer.to_dict, как их хранит кэш) раскладываются в колонки —
+цена, время в полёте, пересадки, час вылета, перевозчик. Фильтры и взвешенная оценка
+считаются над колонками целиком (numpy), из подходящих выбираются лучшие top
+без полной сортировки. Без numpy — тот же результат обычным Python, только медленнее.
+"""
+import math
+import re
+from functools import lru_cache
+
+try:
+    import numpy as np
+except ImportError:  # без numpy ранжируем обычным Python
+    np = None
+
+SORTS = ('best', 'price', 'duration', 'departure')
+
+# Веса «лучшего соотношения» по умолчанию: цена важнее времени в пути, пересадки — штраф
+DEFAULT_WEIGHTS = {'price': 0.6, 'duration': 0.3, 'stops': 0.1}
+
+# Параметры запроса, включающие ранжирование; без них порядок Amadeus не меняется
+RANKING_FIELDS = ('sort', 'maxPrice', 'maxStops', 'maxDuration', 'departAfter', 'departBefore',
+                  'carriers', 'weights', 'top')
+
+_ISO_DURATION = re.compile(r'^P(?:(\d+)D)?(?:T(?:(\d+)H)?(?:(\d+)M)?(?:(\d+(?:\.\d+)?)S)?)?$')
+
+
+@lru_cache(maxsize=4096)
+def duration_minutes(value):
+    """ISO 8601 длительность в минутах: 'PT2H30M' → 150, 'P1DT1H' → 1500; непонятная — 0"""
+    match = _ISO_DURATION.match(value or '')
+    if not match:
+        return 0
+    days, hours, minutes, seconds = match.groups()
+    return (int(days or 0) * 1440 + int(hours or 0) * 60 + int(minutes or 0)
+            + round(float(seconds or 0) / 60))
+
+
+def _present(value):
+    # Пустые carriers: [] или weights: {} — то же, что их отсутствие
+    return value is not None and value not in ('', [], {})
+
+
+def parse_ranking(data):
+    """
+    Параметры ранжирования из тела /search; None — если ни одного нет.
+    Результат — словарь из простых типов (уходит и в задание Celery). Ошибка — ValueError.
+    """
+    if not any(_present(data.get(field)) for field in RANKING_FIELDS):
+        return None
+
+    def number(field, cast=float, low=0, high=None):
+        value = data.get(field)
+        if value in (None, ''):
+            return None
+        try:
+            value = cast(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid {field}')
+        if value < low or (high is not None and value > high) or (cast is float and math.isnan(value)):
+            raise ValueError(f'Invalid {field}')
+        return value
+
+    sort = data.get('sort') or 'best'
+    if sort not in SORTS:
+        raise ValueError(f"Invalid sort, expected one of: {', '.join(SORTS)}")
+
+    carriers = data.get('carriers') or []
+    if isinstance(carriers, str):
+        carriers = carriers.split(',')
+    if not isinstance(carriers, list):
+        raise ValueError('carriers must be a list')
+    carriers = sorted({str(code).strip().upper() for code in carriers if str(code).strip()})
+
+    weights = dict(DEFAULT_WEIGHTS)
+    custom = data.get('weights') or {}
+    if not isinstance(custom, dict) or set(custom) - set(DEFAULT_WEIGHTS):
+        raise ValueError(f"weights must be an object with keys: {', '.join(DEFAULT_WEIGHTS)}")
+    for key, value in custom.items():
+        try:
+            weights[key] = float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f'Invalid weights.{key}')
+        if not weights[key] >= 0:
+            raise ValueError(f'Invalid weights.{key}')
+    if sum(weights.values()) <= 0:
+        raise ValueError('At least one weight must be positive')
+
+    return {
+        'sort': sort,
+        'max_price': number('maxPrice'),
+        'max_stops': number('maxStops', int),
+        'max_duration': number('maxDuration', int),      # минут в полёте за всю поездку
+        'depart_after': number('departAfter', high=24),  # местный час вылета; after > before — через полночь
+        'depart_before': number('departBefore', high=24),
+        'carriers': carriers,                            # перевозчик первого сегмента
+        'weights': weights,
+        'top': number('top', int, low=1),
+    }
+
+
+def departure_hour(departure):
+    """Местный час вылета с долями: '2025-06-15T10:30' → 10.5; без времени — nan"""
+    try:
+        return int(departure[11:13]) + int(departure[14:16]) / 60
+    except ValueError:
+        return math.nan
+
+
+def offer_columns(flights, legs=1):
+    """
+    Колонки предложений: цена, минуты в полёте (сумма сегментов), пересадки за поездку
+    (сегментов минус направлений), вылет ('YYYY-MM-DDTHH:MM'), перевозчик первого сегмента.
+    Единственный цикл по предложениям — дальше всё считается над колонками.
+    """
+    prices, durations, stops, departures, carriers = [], [], [], [], []
+    minutes = duration_minutes
+    for flight in flights:
+        segments = flight['segments']
+        prices.append(flight['price'])
+        total = 0
+        for segment in segments:
+            total += minutes(segment['duration'])
+        durations.append(total)
+        stops.append(max(0, len(segments) - legs))
+        if segments:
+            first = segments[0]
+            departures.append(first['departure_time'][:16])
+            carriers.append(first['airline'])
+        else:
+            departures.append('')
+            carriers.append('')
+    return {'price': prices, 'duration': durations, 'stops': stops, 'departure': departures, 'carrier': carriers}
+
+
+def rank_offers(flights, ranking, legs=1):
+    """Отфильтрованные и упорядоченные по ranking предложения (не больше top)"""
+    if not flights:
+        return flights
+    columns = offer_columns(flights, legs)
+    rank = _rank_numpy if np is not None else _rank_python
+    return [flights[i] for i in rank(columns, ranking)]
+
+
+def _in_window(hour, after, before):
+    if after is not None and before is not None and after > before:
+        return hour >= after or hour < before
+    return (after is None or hour >= after) and (before is None or hour < before)
+
+
+def _rank_numpy(columns, ranking):
+    price = np.asarray(columns['price'], dtype=np.float64)
+    duration = np.asarray(columns['duration'], dtype=np.float64)
+    stops = np.asarray(columns['stops'], dtype=np.float64)
+    try:
+        departure = np.array(columns['departure'], dtype='datetime64[m]')  # '' → NaT
+        hour = (departure - departure.astype('datetime64[D]')).astype(np.float64) / 60
+        hour[np.isnat(departure)] = np.nan
+    except ValueError:  # время не в ISO-формате — разбираем построчно
+        hour = np.array([departure_hour(value) for value in columns['departure']], dtype=np.float64)
+
+    mask = np.ones(len(price), dtype=bool)
+    if ranking['max_price'] is not None:
+        mask &= price <= ranking['max_price']
+    if ranking['max_stops'] is not None:
+        mask &= stops <= ranking['max_stops']
+    if ranking['max_duration'] is not None:
+        mask &= duration <= ranking['max_duration']
+    after, before = ranking['depart_after'], ranking['depart_before']
+    if after is not None and before is not None and after > before:
+        mask &= (hour >= after) | (hour < before)
+    else:
+        if after is not None:
+            mask &= hour >= after
+        if before is not None:
+            mask &= hour < before
+    if ranking['carriers']:
+        mask &= np.isin(np.asarray(columns['carrier']), ranking['carriers'])
+
+    index = np.flatnonzero(mask)
+    if not len(index):
+        return []
+    price, duration, stops, hour = price[index], duration[index], stops[index], hour[index]
+
+    sort = ranking['sort']
+    if sort == 'best':
+        weights = ranking['weights']
+        primary = (weights['price'] * _normalized(price) + weights['duration'] * _normalized(duration)
+                   + weights['stops'] * _normalized(stops))
+        secondary = price
+    elif sort == 'price':
+        primary, secondary = price, duration
+    elif sort == 'duration':
+        primary, secondary = duration, price
+    else:
+        primary, secondary = np.nan_to_num(hour, nan=np.inf), price
+
+    # Лучшие top — частичным отбором O(n), сортируется только выбранное. Берём все строки
+    # не хуже top-й по основному ключу: среди равных с ней решают следующие ключи
+    top = ranking['top']
+    if top is not None and top < len(index):
+        kth = np.partition(primary, top - 1)[top - 1]
+        selected = np.flatnonzero(primary <= kth)
+    else:
+        selected = np.arange(len(index))
+    order = selected[np.lexsort((selected, secondary[selected], primary[selected]))]
+    return index[order[:top]].tolist()
+
+
+def _normalized(values):
+    """Значения в [0, 1] относительно лучшего и худшего среди подходящих предложений"""
+    low = values.min()
+    spread = values.max() - low
+    return (values - low) / spread if spread > 0 else np.zeros_like(values)
+
+
+def _rank_python(columns, ranking):
+    price, duration, stops = columns['price'], columns['duration'], columns['stops']
+    hour = [departure_hour(value) for value in columns['departure']]
+    carriers = set(ranking['carriers'])
+    index = [
+        i for i in range(len(price))
+        if (ranking['max_price'] is None or price[i] <= ranking['max_price'])
+        and (ranking['max_stops'] is None or stops[i] <= ranking['max_stops'])
+        and (ranking['max_duration'] is None or duration[i] <= ranking['max_duration'])
+        and ((ranking['depart_after'] is None and ranking['depart_before'] is None)
+             or _in_window(hour[i], ranking['depart_after'], ranking['depart_before']))
+        and (not carriers or columns['carrier'][i] in carriers)
+    ]
+    if not index:
+        return []
+
+    sort = ranking['sort']
+    if sort == 'best':
+        weights = ranking['weights']
+        scales = {}
+        for name, column in (('price', price), ('duration', duration), ('stops', stops)):
+            values = [column[i] for i in index]
+            scales[name] = (min(values), max(values) - min(values))
+
+        def score(name, value):
+            low, spread = scales[name]
+            return (value - low) / spread if spread > 0 else 0.0
+
+        def key(i):
+            return (weights['price'] * score('price', price[i]) + weights['duration'] * score('duration', duration[i])
+                    + weights['stops'] * score('stops', stops[i]), price[i], i)
+    elif sort == 'price':
+        def key(i):
+            return price[i], duration[i], i
+    elif sort == 'duration':
+        def key(i):
+            return duration[i], price[i], i
+    else:
+        def key(i):
+            return (math.inf if math.isnan(hour[i]) else hour[i]), price[i], i
+
+    ordered = sorted(index, key=key)
+    return ordered[:ranking['top']] if ranking['top'] is not None else ordered
@@ -0,0 +1,135 @@
+import json
+import logging
+import threading
+import time
+from collections import Counter
+from datetime import date
+
+from app.services.cache_service import SearchCache
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def _member(search_params):
+    """Поиск как элемент sorted set — в той же нормализации, что и ключ кэша"""
+    return json.dumps(SearchCache.normalize(search_params), sort_keys=True, separators=(',', ':'))
+
+
+class PopularSearches:
+    """
+    Счётчик популярности поисков для фонового прогрева кэша.
+
+    Нормализованные параметры поиска копятся в памяти и раз в flush_interval секунд
+    одним pipeline добавляются в sorted set Redis, общий для всех воркеров.
+    Старые запросы со временем теряют вес (decay), прошедшие даты вылета удаляются.
+    Без Redis популярность не учитывается — воркерам Celery её всё равно не увидеть.
+    """
+
+    REDIS_RETRY_AFTER = 30
+
+    def __init__(self):
+        self.key = 'zatravel:popular-searches'
+        self.flush_interval = 1.0
+        self._pending = Counter()
+        self._last_flush = time.time()
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_down_until = 0
+
+    def init_app(self, app):
+        if app.config.get('PREWARM_ENABLED') and redis is not None:
+            self._redis = redis.Redis.from_url(
+                app.config['REDIS_URL'],
+                socket_connect_timeout=0.2,
+                socket_timeout=0.5
+            )
+
+    def _redis_client(self):
+        if self._redis is None or time.time() < self._redis_down_until:
+            return None
+        return self._redis
+
+    def _redis_failed(self, e):
+        logger.warning(f"Popular searches Redis unavailable: {e}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_AFTER
+
+    def record(self, search_params):
+        """Учитывает поиск; в Redis уходит пачкой, не на каждый запрос"""
+        if self._redis is None:
+            return
+        member = _member(search_params)
+        with self._lock:
+            self._pending[member] += 1
+            if time.time() - self._last_flush < self.flush_interval:
+                return
+            pending, self._pending = self._pending, Counter()
+            self._last_flush = time.time()
+        self._flush(pending)
+
+    def _flush(self, pending):
+        client = self._redis_client()
+        if client is None or not pending:
+            return
+        try:
+            pipe = client.pipeline(transaction=False)
+            for member, count in pending.items():
+                pipe.zincrby(self.key, count, member)
+            pipe.execute()
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    def top(self, n):
+        """Самые популярные поиски: список (параметры, вес) по убыванию веса"""
+        client = self._redis_client()
+        if client is None:
+            return []
+        try:
+            members = client.zrevrange(self.key, 0, n - 1, withscores=True)
+        except redis.RedisError as e:
+            self._redis_failed(e)
+            return []
+        return [(json.loads(member), score) for member, score in members]
+
+    def discard(self, search_params):
+        """Убирает поиск из рейтинга (например, дата вылета уже прошла)"""
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            client.zrem(self.key, _member(search_params))
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+    def decay(self, factor, min_score=0.5):
+        """Умножает все веса на factor и удаляет поиски с весом ниже min_score"""
+        client = self._redis_client()
+        if client is None:
+            return
+        try:
+            pipe = client.pipeline()
+            pipe.zunionstore(self.key, {self.key: factor})
+            pipe.zremrangebyscore(self.key, '-inf', f'({min_score}')
+            pipe.execute()
+        except redis.RedisError as e:
+            self._redis_failed(e)
+
+
+def days_until_departure(search_params, today=None):
+    """Сколько дней до вылета (отрицательное — уже прошёл) или None, если дата некорректна"""
+    try:
+        departure = date.fromisoformat(str(search_params.get('departureDate')))
+    except ValueError:
+        return None
+    return (departure - (today or date.today())).days
+
+
+popular_searches = PopularSearches()
+
+
+def init_popular_searches(app):
+    popular_searches.init_app(app)
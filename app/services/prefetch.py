@@ -0,0 +1,95 @@
+import logging
+import threading
+
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.fork_safety import after_fork
+from app.services.metrics import PREFETCH_RESULTS
+
+logger = logging.getLogger(__name__)
+
+
+class SearchPrefetcher:
+    """
+    Спекулятивный поиск из формы: браузер сообщает маршрут и дату до нажатия «Найти».
+
+    Поиск уходит в Amadeus в фоне и кладётся в кэш результатов — поиск по кнопке
+    получает его как попадание в кэш, а если ответ ещё не пришёл, склеивается с ним
+    через single-flight. Спекулятивный трафик не должен вытеснять настоящий: поиск
+    не запускается, если в общем бюджете ключей осталось меньше min_headroom токенов,
+    если исчерпан собственный бюджет 'prefetch' (доля лимита поиска) или уже идут
+    max_inflight предзагрузок.
+    """
+
+    def __init__(self, search_service, cache, limiter, credentials):
+        self.search_service = search_service
+        self.cache = cache
+        self.limiter = limiter
+        self.credentials = credentials
+        self.enabled = True
+        self.min_headroom = 2.0
+        self.max_inflight = 4
+        self._inflight = set()  # ключи кэша, которые сейчас ищутся
+        self._lock = threading.Lock()
+        self._app = None
+
+    def init_app(self, app):
+        self.enabled = app.config.get('PREFETCH_ENABLED', True)
+        self.min_headroom = app.config.get('PREFETCH_MIN_HEADROOM', 2.0)
+        self.max_inflight = app.config.get('PREFETCH_MAX_INFLIGHT', 4)
+        self._app = app
+        after_fork(self._reset)
+
+    def _reset(self):
+        # Потоки предзагрузки родителя в дочернем процессе не существуют
+        self._inflight = set()
+        self._lock = threading.Lock()
+
+    def _refusal(self):
+        """Причина отказа или None, если предзагрузку можно запускать"""
+        if not self.enabled:
+            return 'disabled'
+        if len(self._inflight) >= self.max_inflight:
+            return 'busy'
+        if self.credentials.available('search') < self.min_headroom:
+            return 'budget'
+        if not self.limiter.reserve('prefetch', max_wait=0).granted:
+            return 'budget'
+        return None
+
+    def submit(self, search_params):
+        """
+        Запускает предзагрузку; возвращает ('cached' | 'pending' | 'started' | 'refused', причина отказа).
+        'cached' — результат уже в кэше (в том числе устаревший: его отдадут сразу и обновят в фоне).
+        """
+        key = self.cache.make_key(search_params)
+        if self.cache.get_entry(key) is not None:
+            return self._result('cached')
+
+        with self._lock:
+            if key in self._inflight:
+                return self._result('pending')
+            reason = self._refusal()
+            if reason is not None:
+                return self._result('refused', reason)
+            self._inflight.add(key)
+
+        threading.Thread(target=self._prefetch, args=(key, search_params), daemon=True).start()
+        return self._result('started')
+
+    @staticmethod
+    def _result(status, reason=None):
+        PREFETCH_RESULTS.inc(result=reason or status)
+        return status, reason
+
+    def _prefetch(self, key, search_params):
+        try:
+            with self._app.app_context():
+                self.cache.store(search_params, self.search_service.fetch(search_params))
+            logger.info(f"Search prefetched: {key}")
+        except CircuitOpenError:
+            pass  # поиск по кнопке получит ту же ошибку или последний известный результат
+        except Exception as e:
+            logger.warning(f"Search prefetch failed for {key}: {e}")
+        finally:
+            with self._lock:
+                self._inflight.discard(key)
@@ -0,0 +1,82 @@
+import logging
+import time
+
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.popular_searches import days_until_departure
+
+logger = logging.getLogger(__name__)
+
+
+class CachePrewarmer:
+    """
+    Фоновый прогрев кэша поиска для популярных запросов.
+
+    Берёт top_n самых частых поисков с вылетом в ближайшие days_ahead дней и
+    обновляет те, что протухнут раньше чем через lead_time секунд (или уже выпали из кэша).
+    В Amadeus ходит только в пределах своего бюджета 'prewarm' — доли общего лимита
+    поиска — и уступает пользователям, если общий бюджет уже в очереди.
+    """
+
+    def __init__(self, search_service, cache, popular, limiter, credentials):
+        self.search_service = search_service
+        self.cache = cache
+        self.popular = popular
+        self.limiter = limiter
+        self.credentials = credentials  # пул ключей: общий бюджет поиска — сумма бюджетов ключей
+        self.top_n = 50
+        self.days_ahead = 30
+        self.lead_time = 120
+
+    def init_app(self, app):
+        self.top_n = app.config.get('PREWARM_TOP_N', 50)
+        self.days_ahead = app.config.get('PREWARM_DAYS_AHEAD', 30)
+        self.lead_time = app.config.get('PREWARM_LEAD_TIME', 120)
+
+    def _needs_refresh(self, search_params):
+        entry = self.cache.get_entry(self.cache.make_key(search_params))
+        return entry is None or entry['fresh_until'] - time.time() < self.lead_time
+
+    def _budget_allows(self):
+        # Пользовательский трафик важнее: если общий бюджет исчерпан — не мешаем
+        if self.credentials.available('search') < 1:
+            return False
+        return self.limiter.reserve('prewarm', max_wait=0).granted
+
+    def run(self):
+        """Один проход прогрева; возвращает счётчики для логов и результата задачи"""
+        stats = {
+            'refreshed': 0, 'fresh': 0, 'outdated': 0, 'later': 0, 'failed': 0,
+            'budget_exhausted': False, 'circuit_open': False,
+        }
+
+        for search_params, _ in self.popular.top(self.top_n):
+            days = days_until_departure(search_params)
+            if days is None or days < 0:
+                self.popular.discard(search_params)
+                stats['outdated'] += 1
+                continue
+            if days > self.days_ahead:
+                stats['later'] += 1
+                continue
+            if not self._needs_refresh(search_params):
+                stats['fresh'] += 1
+                continue
+            if not self._budget_allows():
+                stats['budget_exhausted'] = True
+                break
+
+            try:
+                flights = self.search_service.fetch(search_params)
+            except CircuitOpenError:
+                # Amadeus недоступен — до следующего прохода не пытаемся
+                stats['circuit_open'] = True
+                break
+            except Exception as e:
+                logger.warning(f"Prewarm failed for {search_params}: {e}")
+                stats['failed'] += 1
+                continue
+            self.cache.store(search_params, flights)
+            stats['refreshed'] += 1
+
+        logger.info(f"Cache prewarm: {stats}")
+        return stats
@@ -0,0 +1,242 @@
+import logging
+import os
+import queue
+import sqlite3
+import threading
+import time
+
+from app.services.fork_safety import after_fork
+from app.services.metrics import PRICE_HISTORY_ROWS
+
+logger = logging.getLogger(__name__)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS price_observations (
+    origin TEXT NOT NULL,
+    destination TEXT NOT NULL,
+    departure_date TEXT NOT NULL,
+    return_date TEXT,
+    observed_at INTEGER NOT NULL,
+    min_price REAL NOT NULL,
+    currency TEXT NOT NULL,
+    carrier TEXT NOT NULL
+);
+CREATE INDEX IF NOT EXISTS idx_price_route_date
+    ON price_observations (origin, destination, departure_date, observed_at);
+"""
+
+INSERT = """
+INSERT INTO price_observations
+    (origin, destination, departure_date, return_date, observed_at, min_price, currency, carrier)
+VALUES (?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Фильтр по маршруту, диапазону дат вылета, типу поездки и давности наблюдения
+_RANGE = """
+origin = ? AND destination = ? AND departure_date BETWEEN ? AND ?
+AND (return_date IS NOT NULL) = ? AND observed_at >= ?
+"""
+
+TRENDS = f"""
+WITH f AS (SELECT * FROM price_observations WHERE {_RANGE}),
+agg AS (
+    SELECT departure_date, currency, MIN(min_price) AS low, MAX(observed_at) AS last_seen,
+           COUNT(DISTINCT observed_at) AS observations
+    FROM f GROUP BY departure_date, currency
+)
+SELECT agg.departure_date, agg.currency, agg.low, MIN(f.min_price), agg.last_seen, agg.observations
+FROM agg JOIN f ON f.departure_date = agg.departure_date AND f.currency = agg.currency
+                AND f.observed_at = agg.last_seen
+GROUP BY agg.departure_date, agg.currency
+ORDER BY agg.departure_date
+"""
+
+CHEAPEST = f"""
+SELECT departure_date, return_date, min_price, currency, carrier, observed_at
+FROM price_observations WHERE {_RANGE}
+ORDER BY min_price LIMIT ?
+"""
+
+
+def observation_rows(search_params, flights, observed_at):
+    """Сжимает результат поиска до строк «самая низкая цена на перевозчика»"""
+    best = {}
+    for flight in flights:
+        segments = flight.get('segments') or []
+        carrier = segments[0]['airline'] if segments else ''
+        key = (carrier, flight['currency'])
+        if key not in best or flight['price'] < best[key]:
+            best[key] = flight['price']
+
+    route = (
+        search_params['originLocationCode'],
+        search_params['destinationLocationCode'],
+        search_params['departureDate'],
+        search_params.get('returnDate') or None,
+    )
+    return [route + (observed_at, price, currency, carrier) for (carrier, currency), price in best.items()]
+
+
+class PriceHistory:
+    """
+    История цен в SQLite: по строке на перевозчика с минимальной ценой каждого ответа Amadeus.
+
+    Запись не на пути запроса: результаты кладутся в ограниченную очередь, а фоновый
+    поток пишет их пачками одной транзакцией (при переполнении очереди наблюдения
+    отбрасываются — это статистика, а не данные заказа). WAL позволяет читать
+    историю из всех воркеров, пока один из них пишет.
+    """
+
+    def __init__(self):
+        self.path = None
+        self.batch_size = 200        # результатов поиска за транзакцию
+        self.flush_interval = 2.0    # сек — дольше наблюдение в очереди не лежит
+        self.retention_days = 180
+        self._reset()
+        after_fork(self._reset)
+
+    def _reset(self):
+        # Поток записи и соединения SQLite родителя в дочернем процессе не используются
+        self._queue = queue.Queue(maxsize=10000)
+        self._writer = None
+        self._lock = threading.Lock()
+        self._local = threading.local()
+
+    def init_app(self, app):
+        if not app.config.get('PRICE_HISTORY_ENABLED', True):
+            return
+        self.path = app.config.get('PRICE_HISTORY_DB') or os.path.join(app.instance_path, 'price_history.sqlite3')
+        self.retention_days = app.config.get('PRICE_HISTORY_RETENTION_DAYS', 180)
+        try:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+            conn = self._connect()
+            try:
+                conn.executescript(SCHEMA)
+            finally:
+                conn.close()
+            logger.info(f"Price history: {self.path}")
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f"Price history disabled: {e}")
+            self.path = None
+
+    def _connect(self):
+        conn = sqlite3.connect(self.path, timeout=5)
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute('PRAGMA synchronous=NORMAL')
+        return conn
+
+    # === Запись ===
+
+    def record(self, search_params, flights):
+        """Ставит результат поиска в очередь на запись; не блокирует"""
+        if self.path is None or not flights:
+            return
+        self._ensure_writer()
+        try:
+            self._queue.put_nowait((search_params, flights, int(time.time())))
+        except queue.Full:
+            PRICE_HISTORY_ROWS.inc(result='dropped')
+
+    def _ensure_writer(self):
+        # Поток запускается лениво — в мастере gunicorn --preload его нет, у каждого воркера свой.
+        # Упавший поток (например, не открылась база) перезапускается при следующей записи
+        if self._writer is not None and self._writer.is_alive():
+            return
+        with self._lock:
+            if self._writer is not None and self._writer.is_alive():
+                return
+            self._writer = threading.Thread(target=self._write_loop, name='price-history-writer', daemon=True)
+            self._writer.start()
+
+    def _next_batch(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.flush_interval
+        while len(batch) < self.batch_size:
+            timeout = deadline - time.monotonic()
+            if timeout <= 0:
+                break
+            try:
+                batch.append(self._queue.get(timeout=timeout))
+            except queue.Empty:
+                break
+        return batch
+
+    def _write_loop(self):
+        conn = self._connect()
+        last_prune = 0
+        while True:
+            batch = self._next_batch()
+            rows = []
+            for search_params, flights, observed_at in batch:
+                try:
+                    rows.extend(observation_rows(search_params, flights, observed_at))
+                except Exception as e:
+                    logger.warning(f"Skipping malformed price observation: {e}")
+            try:
+                with conn:
+                    conn.executemany(INSERT, rows)
+                    if time.time() - last_prune > 3600:
+                        cutoff = int(time.time()) - self.retention_days * 86400
+                        conn.execute('DELETE FROM price_observations WHERE observed_at < ?', (cutoff,))
+                        last_prune = time.time()
+                PRICE_HISTORY_ROWS.inc(len(rows), result='written')
+            except Exception as e:
+                # Любая ошибка теряет только этот пакет — поток записи продолжает работать
+                logger.warning(f"Price history write failed ({len(rows)} rows dropped): {e}")
+                PRICE_HISTORY_ROWS.inc(len(rows), result='dropped')
+
+    # === Чтение ===
+
+    def _reader(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = self._connect()
+        return conn
+
+    def _range_args(self, origin, destination, date_from, date_to, round_trip, days):
+        return (origin, destination, date_from, date_to, int(bool(round_trip)), int(time.time()) - days * 86400)
+
+    def trends(self, origin, destination, date_from, date_to, round_trip=False, days=30):
+        """По каждой дате вылета: минимальная и последняя известная цена, число наблюдений"""
+        if self.path is None:
+            return []
+        cursor = self._reader().execute(
+            TRENDS, self._range_args(origin, destination, date_from, date_to, round_trip, days)
+        )
+        return [
+            {
+                'departureDate': departure_date,
+                'currency': currency,
+                'minPrice': low,
+                'lastPrice': last_price,
+                'lastObservedAt': last_seen,
+                'observations': observations,
+            }
+            for departure_date, currency, low, last_price, last_seen, observations in cursor
+        ]
+
+    def cheapest(self, origin, destination, date_from, date_to, round_trip=False, days=30, limit=5):
+        """Самые дешёвые известные тарифы в диапазоне дат"""
+        if self.path is None:
+            return []
+        cursor = self._reader().execute(
+            CHEAPEST, self._range_args(origin, destination, date_from, date_to, round_trip, days) + (limit,)
+        )
+        return [
+            {
+                'departureDate': departure_date,
+                'returnDate': return_date,
+                'price': price,
+                'currency': currency,
+                'carrier': carrier,
+                'observedAt': observed_at,
+            }
+            for departure_date, return_date, price, currency, carrier, observed_at in cursor
+        ]
+
+
+price_history = PriceHistory()
+
+
+def init_price_history(app):
+    price_history.init_app(app)
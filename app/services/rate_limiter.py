@@ -0,0 +1,269 @@
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+from collections import namedtuple
+
+from app.services.metrics import RATE_LIMIT_WAIT_SECONDS, RATE_LIMIT_REJECTIONS
+
+try:
+    import fcntl
+except ImportError:  # Windows — файловый backend недоступен
+    fcntl = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+# granted — токены списаны; wait — через сколько секунд можно выполнять запрос
+# (для отказа — через сколько секунд имеет смысл повторить)
+Reservation = namedtuple('Reservation', ['granted', 'wait'])
+
+
+class RateLimitExceeded(Exception):
+    """Бюджет запросов к Amadeus исчерпан — ждать дольше допустимого"""
+
+    def __init__(self, bucket, retry_after):
+        super().__init__(f"Rate limit budget '{bucket}' exhausted, retry after {retry_after:.1f}s")
+        self.bucket = bucket
+        self.retry_after = retry_after
+
+
+def _take(tokens, ts, now, rate, burst, cost, max_wait):
+    """
+    Шаг token bucket. Токены могут уходить в минус — это очередь резерваций:
+    каждый следующий вызывающий получает всё большее время ожидания.
+    Возвращает (Reservation, новое число токенов или None, если списания не было).
+    """
+    tokens = burst if tokens is None else tokens
+    ts = now if ts is None else ts
+    tokens = min(burst, tokens + max(0.0, now - ts) * rate)
+    after = tokens - cost
+    wait = -after / rate if after < 0 else 0.0
+    if max_wait is not None and wait > max_wait:
+        return Reservation(False, wait), tokens
+    return Reservation(True, wait), after
+
+
+class MemoryBackend:
+    """Состояние в памяти процесса — только для одного воркера и тестов"""
+
+    def __init__(self):
+        self._state = {}
+        self._lock = threading.Lock()
+
+    def reserve(self, bucket, rate, burst, cost, max_wait):
+        with self._lock:
+            now = time.time()
+            tokens, ts = self._state.get(bucket, (None, None))
+            reservation, tokens = _take(tokens, ts, now, rate, burst, cost, max_wait)
+            self._state[bucket] = (tokens, now)
+            return reservation
+
+    def available(self, bucket, rate, burst):
+        with self._lock:
+            tokens, ts = self._state.get(bucket, (burst, time.time()))
+            return min(burst, tokens + max(0.0, time.time() - ts) * rate)
+
+
+class FileBackend:
+    """Состояние в JSON-файле под flock — общее для всех воркеров одного хоста"""
+
+    def __init__(self, path):
+        self.path = path
+
+    def _locked(self, update):
+        with open(self.path, 'a+') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                f.seek(0)
+                raw = f.read()
+                state = json.loads(raw) if raw else {}
+                result, changed = update(state)
+                if changed:
+                    f.seek(0)
+                    f.truncate()
+                    f.write(json.dumps(state))
+                    f.flush()
+                return result
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+
+    def reserve(self, bucket, rate, burst, cost, max_wait):
+        def update(state):
+            now = time.time()
+            tokens, ts = state.get(bucket, (None, None))
+            reservation, tokens = _take(tokens, ts, now, rate, burst, cost, max_wait)
+            state[bucket] = (tokens, now)
+            return reservation, True
+        return self._locked(update)
+
+    def available(self, bucket, rate, burst):
+        def update(state):
+            tokens, ts = state.get(bucket, (burst, time.time()))
+            return min(burst, tokens + max(0.0, time.time() - ts) * rate), False
+        return self._locked(update)
+
+
+class RedisBackend:
+    """Состояние в Redis — общее для всех воркеров и хостов; время берётся у Redis"""
+
+    RESERVE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local cost = tonumber(ARGV[3])
+    local max_wait = tonumber(ARGV[4])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    tokens = math.min(burst, tokens + math.max(0, now - ts) * rate)
+    local after = tokens - cost
+    local wait = 0
+    if after < 0 then wait = -after / rate end
+    if max_wait >= 0 and wait > max_wait then
+        return {0, tostring(wait), tostring(tokens)}
+    end
+    redis.call('HSET', KEYS[1], 'tokens', tostring(after), 'ts', tostring(now))
+    redis.call('PEXPIRE', KEYS[1], math.ceil((burst - after) / rate * 1000) + 1000)
+    return {1, tostring(wait), tostring(after)}
+    """
+
+    AVAILABLE_SCRIPT = """
+    local rate = tonumber(ARGV[1])
+    local burst = tonumber(ARGV[2])
+    local t = redis.call('TIME')
+    local now = tonumber(t[1]) + tonumber(t[2]) / 1000000
+    local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+    local tokens = tonumber(state[1]) or burst
+    local ts = tonumber(state[2]) or now
+    return tostring(math.min(burst, tokens + math.max(0, now - ts) * rate))
+    """
+
+    def __init__(self, url, prefix='zatravel:ratelimit:'):
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=0.2, socket_timeout=0.5)
+        self.prefix = prefix
+        self._reserve = self.client.register_script(self.RESERVE_SCRIPT)
+        self._available = self.client.register_script(self.AVAILABLE_SCRIPT)
+
+    def reserve(self, bucket, rate, burst, cost, max_wait):
+        granted, wait, _ = self._reserve(
+            keys=[self.prefix + bucket],
+            args=[rate, burst, cost, -1 if max_wait is None else max_wait]
+        )
+        return Reservation(bool(int(granted)), float(wait))
+
+    def available(self, bucket, rate, burst):
+        return float(self._available(keys=[self.prefix + bucket], args=[rate, burst]))
+
+
+class TokenBucketLimiter:
+    """
+    Общий для всех воркеров token bucket с отдельными бюджетами
+    (например, 'search' для flight-offers и 'reference' для справочников).
+
+    reserve() не спит: он списывает токены и возвращает время ожидания,
+    которое вызывающий может подождать (await asyncio.sleep) или сразу отказать.
+    """
+
+    REDIS_RETRY_AFTER = 30  # секунд на локальном backend после ошибки Redis
+
+    def __init__(self):
+        self.budgets = {'search': (5.0, 5.0), 'reference': (5.0, 5.0)}
+        self.max_wait = 2.0
+        self.penalty_share = 0.5
+        self.backend = MemoryBackend()
+        self._fallback = self.backend
+        self._redis_down_until = 0
+
+    def init_app(self, app):
+        config = app.config
+        search_rate = config.get('RATE_LIMIT_SEARCH_RATE', 5.0)
+        search_burst = config.get('RATE_LIMIT_SEARCH_BURST', 5.0)
+        prewarm_share = config.get('PREWARM_BUDGET_SHARE', 0.2)
+        prefetch_share = config.get('PREFETCH_BUDGET_SHARE', 0.3)
+        keys = max(1, len(config.get('AMADEUS_CREDENTIALS', [])))
+        # 'search' и 'reference' — бюджеты одного ключа пула (у каждого ключа свой)
+        self.budgets = {
+            'search': (search_rate, search_burst),
+            'reference': (config.get('RATE_LIMIT_REFERENCE_RATE', 5.0), config.get('RATE_LIMIT_REFERENCE_BURST', 5.0)),
+            # Фоновый прогрев кэша: его запросы идут и через 'search', этот бюджет лишь ограничивает
+            # долю от суммарного лимита всех ключей
+            'prewarm': (search_rate * prewarm_share * keys, max(1.0, search_burst * prewarm_share * keys)),
+            # Спекулятивные поиски из формы (/search/prefetch) — так же, своя доля
+            'prefetch': (search_rate * prefetch_share * keys, max(1.0, search_burst * prefetch_share * keys)),
+        }
+        self.max_wait = config.get('RATE_LIMIT_MAX_WAIT', 2.0)
+        self.penalty_share = config.get('RATE_LIMIT_PENALTY_SHARE', 0.5)
+
+        path = config.get('RATE_LIMIT_FILE') or os.path.join(tempfile.gettempdir(), 'zatravel-ratelimit.json')
+        self._fallback = FileBackend(path) if fcntl is not None else MemoryBackend()
+
+        backend = config.get('RATE_LIMIT_BACKEND', 'file')
+        if backend == 'redis' and redis is not None:
+            self.backend = RedisBackend(config['REDIS_URL'])
+        elif backend == 'memory':
+            self.backend = MemoryBackend()
+        else:
+            self.backend = self._fallback
+        logger.info(f"Rate limiter backend: {type(self.backend).__name__}, budgets: {self.budgets}")
+
+    def _budget(self, bucket):
+        # 'search:<id ключа>' — бюджет ключа из пула, с теми же параметрами, что и 'search'
+        return self.budgets.get(bucket.partition(':')[0], self.budgets['search'])
+
+    def _call(self, method, bucket, *args):
+        backend = self.backend
+        if isinstance(backend, RedisBackend) and time.time() >= self._redis_down_until:
+            try:
+                return getattr(backend, method)(bucket, *self._budget(bucket), *args)
+            except redis.RedisError as e:
+                logger.warning(f"Rate limiter Redis unavailable, using local backend: {e}")
+                self._redis_down_until = time.time() + self.REDIS_RETRY_AFTER
+        if isinstance(backend, RedisBackend):
+            backend = self._fallback
+        return getattr(backend, method)(bucket, *self._budget(bucket), *args)
+
+    def reserve(self, bucket, cost=1, max_wait=None):
+        """
+        Резервирует cost токенов. Если ожидание превышает max_wait —
+        ничего не списывает и возвращает Reservation(False, через сколько повторить).
+        """
+        return self._call('reserve', bucket, cost, max_wait)
+
+    def acquire(self, bucket, cost=1, max_wait=None):
+        """
+        Резервирует токены с ожиданием не дольше max_wait (по умолчанию self.max_wait),
+        иначе бросает RateLimitExceeded. Возвращает, сколько ждать до своей очереди.
+        """
+        reservation = self.reserve(bucket, cost, self.max_wait if max_wait is None else max_wait)
+        if not reservation.granted:
+            RATE_LIMIT_REJECTIONS.inc(bucket=bucket)
+            raise RateLimitExceeded(bucket, reservation.wait)
+        RATE_LIMIT_WAIT_SECONDS.observe(reservation.wait, bucket=bucket)
+        return reservation.wait
+
+    def penalize(self, bucket, seconds):
+        """
+        После 429 уводит бюджет в минус на seconds секунд — все воркеры притормозят.
+        Один штраф списывает не больше penalty_share от burst: один 429 не опустошает весь бюджет.
+        """
+        rate, burst = self._budget(bucket)
+        self.reserve(bucket, cost=min(rate * seconds, burst * self.penalty_share))
+
+    def available(self, bucket):
+        """Сколько токенов доступно прямо сейчас (отрицательное значение — очередь ожидания)"""
+        return self._call('available', bucket)
+
+
+rate_limiter = TokenBucketLimiter()
+
+
+def init_rate_limiter(app):
+    rate_limiter.init_app(app)
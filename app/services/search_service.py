@@ -0,0 +1,224 @@
+import asyncio
+import logging
+import time
+
+from app.models import FlightOffer, offer_dict_to_json
+from app.services.circuit_breaker import CircuitOpenError
+from app.services.metrics import record, span, SEARCH_CACHE_RESULTS
+
+logger = logging.getLogger(__name__)
+
+
+def parse_offer(offer):
+    """Преобразует одно предложение Amadeus в FlightOffer (None — если оно битое)"""
+    try:
+        return FlightOffer.from_amadeus_data(offer)
+    except Exception as e:
+        logger.warning(f"Failed to parse flight offer: {e}")
+        return None
+
+
+def iter_offers(results):
+    """Разбирает ответ Amadeus по одному предложению, пропуская битые"""
+    for offer in results.get('data', []):
+        flight = parse_offer(offer)
+        if flight is not None:
+            yield flight
+
+
+def parse_offers(results):
+    """Преобразует ответ Amadeus в список словарей FlightOffer, пропуская битые предложения"""
+    with span('parse'):
+        return [flight.to_dict() for flight in iter_offers(results)]
+
+
+def cheapest_offer(flights):
+    """Самое дешёвое предложение из списка (или None)"""
+    return min(flights, key=lambda flight: flight['price'], default=None)
+
+
+class SearchService:
+    """
+    Поиск рейсов через кэш результатов с обращением к Amadeus только при промахе.
+    Одинаковые одновременные промахи склеиваются в один запрос к Amadeus.
+    """
+
+    def __init__(self, client, cache, async_client=None, coalescer=None, fanout_concurrency=8, popular=None,
+                 history=None):
+        self.client = client
+        self.cache = cache
+        self.async_client = async_client
+        self.coalescer = coalescer
+        self.fanout_concurrency = fanout_concurrency
+        self.popular = popular  # учёт популярных поисков для фонового прогрева кэша
+        self.history = history  # история цен: каждый ответ Amadeus, без повторов из кэша
+
+    def _observe(self, search_params, flights):
+        """Передаёт свежий ответ Amadeus в историю цен (запись — в фоне)"""
+        if self.history is not None:
+            self.history.record(search_params, flights)
+        return flights
+
+    def _coalesced(self, search_params):
+        """Запрос к Amadeus; возвращает (рейсы, получен ли результат от чужого запроса)"""
+        def upstream():
+            return self._observe(search_params, parse_offers(self.client.search_flights(search_params)))
+
+        if self.coalescer is None:
+            return upstream(), False
+        start = time.perf_counter()
+        # Дольше срока запроса к Amadeus чужой результат не ждём — лидер завис или брошен
+        flights, shared = self.coalescer.do(self.cache.make_key(search_params), upstream, self.client.deadline)
+        if shared:
+            # Этапы выполнил чужой запрос — здесь только ожидание его результата
+            record('coalesced', time.perf_counter() - start)
+        return flights, shared
+
+    def peek(self, search_params):
+        """Поиск в кэше результатов; попадания учитываются в метриках, сам поиск — в популярности"""
+        if self.popular is not None:
+            self.popular.record(search_params)
+        with span('cache'):
+            flights, cache_status = self.cache.peek(search_params, lambda: self.fetch(search_params))
+        if cache_status != 'miss':
+            SEARCH_CACHE_RESULTS.inc(status=cache_status)
+        return flights, cache_status
+
+    def _finish(self, search_params, flights, shared):
+        """Кладёт результат лидера в кэш и возвращает итоговый статус поиска"""
+        cache_status = 'coalesced' if shared else 'miss'
+        SEARCH_CACHE_RESULTS.inc(status=cache_status)
+        if not shared:
+            self.cache.store(search_params, flights)
+        return cache_status
+
+    def _unavailable(self, search_params, error):
+        """Amadeus недоступен (цепь разомкнута): последний известный результат или та же ошибка"""
+        flights = self.cache.last_known(search_params)
+        if flights is None:
+            raise error
+        logger.warning(f"Serving last known result while provider is unavailable: {error}")
+        SEARCH_CACHE_RESULTS.inc(status='stale')
+        return flights, 'stale'
+
+    def fetch(self, search_params):
+        """Запрос к Amadeus в обход кэша (одинаковые одновременные запросы склеиваются)"""
+        flights, _ = self._coalesced(search_params)
+        return flights
+
+    def search(self, search_params):
+        """Возвращает (список рейсов, статус: 'hit' / 'stale' / 'miss' / 'coalesced')"""
+        flights, cache_status = self.peek(search_params)
+        if cache_status != 'miss':
+            return flights, cache_status
+
+        try:
+            flights, shared = self._coalesced(search_params)
+        except CircuitOpenError as e:
+            return self._unavailable(search_params, e)
+        return flights, self._finish(search_params, flights, shared)
+
+    def _lead(self, search_params):
+        """
+        Для потоковой выдачи: (Lead, None) — этот запрос идёт в Amadeus сам и завершает Lead;
+        (None, рейсы) — такой же поиск уже шёл (например, предзагрузка из формы), его результат.
+        """
+        if self.coalescer is None:
+            return None, None
+        start = time.perf_counter()
+        lead, flights = self.coalescer.lead(self.cache.make_key(search_params), self.client.deadline)
+        if lead is None:
+            record('coalesced', time.perf_counter() - start)
+        return lead, flights
+
+    def iter_search(self, search_params):
+        """
+        Генератор для потоковой выдачи: отдаёт JSON рейсов по одному, сразу после разбора.
+        Из кэша — все сразу; при промахе разбирает ответ Amadeus и в конце кладёт его в кэш.
+        Потоковый запрос — лидер single-flight: одновременные поиски с тем же ключом
+        (потоковые и обычные) ждут его результат, а не идут в Amadeus сами.
+        """
+        flights, cache_status = self.peek(search_params)
+        lead = None
+        if cache_status == 'miss':
+            try:
+                lead, flights = self._lead(search_params)
+            except CircuitOpenError as e:
+                flights, cache_status = self._unavailable(search_params, e)
+            else:
+                if flights is not None:
+                    cache_status = self._finish(search_params, flights, shared=True)
+        if cache_status != 'miss':
+            for flight in flights:
+                yield offer_dict_to_json(flight)
+            return
+
+        try:
+            results = self.client.search_flights(search_params)
+        except Exception as e:
+            if lead is not None:
+                lead.failed(e)
+            if not isinstance(e, CircuitOpenError):
+                raise
+            flights, _ = self._unavailable(search_params, e)
+            for flight in flights:
+                yield offer_dict_to_json(flight)
+            return
+
+        flights = []
+        offers = iter_offers(results)
+        try:
+            for flight in offers:
+                flights.append(flight.to_dict())
+                yield flight.to_json()
+        finally:
+            # Клиент мог отключиться посреди потока — ожидающим всё равно нужен полный результат
+            flights.extend(flight.to_dict() for flight in offers)
+            self._observe(search_params, flights)
+            self._finish(search_params, flights, shared=False)
+            if lead is not None:
+                lead.done(flights)
+
+    async def search_async(self, search_params):
+        """Асинхронный вариант search(): при промахе ждёт Amadeus, не занимая поток"""
+        flights, cache_status = self.peek(search_params)
+        if cache_status != 'miss':
+            return flights, cache_status
+
+        async def upstream():
+            return self._observe(search_params, parse_offers(await self.async_client.search_flights(search_params)))
+
+        try:
+            if self.coalescer is None:
+                flights, shared = await upstream(), False
+            else:
+                start = time.perf_counter()
+                flights, shared = await self.coalescer.do_async(self.cache.make_key(search_params), upstream,
+                                                                self.async_client.deadline)
+                if shared:
+                    record('coalesced', time.perf_counter() - start)
+        except CircuitOpenError as e:
+            return self._unavailable(search_params, e)
+        return flights, self._finish(search_params, flights, shared)
+
+    async def search_many_async(self, params_list, timeout=None, concurrency=None):
+        """
+        Выполняет несколько поисков параллельно (не больше fanout_concurrency одновременно).
+        Темп запросов к Amadeus по-прежнему задаёт общий rate limiter.
+        Возвращает список в том же порядке: (рейсы, статус) или исключение для каждого поиска.
+        """
+        semaphore = asyncio.Semaphore(concurrency or self.fanout_concurrency)
+
+        async def one(search_params):
+            async with semaphore:
+                return await self.search_async(search_params)
+
+        async def guarded(search_params):
+            try:
+                return await asyncio.wait_for(one(search_params), timeout)
+            except asyncio.TimeoutError:
+                return TimeoutError(f"Search timed out after {timeout}s")
+            except Exception as e:
+                return e
+
+        return await asyncio.gather(*(guarded(p) for p in params_list))
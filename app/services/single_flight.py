@@ -0,0 +1,251 @@
+import asyncio
+import json
+import logging
+import threading
+import time
+from concurrent.futures import Future, TimeoutError as FutureTimeout
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+from app.services.circuit_breaker import CircuitOpenError, DeadlineExceeded
+from app.services.rate_limiter import RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+# Ошибки, которые ведомые из других воркеров получают того же типа: по ним маршруты
+# отвечают 429/503 с Retry-After (или 504, если истёк срок запроса),
+# а поиск может отдать последний известный результат
+_TYPED_ERRORS = {cls.__name__: cls for cls in (RateLimitExceeded, CircuitOpenError)}
+
+
+def error_payload(e):
+    """Ошибка лидера для публикации в Redis"""
+    payload = {'error': str(e), 'type': type(e).__name__}
+    if isinstance(e, RateLimitExceeded):
+        payload.update(source=e.bucket, retry_after=e.retry_after)
+    elif isinstance(e, CircuitOpenError):
+        payload.update(source=e.endpoint, retry_after=e.retry_after)
+    return payload
+
+
+def error_from_payload(payload):
+    """Исключение для ведомого: того же типа, что у лидера, если тип известен"""
+    if payload.get('type') == DeadlineExceeded.__name__:
+        return DeadlineExceeded(payload['error'])
+    cls = _TYPED_ERRORS.get(payload.get('type'))
+    if cls is not None and 'retry_after' in payload:
+        return cls(payload.get('source', ''), payload['retry_after'])
+    return Exception(payload['error'])
+
+
+class SingleFlight:
+    """
+    Склейка одинаковых одновременных запросов (single-flight).
+
+    Первый вызов с ключом выполняет функцию, остальные с тем же ключом
+    ждут тот же результат (или ту же ошибку). Внутри процесса ожидание идёт
+    через общий Future; между воркерами — через короткий lock в Redis:
+    лидер публикует результат, остальные воркеры забирают его, а не идут в Amadeus.
+    """
+
+    POLL_INTERVAL = 0.05
+    REDIS_RETRY_AFTER = 30
+
+    def __init__(self):
+        self._calls = {}
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_down_until = 0
+        self.prefix = 'zatravel:singleflight:'
+        self.lock_ttl = 30       # сек — сколько живёт lock лидера
+        self.result_ttl = 10     # сек — сколько хранится опубликованный результат
+        self.wait_timeout = 20   # сек — дольше ждать чужой воркер не будем
+
+    def init_app(self, app):
+        self.lock_ttl = app.config.get('SINGLE_FLIGHT_LOCK_TTL', 30)
+        self.wait_timeout = app.config.get('SINGLE_FLIGHT_WAIT_TIMEOUT', 20)
+        if app.config.get('SINGLE_FLIGHT_REDIS') and redis is not None:
+            self._redis = redis.Redis.from_url(
+                app.config['REDIS_URL'],
+                socket_connect_timeout=0.2,
+                socket_timeout=0.5
+            )
+
+    def _redis_client(self):
+        if self._redis is None or time.time() < self._redis_down_until:
+            return None
+        return self._redis
+
+    def _redis_failed(self, e):
+        logger.warning(f"Single-flight Redis unavailable, coalescing in-process only: {e}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_AFTER
+
+    def _join(self, key):
+        """Возвращает (Future, является ли вызывающий лидером)"""
+        with self._lock:
+            future = self._calls.get(key)
+            if future is not None:
+                return future, False
+            future = Future()
+            self._calls[key] = future
+            return future, True
+
+    def _finish(self, key, future, result=None, error=None):
+        with self._lock:
+            self._calls.pop(key, None)
+        if error is not None:
+            future.set_exception(error)
+        else:
+            future.set_result(result)
+
+    def lead(self, key, timeout=None):
+        """
+        Занимает ключ, не выполняя функцию, — для вызовов, которые отдают результат по частям.
+        Возвращает (Lead, None): вызывающий — лидер, выполняет запрос сам и обязан завершить его
+        через lead.done(результат) или lead.failed(ошибка); либо (None, результат другого вызова).
+        Ошибку другого вызова бросает. Чужой результат ждём не дольше timeout
+        (по умолчанию wait_timeout) — потом выполняем запрос сами, ключ остаётся за лидером.
+        """
+        timeout = self.wait_timeout if timeout is None else timeout
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                return None, future.result(timeout=timeout)
+            except FutureTimeout:
+                logger.warning(f"Single-flight leader for {key} is too slow, fetching independently")
+                return Lead(self, key, None), None
+
+        client = self._redis_client()
+        if client is None:
+            return Lead(self, key, future), None
+
+        lock_key = f"{self.prefix}lock:{key}"
+        result_key = f"{self.prefix}result:{key}"
+        try:
+            acquired = client.set(lock_key, 1, nx=True, ex=self.lock_ttl)
+        except redis.RedisError as e:
+            self._redis_failed(e)
+            return Lead(self, key, future), None
+
+        if acquired:
+            try:
+                # Результат прошлого вызова не должен достаться ведомым этого
+                client.delete(result_key)
+            except redis.RedisError as e:
+                self._redis_failed(e)
+            return Lead(self, key, future, client), None
+
+        published = self._wait_published(client, lock_key, result_key, timeout)
+        if published is None:
+            # Лидер пропал или слишком долго — выполняем сами
+            return Lead(self, key, future), None
+        if 'error' in published:
+            error = error_from_payload(published)
+            self._finish(key, future, error=error)
+            raise error
+        self._finish(key, future, result=published['result'])
+        return None, published['result']
+
+    def do(self, key, fn, timeout=None):
+        """
+        Выполняет fn() один раз на ключ среди одновременных вызовов.
+        Возвращает (результат, shared), где shared=True — результат получен от другого вызова.
+        timeout — сколько ждать чужой результат, см. lead().
+        """
+        lead, result = self.lead(key, timeout)
+        if lead is None:
+            return result, True
+
+        try:
+            result = fn()
+        except Exception as e:
+            lead.failed(e)
+            raise
+        lead.done(result)
+        return result, False
+
+    async def do_async(self, key, coro_fn, timeout=None):
+        """Асинхронный вариант do() — склейка внутри процесса, без блокировки потока"""
+        future, leader = self._join(key)
+        if not leader:
+            try:
+                # shield: отмена по таймауту не должна отменять Future лидера
+                return await asyncio.wait_for(asyncio.shield(asyncio.wrap_future(future)),
+                                              self.wait_timeout if timeout is None else timeout), True
+            except asyncio.TimeoutError:
+                logger.warning(f"Single-flight leader for {key} is too slow, fetching independently")
+                return await coro_fn(), False
+
+        try:
+            result = await coro_fn()
+        except BaseException as e:
+            # В т.ч. CancelledError (таймаут лидера) — иначе ожидающие повиснут
+            error = e if isinstance(e, Exception) else TimeoutError("Coalesced search was cancelled")
+            self._finish(key, future, error=error)
+            raise
+        self._finish(key, future, result=result)
+        return result, False
+
+    # === Склейка между воркерами через Redis ===
+
+    def _publish(self, client, result_key, payload):
+        try:
+            client.set(result_key, json.dumps(payload), ex=self.result_ttl)
+        except (redis.RedisError, TypeError, ValueError) as e:
+            logger.warning(f"Single-flight publish failed: {e}")
+
+    def _wait_published(self, client, lock_key, result_key, timeout):
+        deadline = time.time() + timeout
+        while time.time() < deadline:
+            try:
+                raw = client.get(result_key)
+                if raw:
+                    return json.loads(raw)
+                if not client.exists(lock_key):
+                    # lock снят — результат мог появиться между двумя проверками
+                    raw = client.get(result_key)
+                    return json.loads(raw) if raw else None
+            except redis.RedisError as e:
+                self._redis_failed(e)
+                return None
+            time.sleep(self.POLL_INTERVAL)
+        return None
+
+
+
+class Lead:
+    """Занятый ключ single-flight: результат лидера уходит ожидающим этого процесса и других воркеров"""
+
+    def __init__(self, flight, key, future, client=None):
+        self.flight = flight
+        self.key = key
+        self.future = future  # None — ключ занят другим (медленным) лидером, ждущих у этого вызова нет
+        self.client = client  # None — lock в Redis не взят, публиковать некуда
+
+    def _publish(self, payload):
+        if self.client is None:
+            return
+        self.flight._publish(self.client, f"{self.flight.prefix}result:{self.key}", payload)
+        try:
+            self.client.delete(f"{self.flight.prefix}lock:{self.key}")
+        except redis.RedisError as e:
+            self.flight._redis_failed(e)
+
+    def done(self, result):
+        self._publish({'result': result})
+        if self.future is not None:
+            self.flight._finish(self.key, self.future, result=result)
+
+    def failed(self, error):
+        self._publish(error_payload(error))
+        if self.future is not None:
+            self.flight._finish(self.key, self.future, error=error)
+
+single_flight = SingleFlight()
+
+
+def init_single_flight(app):
+    single_flight.init_app(app)
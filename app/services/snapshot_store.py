@@ -0,0 +1,154 @@
+import base64
+import hashlib
+import logging
+import threading
+import time
+from collections import OrderedDict
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def encode_cursor(snapshot_id, offset):
+    """Непрозрачный курсор страницы: снимок + смещение"""
+    return base64.urlsafe_b64encode(f"{snapshot_id}:{offset}".encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """Возвращает (snapshot_id, offset); при некорректном курсоре бросает ValueError"""
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        snapshot_id, _, offset = base64.urlsafe_b64decode(padded.encode()).decode().rpartition(':')
+        offset = int(offset)
+    except Exception:
+        raise ValueError('Invalid cursor')
+    if not snapshot_id or offset < 0:
+        raise ValueError('Invalid cursor')
+    return snapshot_id, offset
+
+
+class SnapshotStore:
+    """
+    Снимки результатов поиска для постраничной выдачи без повторных запросов к Amadeus.
+
+    Снимок — список уже сериализованных в JSON предложений (компактнее словарей,
+    и страницу можно отдать простой склейкой строк). Хранится в памяти процесса
+    с ограничением по суммарному размеру (вытесняются самые старые) и, если есть Redis,
+    ещё и там — чтобы следующую страницу мог отдать любой воркер.
+    """
+
+    REDIS_RETRY_AFTER = 30
+
+    def __init__(self):
+        self.ttl = 900
+        self.max_bytes = 32 * 1024 * 1024
+        self.prefix = 'zatravel:snapshot:'
+        self._snapshots = OrderedDict()  # id → (истекает, список JSON предложений, размер)
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self._redis = None
+        self._redis_down_until = 0
+
+    def init_app(self, app):
+        self.ttl = app.config.get('SNAPSHOT_TTL', 900)
+        self.max_bytes = app.config.get('SNAPSHOT_MAX_BYTES', 32 * 1024 * 1024)
+        if app.config.get('SNAPSHOT_REDIS') and redis is not None:
+            self._redis = redis.Redis.from_url(
+                app.config['REDIS_URL'],
+                socket_connect_timeout=0.2,
+                socket_timeout=0.5
+            )
+
+    def _redis_client(self):
+        if self._redis is None or time.time() < self._redis_down_until:
+            return None
+        return self._redis
+
+    def _redis_failed(self, e):
+        logger.warning(f"Snapshot Redis tier unavailable: {e}")
+        self._redis_down_until = time.time() + self.REDIS_RETRY_AFTER
+
+    @staticmethod
+    def make_id(search_key, offers):
+        """Один и тот же результат поиска даёт тот же снимок — повторный /search его переиспользует"""
+        digest = hashlib.sha1()
+        for offer in offers:
+            digest.update(offer.encode('utf-8'))
+        return f"{search_key[:16]}{digest.hexdigest()[:8]}"
+
+    def create(self, search_key, offers):
+        """Сохраняет снимок (список JSON-строк предложений) и возвращает его id"""
+        snapshot_id = self.make_id(search_key, offers)
+        size = sum(len(offer) for offer in offers)
+        expires_at = time.time() + self.ttl
+
+        with self._lock:
+            existing = self._snapshots.pop(snapshot_id, None)
+            if existing is not None:
+                self._bytes -= existing[2]
+            self._snapshots[snapshot_id] = (expires_at, offers, size)
+            self._bytes += size
+            self._evict()
+
+        client = self._redis_client()
+        if client is not None and offers:
+            try:
+                key = self.prefix + snapshot_id
+                # Снимок уже был — продлеваем и копию в Redis, иначе другие воркеры ответят 410
+                # на курсор, который этот воркер ещё обслуживает. Копии нет (Redis перезапускался) — пишем заново
+                if existing is not None and client.expire(key, self.ttl):
+                    return snapshot_id
+                pipe = client.pipeline()
+                pipe.delete(key)
+                pipe.rpush(key, *offers)
+                pipe.expire(key, self.ttl)
+                pipe.execute()
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+        return snapshot_id
+
+    def _evict(self):
+        # Сначала просроченные, затем самые старые — пока не уложимся в лимит памяти
+        now = time.time()
+        for snapshot_id in [sid for sid, (expires_at, _, _) in self._snapshots.items() if expires_at <= now]:
+            self._bytes -= self._snapshots.pop(snapshot_id)[2]
+        while self._bytes > self.max_bytes and len(self._snapshots) > 1:
+            _, (_, _, size) = self._snapshots.popitem(last=False)
+            self._bytes -= size
+
+    def page(self, snapshot_id, offset, limit):
+        """
+        Возвращает (предложения страницы, всего в снимке) или None, если снимок истёк.
+        """
+        with self._lock:
+            snapshot = self._snapshots.get(snapshot_id)
+            if snapshot is not None and snapshot[0] > time.time():
+                offers = snapshot[1]
+                return offers[offset:offset + limit], len(offers)
+
+        client = self._redis_client()
+        if client is not None:
+            try:
+                key = self.prefix + snapshot_id
+                pipe = client.pipeline()
+                pipe.lrange(key, offset, offset + limit - 1)
+                pipe.llen(key)
+                offers, total = pipe.execute()
+                if total:
+                    return [offer.decode('utf-8') for offer in offers], total
+            except redis.RedisError as e:
+                self._redis_failed(e)
+
+        return None
+
+
+snapshot_store = SnapshotStore()
+
+
+def init_snapshot_store(app):
+    snapshot_store.init_app(app)
@@ -0,0 +1,262 @@
+import hashlib
+import json
+import logging
+import os
+import random
+import tempfile
+import threading
+import time
+
+from app.services.fork_safety import after_fork
+
+try:
+    import fcntl
+except ImportError:  # Windows — файловые блокировки недоступны
+    fcntl = None
+
+try:
+    import redis
+except ImportError:
+    redis = None
+
+logger = logging.getLogger(__name__)
+
+
+def credential_id(api_key):
+    """Короткий идентификатор ключа для имён записей — сам ключ в хранилище не пишем"""
+    return hashlib.sha1(str(api_key).encode('utf-8')).hexdigest()[:12]
+
+
+class MemoryTokenBackend:
+    """Токен в памяти процесса — для одного воркера и тестов"""
+
+    def __init__(self):
+        self._data = {}
+        self._lock = threading.Lock()
+
+    def read(self, name):
+        return self._data.get(name)
+
+    def write(self, name, record):
+        self._data[name] = record
+
+    def try_lock(self, name):
+        return self._lock.acquire(blocking=False)
+
+    def unlock(self, name):
+        self._lock.release()
+
+
+class FileTokenBackend:
+    """Токен в файле (права 0600) с flock — общий для всех воркеров хоста"""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._held = {}
+
+    def _path(self, name, suffix):
+        return os.path.join(self.directory, f"zatravel-token-{name}{suffix}")
+
+    def read(self, name):
+        try:
+            with open(self._path(name, '.json')) as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return None
+
+    def write(self, name, record):
+        # Пишем во временный файл и атомарно подменяем — читатели не увидят половину записи
+        path = self._path(name, '.json')
+        tmp = f"{path}.{os.getpid()}.tmp"
+        fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_TRUNC, 0o600)
+        with os.fdopen(fd, 'w') as f:
+            json.dump(record, f)
+        os.replace(tmp, path)
+
+    def try_lock(self, name):
+        f = open(self._path(name, '.lock'), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            f.close()
+            return False
+        self._held[name] = f
+        return True
+
+    def unlock(self, name):
+        f = self._held.pop(name, None)
+        if f is not None:
+            fcntl.flock(f, fcntl.LOCK_UN)
+            f.close()
+
+
+class RedisTokenBackend:
+    """Токен в Redis — общий для всех воркеров и хостов"""
+
+    def __init__(self, url, prefix='zatravel:token:'):
+        self.client = redis.Redis.from_url(url, socket_connect_timeout=0.2, socket_timeout=0.5)
+        self.prefix = prefix
+
+    def read(self, name):
+        raw = self.client.get(self.prefix + name)
+        return json.loads(raw) if raw else None
+
+    def write(self, name, record):
+        ttl = max(1, int(record['expires_at'] - time.time()))
+        self.client.set(self.prefix + name, json.dumps(record), ex=ttl)
+
+    def try_lock(self, name):
+        return bool(self.client.set(f"{self.prefix}{name}:lock", os.getpid(), nx=True, ex=30))
+
+    def unlock(self, name):
+        self.client.delete(f"{self.prefix}{name}:lock")
+
+
+class TokenStore:
+    """
+    Общее хранилище OAuth-токенов Amadeus для всех воркеров.
+
+    Токен обновляется заранее фоновым потоком (за refresh_margin секунд до истечения),
+    причём одновременно обновляет только один процесс — остальные читают готовый токен.
+    Блокирующий запрос токена на пути запроса остаётся только при холодном старте.
+    """
+
+    def __init__(self):
+        self.backend = MemoryTokenBackend()
+        self.refresh_margin = 300   # сек до истечения, когда пора обновлять
+        self.min_valid = 30         # сек — токен с меньшим остатком не отдаём
+        self._local = {}            # name → запись, чтобы не читать хранилище на каждый запрос
+        self._refreshers = {}
+        self._lock = threading.Lock()
+        after_fork(self._reset_refreshers)
+
+    def _reset_refreshers(self):
+        # Потоки обновления остались в родителе; токен (_local) ещё годен и переживает fork
+        self._refreshers = {}
+        self._lock = threading.Lock()
+
+    def init_app(self, app):
+        self.refresh_margin = app.config.get('TOKEN_REFRESH_MARGIN', 300)
+        backend = app.config.get('TOKEN_STORE_BACKEND', 'file')
+        if backend == 'redis' and redis is not None:
+            self.backend = RedisTokenBackend(app.config['REDIS_URL'])
+        elif backend == 'file' and fcntl is not None:
+            self.backend = FileTokenBackend(app.config.get('TOKEN_STORE_DIR') or tempfile.gettempdir())
+        else:
+            self.backend = MemoryTokenBackend()
+        logger.info(f"Token store backend: {type(self.backend).__name__}")
+
+    # === Чтение и запись ===
+
+    def _read(self, name):
+        try:
+            return self.backend.read(name)
+        except Exception as e:
+            logger.warning(f"Token store read failed: {e}")
+            return None
+
+    def peek(self, name):
+        """Действующий токен без сетевого запроса или None"""
+        record = self._local.get(name)
+        if record is None or record['expires_at'] - time.time() < self.refresh_margin:
+            # Локальная копия устарела — возможно, другой процесс уже обновил токен
+            record = self._read(name) or record
+            if record is not None:
+                self._local[name] = record
+        if record is not None and record['expires_at'] - time.time() > self.min_valid:
+            return record['token']
+        return None
+
+    def put(self, name, token, expires_in):
+        record = {'token': token, 'expires_at': time.time() + expires_in}
+        self._local[name] = record
+        try:
+            self.backend.write(name, record)
+        except Exception as e:
+            logger.warning(f"Token store write failed: {e}")
+        return record
+
+    # === Обновление ===
+
+    def _refresh(self, name, fetch, blocking):
+        """
+        Обновляет токен под межпроцессной блокировкой.
+        fetch() возвращает (token, expires_in). Если блокировку держит другой
+        процесс — при blocking ждём его результат, иначе просто выходим.
+        """
+        deadline = time.time() + 15
+        while True:
+            try:
+                locked = self.backend.try_lock(name)
+            except Exception as e:
+                logger.warning(f"Token store lock failed: {e}")
+                locked = None
+
+            if locked or locked is None:
+                try:
+                    # Пока ждали блокировку, токен мог обновить другой процесс
+                    record = self._read(name)
+                    if record and record['expires_at'] - time.time() > self.refresh_margin:
+                        self._local[name] = record
+                        return record
+                    token, expires_in = fetch()
+                    logger.info(f"Access token {name} refreshed by pid {os.getpid()}")
+                    return self.put(name, token, expires_in)
+                finally:
+                    if locked:
+                        self.backend.unlock(name)
+
+            if not blocking:
+                return None
+            token = self.peek(name)
+            if token is not None or time.time() > deadline:
+                return self._local.get(name)
+            time.sleep(0.1)
+
+    def get_token(self, name, fetch):
+        """Действующий токен; при холодном старте получает его сам (один процесс на всех)"""
+        token = self.peek(name)
+        if token is None:
+            record = self._refresh(name, fetch, blocking=True)
+            if not record or record['expires_at'] <= time.time():
+                raise Exception("Failed to get access token")
+            token = record['token']
+        self.ensure_refresher(name, fetch)
+        return token
+
+    def ensure_refresher(self, name, fetch):
+        """Запускает (однажды на процесс) фоновый поток, обновляющий токен заранее"""
+        with self._lock:
+            thread = self._refreshers.get(name)
+            if thread is not None and thread.is_alive():
+                return
+            thread = threading.Thread(
+                target=self._refresh_loop, args=(name, fetch),
+                name=f"token-refresher-{name}", daemon=True
+            )
+            self._refreshers[name] = thread
+            thread.start()
+
+    def _refresh_loop(self, name, fetch):
+        while True:
+            record = self._read(name) or self._local.get(name)
+            if record is None:
+                sleep_for = 5
+            else:
+                # Джиттер разводит воркеры во времени — меньше борьбы за блокировку
+                sleep_for = record['expires_at'] - self.refresh_margin - time.time() + random.uniform(0, 10)
+            if sleep_for > 0:
+                time.sleep(min(sleep_for, 60))
+                continue
+            try:
+                self._refresh(name, fetch, blocking=False)
+            except Exception as e:
+                logger.warning(f"Background token refresh failed: {e}")
+            time.sleep(5)
+
+
+token_store = TokenStore()
+
+
+def init_token_store(app):
+    token_store.init_app(app)
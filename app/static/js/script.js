@@ -1,6 +1,12 @@
 class FlightSearchApp {
     constructor() {
         this.isSearching = false;
+        this.nextCursor = null;
+        this.shownCount = 0;
+        this.airportCache = new Map();   // запрос → подсказки, чтобы не ходить за ними повторно
+        this.airportRequestId = 0;
+        this.lastPrefetch = null;        // тело последней предзагрузки — одинаковые не повторяем
+        this.schedulePrefetch = this.debounce(() => this.prefetchSearch(), 600);
         this.initEventListeners();
         this.setDefaultDates();
         this.setupDebugTools();
@@ -29,6 +35,15 @@ class FlightSearchApp {
                 input.addEventListener('input', this.debounce((e) => this.handleAirportSuggestions(e), 500));
             }
         });
+
+        // Предзагрузка: как только маршрут и дата заполнены, сервер начинает искать заранее
+        ['originInput', 'destinationInput', 'departureDate', 'returnDate', 'passengers'].forEach(id => {
+            const input = document.getElementById(id);
+            if (input) {
+                input.addEventListener('input', this.schedulePrefetch);
+                input.addEventListener('change', this.schedulePrefetch);
+            }
+        });
     }
 
     setDefaultDates() {
@@ -108,14 +123,8 @@ class FlightSearchApp {
         };
     }
 
-    async searchFlights() {
-        if (this.isSearching) {
-            console.log('Поиск уже выполняется...');
-            return;
-        }
-
-        this.isSearching = true;
-
+    searchFormData() {
+        // Тело запроса поиска из полей формы; null — если полей нет на странице
         const originInput = document.getElementById('originInput');
         const destinationInput = document.getElementById('destinationInput');
         const departureDate = document.getElementById('departureDate');
@@ -123,16 +132,14 @@ class FlightSearchApp {
         const passengers = document.getElementById('passengers');
 
         if (!originInput || !destinationInput || !departureDate || !passengers) {
-            this.showError('Не все поля формы найдены');
-            this.isSearching = false;
-            return;
+            return null;
         }
 
         const cleanAirportCode = (code) => {
             return code.split('(').pop().replace(')', '').trim().toUpperCase();
         };
 
-        const formData = {
+        return {
             origin: cleanAirportCode(originInput.value),
             destination: cleanAirportCode(destinationInput.value),
             departureDate: departureDate.value,
@@ -140,6 +147,49 @@ class FlightSearchApp {
             adults: passengers.value,
             maxResults: 10
         };
+    }
+
+    async prefetchSearch() {
+        const formData = this.searchFormData();
+        const today = new Date().toISOString().slice(0, 10);
+        if (this.isSearching || !formData || !/^[A-Z]{3}$/.test(formData.origin)
+            || !/^[A-Z]{3}$/.test(formData.destination) || formData.origin === formData.destination
+            || !formData.departureDate || formData.departureDate < today) {
+            return;
+        }
+
+        const body = JSON.stringify(formData);
+        if (body === this.lastPrefetch) return;
+        this.lastPrefetch = body;
+
+        try {
+            // Ответ не нужен: сервер кладёт результат в кэш, поиск по кнопке заберёт его оттуда.
+            // Отказ (429) означает, что бюджет запросов нужнее настоящим поискам
+            await fetch('/search/prefetch', {
+                method: 'POST',
+                headers: { 'Content-Type': 'application/json' },
+                body,
+                priority: 'low'
+            });
+        } catch (error) {
+            // Предзагрузка — только ускорение, ошибку пользователю не показываем
+        }
+    }
+
+    async searchFlights() {
+        if (this.isSearching) {
+            console.log('Поиск уже выполняется...');
+            return;
+        }
+
+        this.isSearching = true;
+
+        const formData = this.searchFormData();
+        if (!formData) {
+            this.showError('Не все поля формы найдены');
+            this.isSearching = false;
+            return;
+        }
 
         if (!formData.origin || !formData.destination || !formData.departureDate) {
             this.showError('Заполните все обязательные поля');
@@ -157,27 +207,28 @@ class FlightSearchApp {
 
         try {
             console.log('🚀 Отправка запроса с данными:', formData);
-            
-            const response = await fetch('/search', {
+
+            const response = await fetch('/search/stream', {
                 method: 'POST',
                 headers: {
                     'Content-Type': 'application/json',
+                    'Accept': 'application/x-ndjson'
                 },
                 body: JSON.stringify(formData)
             });
 
-            const data = await response.json();
-            console.log('✅ Получен ответ:', data);
-
             if (!response.ok) {
+                const data = await response.json().catch(() => ({}));
                 throw new Error(data.error || `Ошибка сервера: ${response.status}`);
             }
 
-            if (data.success) {
-                this.displayResults(data.flights || []);
-            } else {
-                this.showError(data.error || 'Произошла ошибка при поиске');
+            if (!response.body) {
+                // Браузер не умеет читать поток — обычный поиск
+                await this.searchFlightsClassic(formData);
+                return;
             }
+
+            await this.readFlightStream(response);
         } catch (error) {
             console.error('❌ Ошибка поиска:', error);
             this.showError(error.message || 'Ошибка сети. Проверьте консоль для подробностей.');
@@ -187,6 +238,144 @@ class FlightSearchApp {
         }
     }
 
+    async searchFlightsClassic(formData) {
+        const response = await fetch('/search', {
+            method: 'POST',
+            headers: {
+                'Content-Type': 'application/json',
+            },
+            body: JSON.stringify(formData)
+        });
+
+        const data = await response.json();
+        console.log('✅ Получен ответ:', data);
+
+        if (!response.ok) {
+            throw new Error(data.error || `Ошибка сервера: ${response.status}`);
+        }
+
+        if (data.success) {
+            this.displayResults(data.flights || []);
+            this.shownCount = (data.flights || []).length;
+            this.setNextPage(data.nextCursor);
+        } else {
+            this.showError(data.error || 'Произошла ошибка при поиске');
+        }
+    }
+
+    async readFlightStream(response) {
+        // NDJSON: каждая строка — событие; рейсы рисуем сразу, не дожидаясь конца ответа
+        const reader = response.body.getReader();
+        const decoder = new TextDecoder();
+        let buffer = '';
+        let count = 0;
+        let streamError = null;
+
+        this.startResults();
+
+        const handleLine = (line) => {
+            if (!line.trim()) return;
+            const event = JSON.parse(line);
+            if (event.type === 'offer') {
+                this.appendFlight(event.offer, count++);
+            } else if (event.type === 'query_done') {
+                this.setNextPage(event.nextCursor);
+            } else if (event.type === 'error') {
+                streamError = event.error;
+            }
+        };
+
+        while (true) {
+            const { value, done } = await reader.read();
+            if (done) break;
+            buffer += decoder.decode(value, { stream: true });
+            const lines = buffer.split('\n');
+            buffer = lines.pop();
+            lines.forEach(handleLine);
+        }
+        handleLine(buffer);
+
+        console.log('🔢 Получено рейсов из потока:', count);
+        this.shownCount = count;
+
+        if (count === 0) {
+            if (streamError) throw new Error(streamError);
+            this.displayResults([]);
+        }
+    }
+
+    startResults() {
+        const resultsDiv = document.getElementById('flightResults');
+        if (resultsDiv) resultsDiv.innerHTML = '';
+        this.shownCount = 0;
+        this.setNextPage(null);
+    }
+
+    setNextPage(cursor) {
+        // Кнопка «Показать ещё» — следующая страница берётся из снимка на сервере, без нового поиска
+        this.nextCursor = cursor || null;
+        let button = document.getElementById('loadMoreBtn');
+
+        if (!this.nextCursor) {
+            if (button) button.remove();
+            return;
+        }
+
+        if (!button) {
+            const resultsDiv = document.getElementById('flightResults');
+            if (!resultsDiv) return;
+            button = document.createElement('button');
+            button.id = 'loadMoreBtn';
+            button.type = 'button';
+            button.className = 'btn btn-outline-primary w-100 mb-3';
+            button.innerHTML = '<i class="bi bi-chevron-down"></i> Показать ещё';
+            button.onclick = () => this.loadMoreFlights();
+            resultsDiv.after(button);
+        }
+    }
+
+    async loadMoreFlights() {
+        if (!this.nextCursor) return;
+        const button = document.getElementById('loadMoreBtn');
+        if (button) button.disabled = true;
+
+        try {
+            const response = await fetch(`/search/page?cursor=${encodeURIComponent(this.nextCursor)}&limit=10`);
+            const data = await response.json();
+
+            if (!response.ok) {
+                throw new Error(data.error || `Ошибка сервера: ${response.status}`);
+            }
+
+            (data.flights || []).forEach(flight => this.appendFlight(flight, this.shownCount++));
+            this.setNextPage(data.nextCursor);
+        } catch (error) {
+            console.error('❌ Ошибка загрузки страницы:', error);
+            this.setNextPage(null);
+            this.showError(error.message || 'Не удалось загрузить следующие рейсы');
+        } finally {
+            if (button) button.disabled = false;
+        }
+    }
+
+    appendFlight(flight, index) {
+        const resultsDiv = document.getElementById('flightResults');
+        if (!resultsDiv) return;
+
+        if (index === 0) {
+            // Первый рейс — убираем индикатор загрузки и показываем блок результатов
+            const loadingDiv = document.getElementById('loading');
+            if (loadingDiv) loadingDiv.style.display = 'none';
+            const resultsContainer = document.getElementById('results');
+            if (resultsContainer) {
+                resultsContainer.style.display = 'block';
+                resultsContainer.classList.add('show');
+            }
+        }
+
+        resultsDiv.insertAdjacentHTML('beforeend', this.renderFlightCard(flight, index));
+    }
+
     displayResults(flights) {
         console.log('📊 Отображаем рейсы:', flights);
         console.log('🔢 Количество рейсов:', flights.length);
@@ -212,57 +401,7 @@ class FlightSearchApp {
         }
 
         try {
-            const flightsHTML = flights.map((flight, index) => {
-                try {
-                    const price = flight.price || 'N/A';
-                    const currency = flight.currency || 'EUR';
-                    const segments = flight.segments || [];
-
-                    console.log(`✈️ Рейс ${index + 1}:`, flight);
-
-                    return `
-                        <div class="card mb-3 flight-card" style="animation-delay: ${index * 0.1}s">
-                            <div class="card-body">
-                                <div class="row align-items-center">
-                                    <div class="col-md-3 text-center">
-                                        <h4 class="text-primary mb-1">${price} ${currency}</h4>
-                                        <small class="text-muted">за пассажира</small>
-                                    </div>
-                                    <div class="col-md-6">
-                                        ${this.formatSegments(segments)}
-                                    </div>
-                                    <div class="col-md-3">
-                                        <div class="d-grid gap-2">
-                                            <button class="btn btn-primary" onclick="alert('Бронирование рейса №${index + 1}')">
-                                                <i class="bi bi-cart3"></i> Выбрать
-                                            </button>
-                                            <button class="btn btn-outline-secondary" onclick="this.closest('.flight-card').classList.toggle('expanded')">
-                                                <i class="bi bi-info-circle"></i> Подробнее
-                                            </button>
-                                        </div>
-                                    </div>
-                                </div>
-                            </div>
-                        </div>
-                    `;
-                } catch (error) {
-                    console.error('❌ Ошибка форматирования рейса:', error, flight);
-                    return `
-                        <div class="card mb-3 border-danger">
-                            <div class="card-body">
-                                <div class="text-danger">
-                                    <i class="bi bi-exclamation-triangle"></i> Ошибка отображения рейса
-                                </div>
-                                <div class="mt-2">
-                                    <button class="btn btn-sm btn-outline-secondary" onclick="console.log('Flight data:', ${JSON.stringify(flight)})">
-                                        Посмотреть данные
-                                    </button>
-                                </div>
-                            </div>
-                        </div>
-                    `;
-                }
-            }).join('');
+            const flightsHTML = flights.map((flight, index) => this.renderFlightCard(flight, index)).join('');
 
             resultsDiv.innerHTML = flightsHTML;
 
@@ -286,6 +425,58 @@ class FlightSearchApp {
         }
     }
 
+    renderFlightCard(flight, index) {
+        try {
+            const price = flight.price || 'N/A';
+            const currency = flight.currency || 'EUR';
+            const segments = flight.segments || [];
+
+            console.log(`✈️ Рейс ${index + 1}:`, flight);
+
+            return `
+                <div class="card mb-3 flight-card" style="animation-delay: ${(index % 10) * 0.1}s">
+                    <div class="card-body">
+                        <div class="row align-items-center">
+                            <div class="col-md-3 text-center">
+                                <h4 class="text-primary mb-1">${price} ${currency}</h4>
+                                <small class="text-muted">за пассажира</small>
+                            </div>
+                            <div class="col-md-6">
+                                ${this.formatSegments(segments)}
+                            </div>
+                            <div class="col-md-3">
+                                <div class="d-grid gap-2">
+                                    <button class="btn btn-primary" onclick="alert('Бронирование рейса №${index + 1}')">
+                                        <i class="bi bi-cart3"></i> Выбрать
+                                    </button>
+                                    <button class="btn btn-outline-secondary" onclick="this.closest('.flight-card').classList.toggle('expanded')">
+                                        <i class="bi bi-info-circle"></i> Подробнее
+                                    </button>
+                                </div>
+                            </div>
+                        </div>
+                    </div>
+                </div>
+            `;
+        } catch (error) {
+            console.error('❌ Ошибка форматирования рейса:', error, flight);
+            return `
+                <div class="card mb-3 border-danger">
+                    <div class="card-body">
+                        <div class="text-danger">
+                            <i class="bi bi-exclamation-triangle"></i> Ошибка отображения рейса
+                        </div>
+                        <div class="mt-2">
+                            <button class="btn btn-sm btn-outline-secondary" onclick="console.log('Flight data:', ${JSON.stringify(flight)})">
+                                Посмотреть данные
+                            </button>
+                        </div>
+                    </div>
+                </div>
+            `;
+        }
+    }
+
     formatSegments(segments) {
         if (!segments || !Array.isArray(segments) || segments.length === 0) {
             return '<div class="text-muted">Информация о маршруте недоступна</div>';
@@ -334,6 +525,25 @@ class FlightSearchApp {
                       .trim();
     }
 
+    async fetchAirports(query) {
+        const key = query.toLowerCase();
+        if (this.airportCache.has(key)) {
+            return this.airportCache.get(key);
+        }
+        // Браузер тоже кэширует ответ (Cache-Control) и перепроверяет его по ETag
+        const response = await fetch(`/api/airports?q=${encodeURIComponent(query)}`);
+        const airports = await response.json();
+        // Пустой список не кэшируем: сервер отдаёт его и при ошибке
+        if (response.ok && Array.isArray(airports) && airports.length > 0) {
+            if (this.airportCache.size >= 200) {
+                // Map хранит порядок вставки — удаляем самый старый запрос
+                this.airportCache.delete(this.airportCache.keys().next().value);
+            }
+            this.airportCache.set(key, airports);
+        }
+        return airports;
+    }
+
     async handleAirportSuggestions(event) {
         const inputId = event.target.id;
         const suggestionsId = inputId === 'originInput' ? 'originSuggestions' : 'destinationSuggestions';
@@ -347,8 +557,10 @@ class FlightSearchApp {
         }
 
         try {
-            const response = await fetch(`/api/airports?q=${encodeURIComponent(query)}`);
-            const airports = await response.json();
+            const requestId = ++this.airportRequestId;
+            const airports = await this.fetchAirports(query);
+            // Пока ждали ответ, пользователь ввёл ещё символы — этот ответ уже не нужен
+            if (requestId !== this.airportRequestId) return;
 
             if (!Array.isArray(airports) || airports.length === 0) {
                 suggestions.innerHTML = '<div class="dropdown-item text-muted">Ничего не найдено</div>';
@@ -374,6 +586,7 @@ class FlightSearchApp {
                     const name = item.getAttribute('data-name');
                     event.target.value = `${name} (${code})`;
                     suggestions.style.display = 'none';
+                    this.schedulePrefetch();
                 });
             });
 
@@ -0,0 +1,121 @@
+import logging
+
+from celery import Celery
+from celery.exceptions import TimeoutError as ResultTimeout
+from celery.result import AsyncResult
+from flask import current_app
+
+from app.routes import search_error_message, search_service
+from app.services.cache_service import search_cache
+from app.services.circuit_breaker import CircuitOpenError, DeadlineExceeded
+from app.services.credential_pool import credential_pool
+from app.services.popular_searches import popular_searches
+from app.services.prewarm_service import CachePrewarmer
+from app.services.rate_limiter import rate_limiter, RateLimitExceeded
+
+logger = logging.getLogger(__name__)
+
+celery = Celery('zatravel')
+prewarmer = CachePrewarmer(search_service, search_cache, popular_searches, rate_limiter, credential_pool)
+
+
+def init_celery(app):
+    """
+    Настраивает Celery по конфигурации Flask: брокер, расписание beat
+    и выполнение задач в контексте приложения (клиенты Amadeus читают current_app.config).
+    """
+    prewarmer.init_app(app)
+    celery.conf.update(
+        broker_url=app.config['CELERY_BROKER_URL'],
+        result_backend=app.config['CELERY_RESULT_BACKEND'],
+        result_expires=app.config['SEARCH_JOB_TTL'],
+        # Недоступный Redis не должен держать запрос десятки секунд — /search тогда ищет сам
+        result_backend_transport_options={
+            'retry_policy': {'max_retries': 2, 'interval_start': 0, 'interval_step': 0.2, 'interval_max': 0.5}
+        },
+        task_ignore_result=True,
+        task_track_started=True,
+        beat_schedule={
+            'prewarm-popular-searches': {
+                'task': 'zatravel.prewarm_popular_searches',
+                'schedule': app.config['PREWARM_INTERVAL'],
+                # Прогрев, не успевший начаться до следующего запуска, уже не нужен
+                'options': {'expires': app.config['PREWARM_INTERVAL']},
+            },
+            'decay-popular-searches': {
+                'task': 'zatravel.decay_popular_searches',
+                'schedule': 3600,
+            },
+        } if app.config.get('PREWARM_ENABLED') else {},
+    )
+
+    class ContextTask(celery.Task):
+        def __call__(self, *args, **kwargs):
+            with app.app_context():
+                return self.run(*args, **kwargs)
+
+    celery.Task = ContextTask
+    return celery
+
+
+@celery.task(name='zatravel.prewarm_popular_searches')
+def prewarm_popular_searches():
+    """Обновляет в кэше популярные поиски, которые скоро протухнут"""
+    return prewarmer.run()
+
+
+@celery.task(name='zatravel.decay_popular_searches')
+def decay_popular_searches():
+    """Раз в час снижает вес старых запросов — рейтинг следует за текущим спросом"""
+    popular_searches.decay(current_app.config['POPULAR_SEARCHES_DECAY'])
+
+
+# === Поиск в фоне (job mode для /search) ===
+
+@celery.task(name='zatravel.search_job', ignore_result=False)
+def search_job(search_params, page_size, ranking=None):
+    """
+    Выполняет поиск в воркере Celery — ретраи и ожидания Amadeus занимают воркер очереди,
+    а не поток веб-сервера. Ошибки возвращаются как результат, чтобы отдать их клиенту как есть.
+    """
+    try:
+        flights, cache_status = search_service.search(search_params)
+    except RateLimitExceeded as e:
+        return {'error': 'Too many requests to flight provider, retry later', 'status': 429,
+                'retry_after': e.retry_after}
+    except CircuitOpenError as e:
+        return {'error': 'Flight provider is temporarily unavailable, retry later', 'status': 503,
+                'retry_after': e.retry_after}
+    except DeadlineExceeded:
+        return {'error': 'Flight provider did not respond in time, retry later', 'status': 504}
+    except Exception as e:
+        logger.error(f"Search job error: {e}", exc_info=True)
+        return {'error': search_error_message(e), 'status': 500}
+    # Ранжирование — при выдаче (flights_response): в кэше остаётся порядок Amadeus
+    return {'flights': flights, 'cache_status': cache_status, 'params': search_params, 'page_size': page_size,
+            'ranking': ranking}
+
+
+def submit_search_job(search_params, page_size, ranking=None):
+    """Ставит поиск в очередь и возвращает id задания"""
+    # Без повторов публикации: при недоступном брокере лучше сразу искать в запросе
+    return search_job.apply_async(args=[search_params, page_size, ranking], retry=False).id
+
+
+def search_job_result(job_id, wait=0):
+    """
+    Состояние задания: ('pending' | 'running' | 'done' | 'failed', результат или None).
+    wait > 0 — long-poll: ждём готовности не дольше wait секунд.
+    """
+    result = AsyncResult(job_id, app=celery)
+    if wait > 0 and not result.ready():
+        try:
+            result.get(timeout=wait, propagate=False, disable_sync_subtasks=False)
+        except ResultTimeout:
+            pass
+
+    if result.successful():
+        return 'done', result.result
+    if result.failed():
+        return 'failed', None
+    return ('running' if result.state == 'STARTED' else 'pending'), None
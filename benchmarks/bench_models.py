@@ -0,0 +1,166 @@
+"""
+Микробенчмарк разбора и сериализации предложений Amadeus.
+
+Сравнивает прежнюю схему (обычные dataclass + dataclasses.asdict + jsonify
+с сортировкой ключей) с текущими моделями на slots и прямой сериализацией в JSON.
+
+Запуск из корня репозитория:
+    python benchmarks/bench_models.py [--offers 250] [--segments 4] [--repeat 20]
+"""
+import argparse
+import json
+import os
+import sys
+import time
+import tracemalloc
+from dataclasses import dataclass, asdict
+from typing import List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from app.models import FlightOffer, offer_dict_to_json  # noqa: E402
+
+
+# === Прежние модели — для сравнения «до» ===
+
+@dataclass
+class LegacySegment:
+    departure_airport: str
+    arrival_airport: str
+    departure_time: str
+    arrival_time: str
+    airline: str
+    flight_number: str
+    duration: str
+
+    @classmethod
+    def from_amadeus_segment(cls, segment_data):
+        dep_time = segment_data['departure']['at']
+        arr_time = segment_data['arrival']['at']
+        return cls(
+            departure_airport=segment_data['departure']['iataCode'],
+            arrival_airport=segment_data['arrival']['iataCode'],
+            departure_time=dep_time.replace('Z', '+00:00') if 'Z' in dep_time else dep_time,
+            arrival_time=arr_time.replace('Z', '+00:00') if 'Z' in arr_time else arr_time,
+            airline=segment_data['carrierCode'],
+            flight_number=segment_data['number'],
+            duration=segment_data.get('duration', '')
+        )
+
+
+@dataclass
+class LegacyOffer:
+    price: float
+    currency: str
+    segments: List[LegacySegment]
+
+    @classmethod
+    def from_amadeus_data(cls, data):
+        segments = []
+        for itinerary in data.get('itineraries', []):
+            for segment in itinerary.get('segments', []):
+                segments.append(LegacySegment.from_amadeus_segment(segment))
+        return cls(price=float(data['price']['total']), currency=data['price']['currency'], segments=segments)
+
+    def to_dict(self):
+        return {'price': self.price, 'currency': self.currency, 'segments': [asdict(s) for s in self.segments]}
+
+
+# === Данные ===
+
+def make_offers(count, segments_per_offer):
+    """Синтетический ответ Amadeus: туда-обратно, сегменты поровну на каждое направление"""
+    airports = ['SVO', 'IST', 'LED', 'AYT', 'DXB', 'TAS']
+    carriers = ['SU', 'TK', 'FZ', 'HY']
+    offers = []
+    for i in range(count):
+        itineraries = []
+        for leg in range(2):
+            segments = []
+            for j in range(max(1, segments_per_offer // 2)):
+                segments.append({
+                    'departure': {'iataCode': airports[(i + j) % 6], 'at': f'2026-11-{10 + leg:02d}T{8 + j:02d}:15:00'},
+                    'arrival': {'iataCode': airports[(i + j + 1) % 6], 'at': f'2026-11-{10 + leg:02d}T{10 + j:02d}:40:00'},
+                    'carrierCode': carriers[(i + j) % 4],
+                    'number': str(1000 + i),
+                    'duration': 'PT2H25M',
+                })
+            itineraries.append({'duration': 'PT6H10M', 'segments': segments})
+        offers.append({'price': {'total': f'{150 + i * 3.5:.2f}', 'currency': 'EUR'}, 'itineraries': itineraries})
+    return offers
+
+
+# === Замеры ===
+
+def best_of(fn, repeat):
+    best = float('inf')
+    for _ in range(repeat):
+        start = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - start)
+    return best
+
+
+def retained_bytes(fn):
+    """Сколько памяти удерживает результат fn()"""
+    tracemalloc.start()
+    result = fn()
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del result
+    return size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--offers', type=int, default=250)
+    parser.add_argument('--segments', type=int, default=4)
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    raw = make_offers(args.offers, args.segments)
+    legacy = [LegacyOffer.from_amadeus_data(o) for o in raw]
+    current = [FlightOffer.from_amadeus_data(o) for o in raw]
+    cached = [o.to_dict() for o in current]
+
+    def offers_json(offers, to_json):
+        # Как /search собирает ответ: массив из уже сериализованных предложений
+        return ('[' + ','.join([to_json(offer) for offer in offers]) + ']').encode('utf-8')
+
+    assert json.loads(offers_json(current, FlightOffer.to_json)) == [o.to_dict() for o in legacy]
+    assert offers_json(cached, offer_dict_to_json) == offers_json(current, FlightOffer.to_json)
+
+    def jsonify_like(payload):
+        # Так сериализует jsonify с настройками Flask по умолчанию
+        return json.dumps(payload, sort_keys=True, separators=(',', ':')).encode('utf-8')
+
+    cases = [
+        ('before: parse (dataclass)', lambda: [LegacyOffer.from_amadeus_data(o) for o in raw]),
+        ('after:  parse (slots)', lambda: [FlightOffer.from_amadeus_data(o) for o in raw]),
+        ('before: asdict + jsonify', lambda: jsonify_like([o.to_dict() for o in legacy])),
+        ('after:  to_dict + dumps', lambda: json.dumps([o.to_dict() for o in current], separators=(',', ':')).encode()),
+        ('after:  direct to_json', lambda: offers_json(current, FlightOffer.to_json)),
+        ('after:  cached dicts → JSON', lambda: offers_json(cached, offer_dict_to_json)),
+        ('before: parse + serialize', lambda: jsonify_like([LegacyOffer.from_amadeus_data(o).to_dict() for o in raw])),
+        ('after:  parse + serialize', lambda: offers_json([FlightOffer.from_amadeus_data(o) for o in raw],
+                                                          FlightOffer.to_json)),
+    ]
+
+    print(f"{args.offers} offers × {args.segments} segments, best of {args.repeat}")
+    print(f"{'case':<30}{'total, ms':>12}{'per offer, µs':>16}")
+    for name, fn in cases:
+        elapsed = best_of(fn, args.repeat)
+        print(f"{name:<30}{elapsed * 1000:>12.2f}{elapsed / args.offers * 1e6:>16.2f}")
+
+    print()
+    print(f"{'retained memory':<30}{'total, KiB':>12}{'per offer, B':>16}")
+    for name, fn in [
+        ('before: dataclass', lambda: [LegacyOffer.from_amadeus_data(o) for o in raw]),
+        ('after:  slots + intern', lambda: [FlightOffer.from_amadeus_data(o) for o in raw]),
+    ]:
+        size = retained_bytes(fn)
+        print(f"{name:<30}{size / 1024:>12.1f}{size / args.offers:>16.0f}")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,252 @@
+"""
+Нагрузочный бенчмарк приложения против локальной заглушки Amadeus — без сети.
+
+Поднимает benchmarks/stub_server.py, направляет на неё клиентов (AMADEUS_BASE_URL),
+запускает Flask-приложение в многопоточном werkzeug-сервере и гоняет сценарии
+параллельными HTTP-запросами. По каждому сценарию печатает p50/p95/p99,
+пропускную способность, ошибки и число запросов, дошедших до «Amadeus».
+
+Запуск из корня репозитория:
+    python benchmarks/run_benchmarks.py [--requests 200] [--concurrency 16] [--latency 0.3]
+    python benchmarks/run_benchmarks.py --scenario search_hot --scenario burst_same_key --json
+"""
+import argparse
+import json
+import logging
+import math
+import os
+import sys
+import tempfile
+import threading
+import time
+import urllib.error
+import urllib.request
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+ROOT_DIR = os.path.dirname(BENCH_DIR)
+sys.path.insert(0, ROOT_DIR)
+sys.path.insert(0, BENCH_DIR)
+
+from stub_server import StubServer, StubSettings  # noqa: E402
+
+# Файлы приложения (история цен, кэш байткода шаблонов) — во временной папке, не в instance/ репозитория
+BENCH_TMP_DIR = os.path.join(tempfile.gettempdir(), 'zatravel-bench')
+
+# Окружение приложения для бенчмарка: всё в памяти процесса, лимиты не мешают замерам.
+# Значения из окружения имеют приоритет — так можно замерить, например, RATE_LIMIT_BACKEND=file.
+BENCH_ENV = {
+    'AMADEUS_API_KEY': 'bench-key',
+    'AMADEUS_API_SECRET': 'bench-secret',
+    'SEARCH_CACHE_REDIS': '0',
+    'SINGLE_FLIGHT_REDIS': '0',
+    'SNAPSHOT_REDIS': '0',
+    'RATE_LIMIT_BACKEND': 'memory',
+    'RATE_LIMIT_SEARCH_RATE': '1000',
+    'RATE_LIMIT_SEARCH_BURST': '1000',
+    'RATE_LIMIT_REFERENCE_RATE': '1000',
+    'RATE_LIMIT_REFERENCE_BURST': '1000',
+    'TOKEN_STORE_BACKEND': 'memory',
+    'PREWARM_ENABLED': '0',
+    'PRICE_HISTORY_ENABLED': '0',
+    'PRICE_HISTORY_DB': os.path.join(BENCH_TMP_DIR, 'price_history.sqlite3'),
+    'JINJA_BYTECODE_CACHE_DIR': os.path.join(BENCH_TMP_DIR, 'jinja_cache'),
+}
+
+
+def load_app(base_url):
+    """Создаёт приложение с клиентами, смотрящими на заглушку"""
+    for key, value in BENCH_ENV.items():
+        os.environ.setdefault(key, value)
+    os.environ['AMADEUS_BASE_URL'] = base_url
+
+    from app import create_app
+    return create_app()
+
+
+def serve_app(app):
+    from werkzeug.serving import make_server
+    server = make_server('127.0.0.1', 0, app, threaded=True)
+    threading.Thread(target=server.serve_forever, name='bench-app', daemon=True).start()
+    return server, f"http://127.0.0.1:{server.server_port}"
+
+
+# === Запросы ===
+
+def http_call(url, payload=None):
+    """Возвращает (статус, секунды); статус 0 — сетевая ошибка"""
+    data = json.dumps(payload).encode('utf-8') if payload is not None else None
+    req = urllib.request.Request(url, data=data, headers={'Content-Type': 'application/json'})
+    start = time.perf_counter()
+    try:
+        with urllib.request.urlopen(req, timeout=60) as response:
+            response.read()
+            status = response.status
+    except urllib.error.HTTPError as e:
+        e.read()
+        status = e.code
+    except OSError:
+        status = 0
+    return status, time.perf_counter() - start
+
+
+def search_payload(i, max_results=10):
+    """Уникальные параметры поиска на каждое i — гарантированный промах кэша"""
+    day = date(2030, 1, 1) + timedelta(days=i % 3000)
+    return {
+        'origin': 'SVO',
+        'destination': 'IST',
+        'departureDate': day.isoformat(),
+        'adults': 1 + (i // 3000) % 9,
+        'maxResults': max_results,
+    }
+
+
+# === Сценарии ===
+# Сценарий — (описание, настройки заглушки, прогрев(base), генератор запросов(base, n) → [(url, payload)])
+
+def scenario_airports_local(base, n):
+    keywords = ['мос', 'Lon', 'ist', 'пар', 'dxb', 'SVO', 'led', 'Бер']
+    return [(f"{base}/api/airports?q={urllib.request.quote(keywords[i % len(keywords)])}", None) for i in range(n)]
+
+
+def scenario_airports_miss(base, n):
+    # Таких слов нет в локальном индексе — каждый запрос уходит в справочник Amadeus
+    return [(f"{base}/api/airports?q=zq{i}x", None) for i in range(n)]
+
+
+def scenario_search_cold(base, n):
+    return [(f"{base}/search", search_payload(i)) for i in range(n)]
+
+
+def scenario_search_hot(base, n):
+    return [(f"{base}/search", search_payload(0)) for _ in range(n)]
+
+
+def warm_search_hot(base):
+    http_call(f"{base}/search", search_payload(0))
+
+
+def scenario_search_async_cold(base, n):
+    return [(f"{base}/search/async", search_payload(10000 + i)) for i in range(n)]
+
+
+def scenario_burst_same_key(base, n):
+    # Волны одинаковых запросов: внутри волны ключ общий, между волнами — новый
+    return [(f"{base}/search", search_payload(20000 + i // 16)) for i in range(n)]
+
+
+def scenario_flaky_upstream(base, n):
+    return [(f"{base}/search", search_payload(30000 + i)) for i in range(n)]
+
+
+SCENARIOS = {
+    'airports_local': ('Автодополнение из локального индекса', {}, None, scenario_airports_local),
+    'airports_miss': ('Автодополнение с промахом индекса', {}, None, scenario_airports_miss),
+    'search_cold': ('Поиск, промах кэша', {}, None, scenario_search_cold),
+    'search_hot': ('Поиск, попадание в кэш', {}, warm_search_hot, scenario_search_hot),
+    'search_async_cold': ('Асинхронный поиск, промах кэша', {}, None, scenario_search_async_cold),
+    'burst_same_key': ('Волны одинаковых поисков', {}, None, scenario_burst_same_key),
+    'flaky_upstream': ('Поиск при 429 и 5xx от Amadeus', {'rate_429': 0.05, 'rate_5xx': 0.05}, None,
+                       scenario_flaky_upstream),
+}
+
+
+def percentile(sorted_values, p):
+    if not sorted_values:
+        return 0.0
+    # Nearest-rank: наименьшее значение, не меньше которого p% замеров
+    index = max(0, math.ceil(p / 100 * len(sorted_values)) - 1)
+    return sorted_values[index]
+
+
+def run_scenario(name, app_base, stub, args):
+    _, overrides, warmup, make_requests = SCENARIOS[name]
+    stub.settings = StubSettings(
+        latency=args.latency, jitter=args.jitter, token_latency=args.token_latency,
+        rate_429=overrides.get('rate_429', args.rate_429), rate_5xx=overrides.get('rate_5xx', args.rate_5xx),
+        seed=args.seed
+    )
+    if warmup is not None:
+        warmup(app_base)
+    stub.reset_stats()
+
+    calls = make_requests(app_base, args.requests)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+        results = list(pool.map(lambda call: http_call(*call), calls))
+    elapsed = time.perf_counter() - start
+
+    latencies = sorted(seconds for _, seconds in results)
+    statuses = {}
+    for status, _ in results:
+        statuses[status] = statuses.get(status, 0) + 1
+    upstream = stub.stats()
+    return {
+        'scenario': name,
+        'requests': len(results),
+        'errors': sum(count for status, count in statuses.items() if not 200 <= status < 300),
+        'statuses': {str(status): count for status, count in sorted(statuses.items())},
+        'seconds': round(elapsed, 3),
+        'rps': round(len(results) / elapsed, 1) if elapsed else 0.0,
+        'p50_ms': round(percentile(latencies, 50) * 1000, 1),
+        'p95_ms': round(percentile(latencies, 95) * 1000, 1),
+        'p99_ms': round(percentile(latencies, 99) * 1000, 1),
+        'upstream': upstream,
+        'upstream_calls': sum(count for key, count in upstream.items() if ':' not in key),
+    }
+
+
+def print_table(reports):
+    header = f"{'scenario':<20}{'req':>6}{'err':>6}{'rps':>9}{'p50, ms':>10}{'p95, ms':>10}{'p99, ms':>10}{'upstream':>10}  details"
+    print(header)
+    print('-' * len(header))
+    for r in reports:
+        details = ', '.join(f"{key}={count}" for key, count in sorted(r['upstream'].items()))
+        print(f"{r['scenario']:<20}{r['requests']:>6}{r['errors']:>6}{r['rps']:>9.1f}"
+              f"{r['p50_ms']:>10.1f}{r['p95_ms']:>10.1f}{r['p99_ms']:>10.1f}{r['upstream_calls']:>10}  {details}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--scenario', action='append', choices=sorted(SCENARIOS),
+                        help='сценарий (можно несколько; по умолчанию — все)')
+    parser.add_argument('--requests', type=int, default=200, help='запросов на сценарий')
+    parser.add_argument('--concurrency', type=int, default=16, help='параллельных клиентов')
+    parser.add_argument('--latency', type=float, default=0.3, help='задержка заглушки, сек')
+    parser.add_argument('--jitter', type=float, default=0.1, help='случайная добавка к задержке, сек')
+    parser.add_argument('--token-latency', type=float, default=0.2, help='задержка выдачи токена, сек')
+    parser.add_argument('--rate-429', type=float, default=0.0, help='доля ответов 429')
+    parser.add_argument('--rate-5xx', type=float, default=0.0, help='доля ответов 503')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--json', action='store_true', help='вывести отчёт в JSON — удобно сравнивать прогоны')
+    parser.add_argument('--verbose', action='store_true', help='не глушить логи приложения')
+    args = parser.parse_args()
+
+    stub = StubServer(('127.0.0.1', 0)).start()
+    app = load_app(stub.base_url)
+    if not args.verbose:
+        logging.getLogger().setLevel(logging.ERROR)
+        logging.getLogger('werkzeug').setLevel(logging.ERROR)
+    server, app_base = serve_app(app)
+
+    reports = []
+    try:
+        for name in args.scenario or list(SCENARIOS):
+            if not args.json:
+                print(f"→ {name}: {SCENARIOS[name][0]}", file=sys.stderr)
+            reports.append(run_scenario(name, app_base, stub, args))
+    finally:
+        server.shutdown()
+        stub.shutdown()
+
+    if args.json:
+        print(json.dumps({'settings': vars(args), 'reports': reports}, indent=2, ensure_ascii=False))
+    else:
+        print(f"{args.requests} requests × {args.concurrency} clients, stub latency {args.latency}s ± {args.jitter}s")
+        print_table(reports)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,198 @@
+"""
+Локальная заглушка Amadeus для бенчмарков без сети.
+
+Отдаёт записанные ответы из benchmarks/fixtures/ на эндпоинты токена,
+поиска предложений и справочника аэропортов. Задержка, доля 429 и 5xx,
+квота запросов на ключ настраиваются; заглушка считает запросы по каждому эндпоинту.
+
+Отдельный запуск (клиент направляется на неё через AMADEUS_BASE_URL):
+    python benchmarks/stub_server.py --port 8099 --latency 0.3 --jitter 0.1
+    AMADEUS_BASE_URL=http://127.0.0.1:8099 python app.py
+"""
+import argparse
+import json
+import os
+import random
+import threading
+import time
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+FIXTURES_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'fixtures')
+
+TOKEN_PATH = '/v1/security/oauth2/token'
+OFFERS_PATH = '/v2/shopping/flight-offers'
+LOCATIONS_PATH = '/v1/reference-data/locations'
+
+
+def load_fixture(name):
+    with open(os.path.join(FIXTURES_DIR, name), encoding='utf-8') as f:
+        return json.load(f)
+
+
+class StubSettings:
+    """Поведение заглушки; меняется на лету между сценариями"""
+
+    def __init__(self, latency=0.0, jitter=0.0, token_latency=0.0, rate_429=0.0, rate_5xx=0.0, seed=None,
+                 key_rate=0.0):
+        self.latency = latency              # сек — базовая задержка ответа
+        self.jitter = jitter                # сек — случайная добавка к задержке (0..jitter)
+        self.token_latency = token_latency  # сек — задержка выдачи токена
+        self.rate_429 = rate_429            # доля ответов 429 на поиск и справочник
+        self.rate_5xx = rate_5xx            # доля ответов 503
+        self.key_rate = key_rate            # запросов/сек на ключ (0 — без квоты); сверх квоты — 429
+        self.random = random.Random(seed)
+
+
+class StubServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+    def __init__(self, address, settings=None):
+        super().__init__(address, StubHandler)
+        self.settings = settings or StubSettings()
+        self.fixtures = {
+            TOKEN_PATH: load_fixture('token.json'),
+            OFFERS_PATH: load_fixture('flight_offers.json'),
+            LOCATIONS_PATH: load_fixture('locations.json'),
+        }
+        self._counts = Counter()
+        self._quotas = {}  # access token → (остаток квоты, время обновления)
+        self._lock = threading.Lock()
+
+    @property
+    def base_url(self):
+        host, port = self.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def count(self, key):
+        with self._lock:
+            self._counts[key] += 1
+
+    def stats(self):
+        """Счётчики запросов: {'search': ..., 'search:429': ..., ...}"""
+        with self._lock:
+            return dict(self._counts)
+
+    def reset_stats(self):
+        with self._lock:
+            self._counts.clear()
+            self._quotas.clear()
+
+    def take_quota(self, token):
+        """Квота ключа (token bucket, запас — секунда запросов): False — ответить 429"""
+        rate = self.settings.key_rate
+        if not rate:
+            return True
+        now = time.monotonic()
+        with self._lock:
+            tokens, ts = self._quotas.get(token, (rate, now))
+            tokens = min(rate, tokens + (now - ts) * rate)
+            allowed = tokens >= 1
+            self._quotas[token] = (tokens - 1 if allowed else tokens, now)
+            return allowed
+
+    def start(self):
+        """Запускает заглушку в фоновом потоке и возвращает её"""
+        threading.Thread(target=self.serve_forever, name='amadeus-stub', daemon=True).start()
+        return self
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = 'HTTP/1.1'  # keep-alive — как у настоящего API
+
+    ENDPOINTS = {
+        TOKEN_PATH: 'token',
+        OFFERS_PATH: 'search',
+        LOCATIONS_PATH: 'locations',
+    }
+
+    def log_message(self, format, *args):
+        pass  # без вывода на каждый запрос — мешает замерам
+
+    def do_POST(self):
+        if urlsplit(self.path).path != TOKEN_PATH:
+            return self._send(404, {'errors': [{'status': 404, 'title': 'NOT FOUND'}]})
+        length = int(self.headers.get('Content-Length') or 0)
+        form = parse_qs(self.rfile.read(length).decode('utf-8'))
+        self.server.count('token')
+        settings = self.server.settings
+        if settings.token_latency:
+            time.sleep(settings.token_latency)
+        # Свой токен на каждый client_id — квота key_rate считается по ключу
+        client_id = form.get('client_id', ['bench'])[0]
+        token = self.server.fixtures[TOKEN_PATH]
+        self._send(200, dict(token, client_id=client_id, access_token=f"{token['access_token']}-{client_id}"))
+
+    def do_GET(self):
+        url = urlsplit(self.path)
+        endpoint = self.ENDPOINTS.get(url.path)
+        if endpoint is None or endpoint == 'token':
+            return self._send(404, {'errors': [{'status': 404, 'title': 'NOT FOUND'}]})
+        self.server.count(endpoint)
+
+        if not self.headers.get('Authorization', '').startswith('Bearer '):
+            self.server.count(f"{endpoint}:401")
+            return self._send(401, {'errors': [{'status': 401, 'title': 'Invalid access token'}]})
+
+        settings = self.server.settings
+        if not self.server.take_quota(self.headers['Authorization']):
+            self.server.count(f"{endpoint}:quota")
+            return self._send(429, {'errors': [{'status': 429, 'title': 'Too many requests'}]})
+
+        delay = settings.latency + settings.random.uniform(0, settings.jitter)
+        if delay:
+            time.sleep(delay)
+
+        roll = settings.random.random()
+        if roll < settings.rate_429:
+            self.server.count(f"{endpoint}:429")
+            return self._send(429, {'errors': [{'status': 429, 'title': 'Too many requests'}]})
+        if roll < settings.rate_429 + settings.rate_5xx:
+            self.server.count(f"{endpoint}:5xx")
+            return self._send(503, {'errors': [{'status': 503, 'title': 'Service unavailable'}]})
+
+        payload = self.server.fixtures[url.path]
+        if endpoint == 'search':
+            # Уважаем max — от него зависит объём ответа и стоимость разбора
+            query = parse_qs(url.query)
+            limit = int(query.get('max', ['250'])[0])
+            payload = dict(payload, data=payload['data'][:limit])
+        self._send(200, payload)
+
+    def _send(self, status, payload):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/vnd.amadeus+json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8099)
+    parser.add_argument('--latency', type=float, default=0.3)
+    parser.add_argument('--jitter', type=float, default=0.1)
+    parser.add_argument('--token-latency', type=float, default=0.2)
+    parser.add_argument('--rate-429', type=float, default=0.0)
+    parser.add_argument('--rate-5xx', type=float, default=0.0)
+    parser.add_argument('--key-rate', type=float, default=0.0)
+    args = parser.parse_args()
+
+    settings = StubSettings(args.latency, args.jitter, args.token_latency, args.rate_429, args.rate_5xx,
+                            key_rate=args.key_rate)
+    server = StubServer((args.host, args.port), settings)
+    print(f"Amadeus stub on {server.base_url} (Ctrl+C — остановить)")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        print(json.dumps(server.stats(), indent=2))
+
+
+if __name__ == '__main__':
+    main()
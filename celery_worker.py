@@ -0,0 +1,8 @@
+"""
+Точка входа Celery — воркер и планировщик прогрева кэша:
+    celery -A celery_worker.celery worker --beat --loglevel=info
+"""
+from app import create_app
+
+app = create_app()
+celery = app.extensions['celery']
@@ -3,22 +3,151 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _parse_route_ttls(value):
+    """Разбирает строку вида "SVO-LED:600,MOW-IST:900" в словарь {маршрут: TTL}"""
+    ttls = {}
+    for item in (value or '').split(','):
+        route, _, ttl = item.strip().partition(':')
+        if route and ttl.strip().isdigit():
+            ttls[route.strip().upper()] = int(ttl)
+    return ttls
+
+
+def _parse_credentials(value, api_key=None, api_secret=None):
+    """
+    Пул ключей Amadeus из строки вида "key1:secret1,key2:secret2".
+    Пара AMADEUS_API_KEY/AMADEUS_API_SECRET, если задана, идёт первой; повторы убираются.
+    """
+    pairs = [(api_key, api_secret)] if api_key and api_secret else []
+    for item in (value or '').split(','):
+        key, _, secret = item.strip().partition(':')
+        if key and secret and (key, secret) not in pairs:
+            pairs.append((key, secret))
+    return pairs
+
+
+def _parse_sample_rates(value):
+    """Разбирает строку вида "app.get_airports:0.05,app.search_flights:0.5" в словарь {эндпоинт: доля}"""
+    rates = {}
+    for item in (value or '').split(','):
+        endpoint, _, rate = item.strip().partition(':')
+        try:
+            rates[endpoint.strip()] = min(1.0, max(0.0, float(rate)))
+        except ValueError:
+            continue
+    return rates
+
+
 class Config:
     AMADEUS_API_KEY = os.getenv('AMADEUS_API_KEY')
     AMADEUS_API_SECRET = os.getenv('AMADEUS_API_SECRET')
+    # Дополнительные ключи: у каждого свой токен и свой лимит запросов — пропускная способность складывается
+    AMADEUS_CREDENTIALS = _parse_credentials(os.getenv('AMADEUS_CREDENTIALS', ''), AMADEUS_API_KEY, AMADEUS_API_SECRET)
+    CREDENTIAL_EJECT_SECONDS = float(os.getenv('CREDENTIAL_EJECT_SECONDS', 10))  # отстранение ключа после 429
+    CREDENTIAL_EJECT_MAX = float(os.getenv('CREDENTIAL_EJECT_MAX', 120))         # предел при повторных 429
     SECRET_KEY = os.getenv('SECRET_KEY', 'dev-secret-key')
+    # Адрес API Amadeus (для бенчмарков — локальная заглушка benchmarks/stub_server.py)
+    AMADEUS_BASE_URL = os.getenv('AMADEUS_BASE_URL', 'https://test.api.amadeus.com')
     CACHE_TYPE = 'SimpleCache'  # Актуально для Flask-Caching 2.x
     CACHE_DEFAULT_TIMEOUT = 300  # 5 минут
 
-    # Валидация обязательных переменных
-    if not AMADEUS_API_KEY:
-        raise ValueError("❌ Отсутствует обязательная переменная: AMADEUS_API_KEY")
-    if not AMADEUS_API_SECRET:
-        raise ValueError("❌ Отсутствует обязательная переменная: AMADEUS_API_SECRET")
-
     # Режимы (опционально)
     DEBUG = os.getenv('FLASK_DEBUG', '0').lower() in ['true', '1', 'yes']
     TESTING = os.getenv('FLASK_TESTING', '0').lower() in ['true', '1', 'yes']
 
-    # На будущее — Redis
-    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
\ No newline at end of file
+    # Redis — общий уровень кэша между воркерами
+    REDIS_URL = os.getenv('REDIS_URL', 'redis://localhost:6379/0')
+
+    # Устойчивость запросов к Amadeus: общий срок с повторами и размыкатель цепи
+    AMADEUS_REQUEST_DEADLINE = float(os.getenv('AMADEUS_REQUEST_DEADLINE', 10))   # сек на запрос со всеми повторами
+    CIRCUIT_FAILURE_THRESHOLD = int(os.getenv('CIRCUIT_FAILURE_THRESHOLD', 5))    # сбоев подряд до размыкания
+    CIRCUIT_RESET_TIMEOUT = int(os.getenv('CIRCUIT_RESET_TIMEOUT', 30))           # сек до пробного запроса
+
+    # Кэш результатов поиска (LRU в процессе + Redis)
+    SEARCH_CACHE_SIZE = int(os.getenv('SEARCH_CACHE_SIZE', 512))             # записей в LRU
+    SEARCH_CACHE_TTL = int(os.getenv('SEARCH_CACHE_TTL', 300))               # «свежесть», сек
+    SEARCH_CACHE_STALE_TTL = int(os.getenv('SEARCH_CACHE_STALE_TTL', 600))   # отдаём устаревшее, сек
+    SEARCH_CACHE_ROUTE_TTLS = _parse_route_ttls(os.getenv('SEARCH_CACHE_ROUTE_TTLS', ''))
+    SEARCH_CACHE_REDIS = os.getenv('SEARCH_CACHE_REDIS', '1').lower() in ['true', '1', 'yes']
+
+    # Общий token bucket для запросов к Amadeus (между всеми воркерами)
+    # backend: 'file' — все воркеры хоста, 'redis' — все хосты, 'memory' — один процесс
+    RATE_LIMIT_BACKEND = os.getenv('RATE_LIMIT_BACKEND', 'file')
+    RATE_LIMIT_FILE = os.getenv('RATE_LIMIT_FILE')  # по умолчанию — во временной папке
+    RATE_LIMIT_SEARCH_RATE = float(os.getenv('RATE_LIMIT_SEARCH_RATE', 5))          # запросов/сек на ключ
+    RATE_LIMIT_SEARCH_BURST = float(os.getenv('RATE_LIMIT_SEARCH_BURST', 5))
+    RATE_LIMIT_REFERENCE_RATE = float(os.getenv('RATE_LIMIT_REFERENCE_RATE', 5))
+    RATE_LIMIT_REFERENCE_BURST = float(os.getenv('RATE_LIMIT_REFERENCE_BURST', 5))
+    RATE_LIMIT_MAX_WAIT = float(os.getenv('RATE_LIMIT_MAX_WAIT', 2))                # дольше — сразу 429
+    RATE_LIMIT_PENALTY_SHARE = float(os.getenv('RATE_LIMIT_PENALTY_SHARE', 0.5))    # доля burst, списываемая за один 429
+
+    # Single-flight: одинаковые одновременные поиски → один запрос к Amadeus
+    SINGLE_FLIGHT_REDIS = os.getenv('SINGLE_FLIGHT_REDIS', '1').lower() in ['true', '1', 'yes']  # между воркерами
+    SINGLE_FLIGHT_LOCK_TTL = int(os.getenv('SINGLE_FLIGHT_LOCK_TTL', 30))
+    SINGLE_FLIGHT_WAIT_TIMEOUT = int(os.getenv('SINGLE_FLIGHT_WAIT_TIMEOUT', 20))
+
+    # Общее хранилище OAuth-токена: 'file' (воркеры хоста), 'redis' (все хосты), 'memory'
+    TOKEN_STORE_BACKEND = os.getenv('TOKEN_STORE_BACKEND', 'file')
+    TOKEN_STORE_DIR = os.getenv('TOKEN_STORE_DIR')  # по умолчанию — во временной папке
+    TOKEN_REFRESH_MARGIN = int(os.getenv('TOKEN_REFRESH_MARGIN', 300))  # обновлять за N сек до истечения
+
+    # Параллельные поиски (календарь цен, пакетный поиск)
+    SEARCH_FANOUT_CONCURRENCY = int(os.getenv('SEARCH_FANOUT_CONCURRENCY', 8))  # одновременно в Amadeus
+    SEARCH_FANOUT_TIMEOUT = float(os.getenv('SEARCH_FANOUT_TIMEOUT', 20))        # сек на один поиск
+    CALENDAR_MAX_WINDOW = int(os.getenv('CALENDAR_MAX_WINDOW', 7))               # ±дней
+    CALENDAR_MAX_CELLS = int(os.getenv('CALENDAR_MAX_CELLS', 60))                # дат × дат возврата
+    BATCH_MAX_SEARCHES = int(os.getenv('BATCH_MAX_SEARCHES', 50))                # поисков в /search/batch
+
+    # Снимки результатов поиска для постраничной выдачи (/search/page)
+    SNAPSHOT_FETCH_MAX = int(os.getenv('SNAPSHOT_FETCH_MAX', 50))               # предложений за один запрос к Amadeus
+    SNAPSHOT_TTL = int(os.getenv('SNAPSHOT_TTL', 900))                          # сек
+    SNAPSHOT_MAX_BYTES = int(os.getenv('SNAPSHOT_MAX_BYTES', 32 * 1024 * 1024))  # лимит памяти на процесс
+    SNAPSHOT_REDIS = os.getenv('SNAPSHOT_REDIS', '1').lower() in ['true', '1', 'yes']
+
+    # Celery и фоновый прогрев кэша популярных поисков
+    CELERY_BROKER_URL = os.getenv('CELERY_BROKER_URL', REDIS_URL)
+    CELERY_RESULT_BACKEND = os.getenv('CELERY_RESULT_BACKEND', REDIS_URL)
+    PREWARM_ENABLED = os.getenv('PREWARM_ENABLED', '1').lower() in ['true', '1', 'yes']  # учёт популярности + beat
+    PREWARM_INTERVAL = int(os.getenv('PREWARM_INTERVAL', 60))              # сек между проходами
+    PREWARM_TOP_N = int(os.getenv('PREWARM_TOP_N', 50))                    # сколько популярных поисков держать тёплыми
+    PREWARM_DAYS_AHEAD = int(os.getenv('PREWARM_DAYS_AHEAD', 30))          # только вылеты в ближайшие N дней
+    PREWARM_LEAD_TIME = int(os.getenv('PREWARM_LEAD_TIME', 120))           # обновлять за N сек до протухания
+    PREWARM_BUDGET_SHARE = float(os.getenv('PREWARM_BUDGET_SHARE', 0.2))   # доля лимита поиска для прогрева
+    POPULAR_SEARCHES_DECAY = float(os.getenv('POPULAR_SEARCHES_DECAY', 0.5))  # множитель весов раз в час
+
+    # Поиск в фоне: POST /search с Prefer: respond-async (или ?mode=job) → /search/jobs/<id>
+    SEARCH_JOB_TTL = int(os.getenv('SEARCH_JOB_TTL', 600))             # сек хранения результата задания
+    SEARCH_JOB_MAX_WAIT = float(os.getenv('SEARCH_JOB_MAX_WAIT', 25))  # предел long-poll, сек
+
+    # Спекулятивный поиск из формы (POST /search/prefetch) до нажатия «Найти»
+    PREFETCH_ENABLED = os.getenv('PREFETCH_ENABLED', '1').lower() in ['true', '1', 'yes']
+    PREFETCH_BUDGET_SHARE = float(os.getenv('PREFETCH_BUDGET_SHARE', 0.3))   # доля лимита поиска
+    PREFETCH_MIN_HEADROOM = float(os.getenv('PREFETCH_MIN_HEADROOM', 2))     # токенов поиска оставить пользователям
+    PREFETCH_MAX_INFLIGHT = int(os.getenv('PREFETCH_MAX_INFLIGHT', 4))       # одновременных предзагрузок на процесс
+
+    # История цен (SQLite): тренды и самые дешёвые известные тарифы без запросов к Amadeus
+    PRICE_HISTORY_ENABLED = os.getenv('PRICE_HISTORY_ENABLED', '1').lower() in ['true', '1', 'yes']
+    PRICE_HISTORY_DB = os.getenv('PRICE_HISTORY_DB')  # по умолчанию — instance/price_history.sqlite3
+    PRICE_HISTORY_RETENTION_DAYS = int(os.getenv('PRICE_HISTORY_RETENTION_DAYS', 180))
+    PRICE_TRENDS_MAX_RANGE = int(os.getenv('PRICE_TRENDS_MAX_RANGE', 366))  # дней вылета в одном запросе
+
+    # Кэш байткода шаблонов Jinja (по умолчанию — instance/jinja_cache)
+    JINJA_BYTECODE_CACHE_DIR = os.getenv('JINJA_BYTECODE_CACHE_DIR')
+
+    # Сжатие JSON-ответов API (gzip/brotli по Accept-Encoding)
+    JSON_COMPRESS_MIN_SIZE = int(os.getenv('JSON_COMPRESS_MIN_SIZE', 1024))  # байт — меньшие не сжимаем
+    AIRPORTS_MAX_AGE = int(os.getenv('AIRPORTS_MAX_AGE', 3600))              # сек кэша подсказок в браузере
+
+    # Логирование: очередь с фоновой записью и выборка INFO-строк шумных эндпоинтов
+    LOG_LEVEL = os.getenv('LOG_LEVEL', 'INFO').upper()
+    LOG_QUEUE = os.getenv('LOG_QUEUE', '1').lower() in ['true', '1', 'yes']
+    LOG_SAMPLE_RATES = _parse_sample_rates(os.getenv(
+        'LOG_SAMPLE_RATES', 'app.get_airports:0.05,app.get_airports_async:0.05'
+    ))
+
+    @classmethod
+    def validate(cls):
+        """Проверка обязательных переменных — в create_app(), а не при импорте модуля"""
+        if not cls.AMADEUS_CREDENTIALS:
+            raise ValueError("❌ Не заданы ключи Amadeus: AMADEUS_API_KEY/AMADEUS_API_SECRET или AMADEUS_CREDENTIALS")
@@ -0,0 +1,29 @@
+"""
+Конфигурация gunicorn: gunicorn -c gunicorn.conf.py wsgi:app
+
+preload_app: приложение (конфиг, индекс аэропортов, шаблоны) загружается один раз в мастере,
+воркеры получают его через fork и делят память copy-on-write — старт воркера почти мгновенный.
+Пулы соединений, event loop async-клиента, фоновые потоки (токены, история цен) каждый воркер
+создаёт сам: сервисы сбрасывают их после fork (app/services/fork_safety.py).
+"""
+import gc
+import multiprocessing
+import os
+
+bind = f"0.0.0.0:{os.getenv('PORT', 5001)}"
+workers = int(os.getenv('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.getenv('GUNICORN_THREADS', 4))
+timeout = int(os.getenv('GUNICORN_TIMEOUT', 60))
+keepalive = 5
+preload_app = True
+# Перезапуск воркеров с разбросом — не все одновременно и без утечек памяти за сутки
+max_requests = int(os.getenv('GUNICORN_MAX_REQUESTS', 5000))
+max_requests_jitter = int(os.getenv('GUNICORN_MAX_REQUESTS_JITTER', 500))
+
+
+def when_ready(server):
+    # Приложение уже загружено: замораживаем его объекты, чтобы сборщик мусора в воркерах
+    # не трогал их заголовки и не копировал общие страницы памяти
+    gc.collect()
+    gc.freeze()
+    server.log.info("Application preloaded, gc frozen before forking workers")
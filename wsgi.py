@@ -0,0 +1,9 @@
+"""
+WSGI-точка входа для продакшена:
+    gunicorn -c gunicorn.conf.py wsgi:app
+
+Приложение создаётся при импорте — с preload_app это происходит один раз в мастере gunicorn.
+"""
+from app import create_app
+
+app = create_app()